@@ -0,0 +1,171 @@
+"""Historical trend aggregates per course and per institution.
+
+The scraper computes them from the phase 1 data of every year right after
+saving (run `python aggregates.py` to update an existing database) into the
+coursetrends and institutiontrends tables, so the server can sort by them
+without going through every year of every course.
+
+- grade_drift: change of the last placed grade per year (least squares slope)
+- fill_rate: placed candidates per vacancy
+- candidates_per_vacancy: how competitive the course is
+- first_option_share: candidates that put the course as their first option
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel
+
+from models import CourseTrends, InstitutionTrends, engine
+
+# Phase 1 of every year of every course
+YEAR_ROWS_QUERY = """
+SELECT coursedata.id, course.institution_id, phasestats.year, phasestats.vacancies,
+       phasestats.grade_last, phasestats.candidates, phasestats.candidates_first_option,
+       phasestats.placed
+FROM coursedata
+JOIN course ON coursedata.course_id = course.id
+JOIN phasestats ON phasestats.course_data_id = coursedata.id AND phasestats.phase = 1
+ORDER BY coursedata.id, phasestats.year
+"""
+
+# year, vacancies, grade_last, candidates, first_option, placed
+YearRow = Tuple[int, Optional[int], Optional[float], Optional[int], Optional[int], Optional[int]]
+
+
+def ratio(numerator, denominator) -> Optional[float]:
+    """numerator / denominator, None when either is missing or zero."""
+    if numerator is None or not denominator:
+        return None
+    return numerator / denominator
+
+
+def mean(values: Sequence[float]) -> Optional[float]:
+    """Mean of the values, None without values."""
+    return sum(values) / len(values) if values else None
+
+
+def slope(points: Sequence[Tuple[int, float]]) -> Optional[float]:
+    """Least squares slope of (year, value) points, None with fewer than two years."""
+    if len(points) < 2:
+        return None
+    year_mean = mean([year for year, _ in points])
+    value_mean = mean([value for _, value in points])
+    spread = sum((year - year_mean) ** 2 for year, _ in points)
+    return sum((year - year_mean) * (value - value_mean) for year, value in points) / spread
+
+
+def latest_and_mean(values: List[Optional[float]]) -> Tuple[Optional[float], Optional[float]]:
+    """Last value that is not None and the mean of all of them."""
+    present = [value for value in values if value is not None]
+    return (present[-1] if present else None), mean(present)
+
+
+def rounded(value: Optional[float], digits: int = 3) -> Optional[float]:
+    """Round a value that may be missing."""
+    return None if value is None else round(value, digits)
+
+
+def course_trends(course_data_id: int, rows: List[YearRow]) -> CourseTrends:
+    """Trends of a course from its yearly rows (oldest first)."""
+    grades = [(year, grade) for year, _, grade, _, _, _ in rows if grade is not None]
+    fill_rate = latest_and_mean([ratio(placed, vac) for _, vac, _, _, _, placed in rows])
+    competition = latest_and_mean([ratio(cand, vac) for _, vac, _, cand, _, _ in rows])
+    first_option = latest_and_mean([ratio(first, cand) for _, _, _, cand, first, _ in rows])
+
+    return CourseTrends(
+        course_data_id=course_data_id,
+        years=len(rows),
+        first_year=rows[0][0] if rows else None,
+        last_year=rows[-1][0] if rows else None,
+        grade_last=grades[-1][1] if grades else None,
+        grade_drift=rounded(slope(grades)),
+        fill_rate=rounded(fill_rate[0]),
+        fill_rate_mean=rounded(fill_rate[1]),
+        candidates_per_vacancy=rounded(competition[0]),
+        candidates_per_vacancy_mean=rounded(competition[1]),
+        first_option_share=rounded(first_option[0]),
+        first_option_share_mean=rounded(first_option[1]),
+    )
+
+
+def institution_trends(
+    institution_id: str, courses: Dict[int, List[YearRow]]
+) -> InstitutionTrends:
+    """Trends of an institution from the yearly rows of its courses."""
+    # year -> [vacancies, candidates, first_option, placed, vacancies with candidates]
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0])
+    grades = defaultdict(list)
+    for rows in courses.values():
+        for year, vacancies, grade, candidates, first_option, placed in rows:
+            year_totals = totals[year]
+            year_totals[0] += vacancies or 0
+            year_totals[3] += placed or 0
+            if candidates is not None:
+                year_totals[1] += candidates
+                year_totals[2] += first_option or 0
+                # Only compare candidates with the vacancies of the same courses
+                year_totals[4] += vacancies or 0
+            if grade is not None:
+                grades[year].append(grade)
+
+    last_year = max(totals, default=None)
+    vacancies, candidates, first_option, placed, compared_vacancies = totals.get(
+        last_year, [0, 0, 0, 0, 0]
+    )
+    grade_means = sorted((year, mean(values)) for year, values in grades.items())
+
+    return InstitutionTrends(
+        institution_id=institution_id,
+        courses=len(courses),
+        years=len(totals),
+        last_year=last_year,
+        vacancies=vacancies if last_year else None,
+        candidates=candidates if last_year else None,
+        grade_last_mean=rounded(grade_means[-1][1]) if grade_means else None,
+        grade_drift=rounded(slope(grade_means)),
+        fill_rate=rounded(ratio(placed, vacancies)),
+        candidates_per_vacancy=rounded(ratio(candidates, compared_vacancies)),
+        first_option_share=rounded(ratio(first_option, candidates)),
+    )
+
+
+def update_aggregates(target: Engine = engine):
+    """Recompute the trend tables from the yearly data in the database."""
+    SQLModel.metadata.create_all(
+        target, tables=[CourseTrends.__table__, InstitutionTrends.__table__]
+    )
+
+    courses: Dict[int, List[YearRow]] = defaultdict(list)
+    institutions: Dict[str, Dict[int, List[YearRow]]] = defaultdict(dict)
+    with target.connect() as conn:
+        for course_data_id, institution_id, *row in conn.exec_driver_sql(YEAR_ROWS_QUERY):
+            courses[course_data_id].append(tuple(row))
+            institutions[institution_id][course_data_id] = courses[course_data_id]
+
+    with Session(target) as session:
+        session.execute(delete(CourseTrends))
+        session.execute(delete(InstitutionTrends))
+        session.add_all(course_trends(key, rows) for key, rows in courses.items())
+        session.add_all(
+            institution_trends(key, rows) for key, rows in institutions.items()
+        )
+        session.commit()
+
+    logging.info(
+        "Trends computed for %d courses and %d institutions.",
+        len(courses),
+        len(institutions),
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    update_aggregates()
@@ -0,0 +1,155 @@
+"""Async (ASGI) entry point serving the Flask app of server.py.
+
+Run with `uvicorn asgi:app --workers 4`. The event loop holds the connections
+and reads the request bodies, while the Flask app (routes, rate limits, ETags,
+compression and metrics) runs in threads. Routes that query the database are
+bounded by the connection pool, so a single process can keep many slow
+connections open.
+"""
+
+import asyncio
+import io
+import json
+import sys
+
+import server
+from models import SERVING_MAX_OVERFLOW, SERVING_POOL_SIZE
+
+# Never run more searches at once than there are pooled DB connections
+MAX_CONCURRENT_SEARCHES = SERVING_POOL_SIZE + SERVING_MAX_OVERFLOW
+MAX_BODY_SIZE = 64 * 1024
+
+# Routes that hold a database connection (course pages too without a snapshot)
+DATABASE_ROUTES = ("/api/search", "/api/trends", "/api/facets")
+
+# Same state as a preforked worker (snapshot, indexes, compiled statements)
+server.warm_up()
+
+
+def uses_database(path: str) -> bool:
+    """Check if a request may need a database connection."""
+    if path.startswith("/c/"):
+        return server.SNAPSHOT is None
+    return path in DATABASE_ROUTES
+
+
+def wsgi_environ(scope, body: bytes) -> dict:
+    """Build the WSGI environ of an ASGI HTTP request."""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_LENGTH", "CONTENT_TYPE"):
+            key = f"HTTP_{key}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The whole body was read, chunked or not
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+def call_wsgi(environ: dict) -> tuple:
+    """Run the Flask app (in a worker thread) and collect the whole response."""
+    started = {}
+    chunks = []
+
+    def start_response(status, headers, _exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+        return chunks.append
+
+    result = server.app(environ, start_response)
+    try:
+        chunks.extend(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], b"".join(chunks)
+
+
+class ASGIApp:
+    """ASGI adapter running the Flask app of server.py in threads."""
+
+    def __init__(self):
+        self._search_slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if len(body) > MAX_BODY_SIZE:
+                content = json.dumps({"error": "Request body too large"}).encode()
+                await self.respond(
+                    send, 413, [("Content-Type", "application/json")], content
+                )
+                return
+
+        environ = wsgi_environ(scope, body)
+        if uses_database(scope["path"]):
+            async with self.search_slots:
+                response = await asyncio.to_thread(call_wsgi, environ)
+        else:
+            response = await asyncio.to_thread(call_wsgi, environ)
+        await self.respond(send, *response)
+
+    async def lifespan(self, receive, send):
+        """Handle startup/shutdown events."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._search_slots = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.to_thread(server.query.engine.dispose)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @property
+    def search_slots(self) -> asyncio.Semaphore:
+        """Semaphore bounding the thread offloaded searches."""
+        if self._search_slots is None:  # server without lifespan support
+            self._search_slots = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+        return self._search_slots
+
+    @staticmethod
+    async def respond(send, status: int, headers: list, content: bytes):
+        """Send a complete response."""
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in headers
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": content})
+
+
+app = ASGIApp()
@@ -0,0 +1,174 @@
+"""Benchmark the scraper's page parsing on the offline fixtures.
+
+Run from the repository root:
+
+    python benchmarks/bench_parse.py
+    python benchmarks/bench_parse.py --repeat 50 --page course_
+
+For every fixture page it reports the time spent building the BeautifulSoup
+tree and running the parser (p50 over the runs), the peak memory allocated
+while parsing once (with tracemalloc) and whether the result still matches
+the output recorded in the fixture manifest.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+# Import the modules of the checkout the script is run from
+sys.path.insert(0, os.getcwd())
+
+# pylint: disable=wrong-import-position
+from bs4 import BeautifulSoup
+
+from models import Course, Institution
+from query import course_data_to_dict
+from scraper import parse_course_page, parse_listing_page
+from utils import ParseError
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(patterns=None):
+    """Load the fixture pages listed in the manifest."""
+    with open(os.path.join(FIXTURES_DIR, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    pages = [dict(page, kind="listing") for page in manifest["listings"]]
+    pages += [dict(page, kind="course") for page in manifest["courses"]]
+    if patterns:
+        pages = [p for p in pages if any(pattern in p["file"] for pattern in patterns)]
+
+    for page in pages:
+        with open(os.path.join(FIXTURES_DIR, page["file"]), encoding="utf-8") as f:
+            page["text"] = f.read()
+    return manifest["source"], pages
+
+
+def fixture_course(page) -> Course:
+    """Course (from the page URL) for the parser to attach the data to."""
+    query = page["url"].split("?", 1)[1]
+    params = dict(part.split("=", 1) for part in query.split("&"))
+    return Course(
+        course_id=params["codc"],
+        name=page["file"],
+        url=page["url"],
+        institution_id=params["code"],
+        institution=Institution(id=params["code"], name=""),
+    )
+
+
+def parse_page(page):
+    """Build the soup and parse a fixture page, timing both steps."""
+    start = time.perf_counter()
+    soup = BeautifulSoup(page["text"], "html.parser")
+    soup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if page["kind"] == "listing":
+        result, _ = parse_listing_page(soup)
+    else:
+        try:
+            result = parse_course_page(soup, fixture_course(page))
+        except ParseError:
+            result = None
+    parse_time = time.perf_counter() - start
+
+    return result, soup_time, parse_time
+
+
+def check_result(page, result) -> bool:
+    """Check a parse result against the output recorded in the manifest."""
+    if page["kind"] == "listing":
+        return len(result) == page["courses"]
+    if result is None:
+        return page["expected"] is None
+
+    actual = course_data_to_dict(result)
+    actual.pop("id")
+    expected = page["expected"]
+    # The name and institution of the course come from the listing, not the page
+    for data in (actual, expected):
+        data["course"] = {"id": data["course"]["id"], "url": data["course"]["url"]}
+    return actual == expected
+
+
+def median(samples):
+    """Median of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per page")
+    parser.add_argument(
+        "--page",
+        action="append",
+        help="only benchmark fixtures whose file name contains this text",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # The parser logs every step, which would dominate the timings
+    logging.disable(logging.CRITICAL)
+
+    source, pages = load_fixtures(args.page)
+    print(f"{len(pages)} {source} fixture pages, {args.repeat} runs each")
+    print(
+        f"{'page':<28} {'KiB':>6} {'soup ms':>8} {'parse ms':>9}"
+        f" {'peak KiB':>9} {'blocks':>7} {'ok':>3}"
+    )
+
+    results = {}
+    totals = [0.0, 0.0]
+    for page in pages:
+        soup_times, parse_times = [], []
+        for _ in range(args.repeat):
+            result, soup_time, parse_time = parse_page(page)
+            soup_times.append(soup_time)
+            parse_times.append(parse_time)
+
+        # Separate run, tracemalloc slows everything down
+        tracemalloc.start()
+        result, _, _ = parse_page(page)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+
+        ok = check_result(page, result)
+        results[page["file"]] = {
+            "size": len(page["text"].encode("utf-8")),
+            "soup": median(soup_times),
+            "parse": median(parse_times),
+            "peak_memory": peak,
+            "live_blocks": blocks,
+            "matches_expected": ok,
+        }
+        totals[0] += median(soup_times)
+        totals[1] += median(parse_times)
+
+        print(
+            f"{page['file']:<28} {results[page['file']]['size'] / 1024:>6.1f}"
+            f" {median(soup_times) * 1000:>8.2f} {median(parse_times) * 1000:>9.2f}"
+            f" {peak / 1024:>9.1f} {blocks:>7} {'yes' if ok else 'NO':>3}"
+        )
+
+    print(f"{'total':<28} {'':>6} {totals[0] * 1000:>8.2f} {totals[1] * 1000:>9.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+    if not all(result["matches_expected"] for result in results.values()):
+        sys.exit("Some pages no longer parse to the recorded output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Benchmark full_search over a matrix of filters and sort modes.
+
+Run from the repository root:
+
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --scenario sort_ --repeat 50
+    python benchmarks/bench_search.py --compare HEAD~1 HEAD
+
+Each scenario runs against the checked-in database.db and reports latency
+percentiles (search plus serialization, like /api/search does) and how many
+ORM objects were hydrated. `--compare` checks both revisions out in temporary
+git worktrees and runs this same script in each of them.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Import the modules of the checkout the script is run from (see --compare)
+sys.path.insert(0, os.getcwd())
+
+SCENARIOS = {
+    "no_filters": {"sort_by": "course_id"},
+    "unique_id": {"unique_id": "1"},
+    # Basic information operators
+    "course_id_exact": {"course_id": "9813", "course_id_operator": "exact"},
+    "course_id_contains": {"course_id": "91"},
+    "course_id_starts_with": {"course_id": "9", "course_id_operator": "starts_with"},
+    "course_name_exact": {"course_name": "Medicina", "course_name_operator": "exact"},
+    "course_name_contains": {"course_name": "engenharia"},
+    "course_name_starts_with": {
+        "course_name": "Gest",
+        "course_name_operator": "starts_with",
+    },
+    # What the fuzzy fallback runs for "enjenharia informatica" (see fuzzy.py)
+    "course_name_one_of": {
+        "course_name": [
+            "Engenharia Informática",
+            "Engenharia Informática Médica",
+            "Engenharia Informática Aplicada",
+        ],
+        "course_name_operator": "one_of",
+    },
+    "institution_id_exact": {
+        "institution_id": "0150",
+        "institution_id_operator": "exact",
+    },
+    "institution_name_contains": {"institution_name": "Lisboa"},
+    "institution_name_starts_with": {
+        "institution_name": "Universidade",
+        "institution_name_operator": "starts_with",
+    },
+    # Characteristics
+    "degree": {"degree": "Mestrado Integrado"},
+    "type": {"type": "Ensino Superior Público Universitário"},
+    "ects_between": {"ects": "180", "ects_operator": "between", "ects_max": "240"},
+    "ects_greater": {"ects": "180", "ects_operator": "greater"},
+    "vacancies_available": {"vacancies": "1", "vacancies_operator": "available"},
+    "vacancies_between": {
+        "vacancies": "20",
+        "vacancies_operator": "between",
+        "vacancies_max": "60",
+    },
+    # Entrance exams
+    "exam_all": {"exam_code": "19", "exam_combination": "all"},
+    "exam_any": {"exam_code": "19", "exam_combination": "any"},
+    "exam_only": {"exam_code": "19", "exam_combination": "only"},
+    # Classification
+    "min_app_grade_greater": {"min_app_grade": "100", "min_app_grade_operator": "greater"},
+    "min_exam_grade_between": {
+        "min_exam_grade": "95",
+        "min_exam_grade_operator": "between",
+        "min_exam_grade_max": "120",
+    },
+    # Regional preference
+    "region": {"region": "Porto"},
+    # Historical data
+    "grade_last_between": {"min_grade_last": "120", "max_grade_last": "150"},
+    "grade_last_min_year": {"min_grade_last": "150", "year_filter": "2024"},
+    "grade_last_max": {"max_grade_last": "110"},
+    # Sort modes and their year/phase preferences
+    "sort_name": {"sort_by": "name_asc"},
+    "sort_institution": {"sort_by": "institution_asc"},
+    "sort_grade_desc": {"sort_by": "grade_desc"},
+    "sort_grade_asc_phase2": {"sort_by": "grade_asc", "grade_sort_phase": "2"},
+    "sort_grade_desc_2023": {"sort_by": "grade_desc", "grade_sort_year": "2023"},
+    "sort_average_desc": {"sort_by": "average_desc"},
+    "sort_average_asc_phase2_2022": {
+        "sort_by": "average_asc",
+        "grade_sort_phase": "2",
+        "grade_sort_year": "2022",
+    },
+    "sort_competition_desc": {"sort_by": "competition_desc"},
+    "sort_grade_drift_asc": {"sort_by": "grade_drift_asc"},
+    # Page sizes
+    "page_100": {"results_per_page": "100"},
+    "page_100_name_contains": {"course_name": "a", "results_per_page": "100"},
+    "page_100_grade_desc": {"results_per_page": "100", "sort_by": "grade_desc"},
+}
+
+
+def percentile(samples, q):
+    """Nearest rank percentile (0-1) of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, round(q * len(ordered)) - 1))]
+
+
+def run_benchmarks(names, repeat, warmup):
+    """Run the given scenarios in this process and return their results."""
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy import event
+    from sqlalchemy.orm import Mapper
+
+    from query import course_data_to_dict, full_search
+
+    loaded = [0]
+
+    def on_load(*_):
+        loaded[0] += 1
+
+    event.listen(Mapper, "load", on_load)
+
+    results = {}
+    for name in names:
+        config = SCENARIOS[name]
+        try:
+            for _ in range(warmup):
+                [course_data_to_dict(c) for c in full_search(dict(config))]
+
+            samples = []
+            rows = courses = 0
+            for _ in range(repeat):
+                loaded[0] = 0
+                start = time.perf_counter()
+                courses = len(
+                    [course_data_to_dict(c) for c in full_search(dict(config))]
+                )
+                samples.append(time.perf_counter() - start)
+                rows = loaded[0]
+        except Exception as e:  # pylint: disable=broad-except
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+
+        results[name] = {
+            "p50": percentile(samples, 0.5),
+            "p99": percentile(samples, 0.99),
+            "mean": sum(samples) / len(samples),
+            "courses": courses,
+            "rows_hydrated": rows,
+        }
+    return results
+
+
+def print_results(results):
+    """Print the results of a single run as a table."""
+    print(f"{'scenario':<32} {'p50 ms':>9} {'p99 ms':>9} {'courses':>8} {'rows':>7}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<32} {result['error']}")
+            continue
+        print(
+            f"{name:<32} {result['p50'] * 1000:>9.2f} {result['p99'] * 1000:>9.2f}"
+            f" {result['courses']:>8} {result['rows_hydrated']:>7}"
+        )
+
+
+def run_revision(revision, args):
+    """Run this script in a temporary worktree of a git revision."""
+    with tempfile.TemporaryDirectory() as tmp:
+        worktree = os.path.join(tmp, "worktree")
+        output = os.path.join(tmp, "results.json")
+        subprocess.run(
+            ["git", "worktree", "add", "--detach", "--quiet", worktree, revision],
+            check=True,
+        )
+        try:
+            command = [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--repeat",
+                str(args.repeat),
+                "--warmup",
+                str(args.warmup),
+                "--json",
+                output,
+                "--quiet",
+            ]
+            for pattern in args.scenario or []:
+                command += ["--scenario", pattern]
+            subprocess.run(command, cwd=worktree, check=True)
+            with open(output, encoding="utf-8") as f:
+                return json.load(f)
+        finally:
+            subprocess.run(
+                ["git", "worktree", "remove", "--force", worktree], check=True
+            )
+
+
+def print_comparison(old_revision, old, new_revision, new):
+    """Print the p50/p99 change of every scenario between two runs."""
+    print(f"{old_revision} -> {new_revision}")
+    print(
+        f"{'scenario':<32} {'p50 ms':>17} {'change':>8} {'p99 ms':>17}"
+        f" {'rows':>13}"
+    )
+    for name in old:
+        before, after = old[name], new.get(name, {"error": "missing"})
+        if "error" in before or "error" in after:
+            print(f"{name:<32} {before.get('error', 'ok')} -> {after.get('error', 'ok')}")
+            continue
+        change = (after["p50"] - before["p50"]) / before["p50"] * 100
+        print(
+            f"{name:<32}"
+            f" {before['p50'] * 1000:>7.2f} -> {after['p50'] * 1000:<7.2f}"
+            f" {change:>+7.1f}%"
+            f" {before['p99'] * 1000:>7.2f} -> {after['p99'] * 1000:<7.2f}"
+            f" {before['rows_hydrated']:>5} -> {after['rows_hydrated']:<5}"
+        )
+
+
+def main():
+    """Parse the arguments and run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per scenario")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed runs first")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="only run scenarios containing this text (can be repeated)",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--quiet", action="store_true", help="do not print a table")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="compare two git revisions instead of the working tree",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        old_revision, new_revision = args.compare
+        old = run_revision(old_revision, args)
+        new = run_revision(new_revision, args)
+        print_comparison(old_revision, old, new_revision, new)
+        return
+
+    names = [
+        name
+        for name in SCENARIOS
+        if not args.scenario or any(pattern in name for pattern in args.scenario)
+    ]
+    results = run_benchmarks(names, args.repeat, args.warmup)
+
+    if not args.quiet:
+        print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
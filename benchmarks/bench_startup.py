@@ -0,0 +1,114 @@
+"""Measure the cold start of the server in fresh interpreters.
+
+Run from the repository root:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --imports 15
+
+Two startups are timed per run: a cold one (import server, then the first
+index page and the first search, like a serverless instance) and a warmed one
+(import server, warm_up() as the preforking master does, then the first
+search). The slowest imports are listed from `python -X importtime`.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+COLD_START = """
+import json, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+client = server.app.test_client()
+client.get("/")
+index = time.perf_counter()
+client.get("/api/search?course_name=a&view=summary")
+search = time.perf_counter()
+print(json.dumps({
+    "import server": imported - start,
+    "first index page": index - imported,
+    "first search": search - index,
+    "total": search - start,
+}))
+"""
+
+WARM_START = """
+import json, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.warm_up()
+warmed = time.perf_counter()
+client = server.app.test_client()
+client.get("/api/search?course_name=a&view=summary")
+search = time.perf_counter()
+print(json.dumps({
+    "import server": imported - start,
+    "warm up": warmed - imported,
+    "first search": search - warmed,
+    "total": search - start,
+}))
+"""
+
+
+def run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    """Run code in a fresh interpreter from the current directory."""
+    env = dict(os.environ, FLASK_RATELIMIT_ENABLED="false")
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def median(samples):
+    """Median of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2]
+
+
+def print_timings(title: str, runs: list):
+    """Print the median of every step over the runs."""
+    print(f"\n{title} (median of {len(runs)} runs)")
+    for step in runs[0]:
+        print(f"  {step:<20} {median([r[step] for r in runs]) * 1000:>8.1f} ms")
+
+
+def slowest_imports(limit: int):
+    """Modules with the highest cumulative import time when importing server."""
+    stderr = run("import server", "-X", "importtime").stderr
+    imports = []
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        if own.strip().isdigit():
+            imports.append((int(cumulative), int(own), name.rstrip()))
+    return sorted(imports, reverse=True)[:limit]
+
+
+def main():
+    """Parse the arguments and measure the startups."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per mode")
+    parser.add_argument("--imports", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    cold = [json.loads(run(COLD_START).stdout) for _ in range(args.runs)]
+    warm = [json.loads(run(WARM_START).stdout) for _ in range(args.runs)]
+    print_timings("Cold start", cold)
+    print_timings("Warmed start", warm)
+
+    print(f"\n{'slowest imports':<44} {'cumulative ms':>14} {'self ms':>8}")
+    for cumulative, own, name in slowest_imports(args.imports):
+        print(f"{name[:44]:<44} {cumulative / 1000:>14.1f} {own / 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Load test the website with a realistic mix of traffic.
+
+Run from the repository root:
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --concurrency 1,8,32,64 --duration 20
+    python benchmarks/loadtest.py --server uvicorn --workers 4
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000
+
+Unless --url is given it starts a local server on the bundled database.db
+(rate limiting disabled) and stops it at the end. Each concurrency level runs
+that many client threads for --duration seconds, replaying a weighted mix of
+index page loads, name searches, advanced searches and course page views, and
+reports throughput, latency percentiles and error rates per route.
+"""
+
+import argparse
+import http.client
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+# Relative weights of the user actions in the mix
+ACTIONS = {
+    "index": 20,
+    "name_search": 35,
+    "advanced_search": 20,
+    "course_page": 25,
+}
+
+REQUEST_TIMEOUT = 30
+STARTUP_TIMEOUT = 60
+
+
+class TrafficData:
+    """Values to build realistic requests from, sampled from the database."""
+
+    def __init__(self, path: str = "database.db"):
+        conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+        try:
+            self.course_ids = [row[0] for row in conn.execute("SELECT id FROM coursedata")]
+            names = [row[0] for row in conn.execute("SELECT DISTINCT name FROM course")]
+            self.regions = [
+                row[0] for row in conn.execute("SELECT DISTINCT name FROM region")
+            ]
+            self.exam_codes = [
+                row[0] for row in conn.execute("SELECT DISTINCT code FROM exam")
+            ]
+            self.degrees = [
+                row[0] for row in conn.execute("SELECT DISTINCT degree FROM characteristics")
+            ]
+        finally:
+            conn.close()
+
+        # People type whole words or the start of one
+        words = {word.lower() for name in names for word in name.split() if len(word) > 3}
+        self.search_terms = sorted(words) + sorted({word[:4] for word in words})
+
+    def name_search(self, rng: random.Random) -> str:
+        """Search box query of the index page."""
+        return "/api/search?" + urlencode(
+            {"course_name": rng.choice(self.search_terms), "view": "summary"}
+        )
+
+    def advanced_search(self, rng: random.Random) -> str:
+        """Advanced search form with a few random filters."""
+        filters = [
+            lambda: {"region": rng.choice(self.regions)},
+            lambda: {"exam_code": rng.choice(self.exam_codes), "exam_combination": "all"},
+            lambda: {"degree": rng.choice(self.degrees)},
+            lambda: {
+                "min_app_grade": str(rng.choice((95, 100, 120))),
+                "min_app_grade_operator": "greater",
+            },
+            lambda: {"vacancies": "1", "vacancies_operator": "available"},
+            lambda: {"institution_name": rng.choice(("Lisboa", "Porto", "Coimbra"))},
+        ]
+        params = {}
+        for build in rng.sample(filters, rng.randint(1, 3)):
+            params.update(build())
+        params["sort_by"] = rng.choice(
+            ("course_id", "name_asc", "grade_desc", "average_desc", "grade_asc")
+        )
+        params["results_per_page"] = rng.choice(("10", "25", "50"))
+        params["view"] = "summary"
+        return "/api/search?" + urlencode(params)
+
+
+class Client:
+    """Keep-alive HTTP connection of a single simulated user."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.conn = None
+
+    def get(self, path: str):
+        """GET a path, returning the status code and the body size."""
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(
+                    self.host, self.port, timeout=REQUEST_TIMEOUT
+                )
+            try:
+                self.conn.request("GET", path, headers={"Accept-Encoding": "gzip, br"})
+                response = self.conn.getresponse()
+                body = response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    self.close()
+                return response.status, len(body)
+            except (http.client.HTTPException, OSError):
+                self.close()
+                # A kept-alive connection may have been closed by the server
+                if attempt:
+                    raise
+        raise AssertionError("unreachable")
+
+    def close(self):
+        """Close the connection."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Results:
+    """Latencies, sizes and errors per route."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, route: str, latency: float, status: int, size: int):
+        """Record a finished request (status 0 for connection errors)."""
+        with self.lock:
+            self.latencies[route].append(latency)
+            self.bytes[route] += size
+            if not 200 <= status < 400:
+                self.errors[route] += 1
+
+
+def percentile(samples, q):
+    """Nearest rank percentile (0-1) of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, round(q * len(ordered)) - 1))]
+
+
+def run_user(client: Client, data: TrafficData, rng, deadline: float, results: Results):
+    """Simulate one user until the deadline."""
+    actions, weights = zip(*ACTIONS.items())
+
+    def request(route, path):
+        start = time.perf_counter()
+        try:
+            status, size = client.get(path)
+        except (http.client.HTTPException, OSError):
+            status, size = 0, 0
+        results.record(route, time.perf_counter() - start, status, size)
+
+    while time.monotonic() < deadline:
+        action = rng.choices(actions, weights)[0]
+        if action == "index":
+            request("GET /", "/")
+        elif action == "name_search":
+            request("GET /api/search (name)", data.name_search(rng))
+        elif action == "advanced_search":
+            request("GET /api/search (advanced)", data.advanced_search(rng))
+        else:
+            # The course page loads its data from the API once rendered
+            course_id = rng.choice(data.course_ids)
+            request("GET /c/<id>", f"/c/{course_id}")
+            request(
+                "GET /api/search (course)",
+                "/api/search?" + urlencode({"unique_id": course_id}),
+            )
+
+    client.close()
+
+
+def run_level(host, port, data, concurrency, duration, seed):
+    """Run one concurrency level, returning its results and how long it took."""
+    results = Results()
+    start = time.monotonic()
+    deadline = start + duration
+    threads = [
+        threading.Thread(
+            target=run_user,
+            args=(
+                Client(host, port),
+                data,
+                random.Random(seed + i),
+                deadline,
+                results,
+            ),
+        )
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Requests started before the deadline are still counted, so is their time
+    return results, time.monotonic() - start
+
+
+def print_level(concurrency, duration, results: Results):
+    """Print the results of a concurrency level."""
+    total = sum(len(latencies) for latencies in results.latencies.values())
+    errors = sum(results.errors.values())
+    print(
+        f"\n{concurrency} concurrent users: {total / duration:.1f} requests/s,"
+        f" {errors / total * 100 if total else 0:.2f}% errors"
+    )
+    print(
+        f"{'route':<28} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}"
+        f" {'p99 ms':>8} {'KiB/req':>8} {'errors':>7}"
+    )
+    for route in sorted(results.latencies):
+        latencies = results.latencies[route]
+        print(
+            f"{route:<28} {len(latencies):>9} {len(latencies) / duration:>8.1f}"
+            f" {percentile(latencies, 0.5) * 1000:>8.1f}"
+            f" {percentile(latencies, 0.95) * 1000:>8.1f}"
+            f" {percentile(latencies, 0.99) * 1000:>8.1f}"
+            f" {results.bytes[route] / len(latencies) / 1024:>8.1f}"
+            f" {results.errors[route]:>7}"
+        )
+
+
+def start_server(kind: str, port: int, workers: int) -> subprocess.Popen:
+    """Start a local server without rate limits."""
+    env = dict(os.environ, FLASK_RATELIMIT_ENABLED="false")
+    if kind == "uvicorn":
+        command = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "asgi:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ]
+    else:
+        command = [
+            sys.executable,
+            "server.py",
+            "serve",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ]
+    return subprocess.Popen(
+        command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def wait_until_ready(host: str, port: int, process: subprocess.Popen):
+    """Wait until the server answers the index page."""
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    client = Client(host, port)
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            sys.exit("The server exited during startup")
+        try:
+            if client.get("/")[0] == 200:
+                client.close()
+                return
+        except (http.client.HTTPException, OSError):
+            pass
+        time.sleep(0.2)
+    sys.exit("The server did not start in time")
+
+
+def main():
+    """Parse the arguments and run every concurrency level."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--concurrency",
+        default="1,4,16,32",
+        help="comma separated numbers of concurrent users",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10, help="seconds per concurrency level"
+    )
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--server", choices=("prefork", "uvicorn"), default="prefork")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = TrafficData()
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    process = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        process = start_server(args.server, port, args.workers)
+        print(f"Started the {args.server} server with {args.workers} workers")
+
+    try:
+        wait_until_ready(host, port, process)
+        for concurrency in levels:
+            results, elapsed = run_level(
+                host, port, data, concurrency, args.duration, args.seed
+            )
+            print_level(concurrency, elapsed, results)
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""Record DGES pages as offline fixtures for the parser benchmark.
+
+Run from the repository root:
+
+    python benchmarks/record_fixtures.py               # fetch from www.dges.gov.pt
+    python benchmarks/record_fixtures.py --reconstruct # rebuild from database.db
+
+Recording fetches a few listing pages and a sample of course pages that covers
+the tricky layouts (no phase headers, exam bundles and combinations, regional
+preferences, prerequisites...). Without network access `--reconstruct` renders
+the same sample from database.db in the markup the parser expects instead, and
+checks that parsing the result gives back the stored data. Either way the
+fixtures are written to benchmarks/fixtures/ with a manifest holding the
+current parser output for each page, which bench_parse.py checks against.
+"""
+
+import argparse
+import html
+import json
+import os
+import sys
+import unicodedata
+from datetime import datetime, timezone
+
+# Import the modules of the checkout the script is run from
+sys.path.insert(0, os.getcwd())
+
+# pylint: disable=wrong-import-position
+from bs4 import BeautifulSoup
+
+from models import Course, Institution
+from query import course_data_to_dict, get_full_course_data
+from scraper import BASE_URL, parse_course_page, parse_listing_page
+from utils import ParseError, get_soup
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+LISTING_LETTERS = "AEZ"
+COURSES_PER_CASE = 3
+
+# Layouts the course sample must cover, with a check for each of them
+CASES = {
+    "plain": lambda d: not d.prerequisites
+    and not d.regional_preference
+    and not d.other_access_preferences,
+    "no_phase_headers": lambda d: has_history(d)
+    and all(p.phase == 1 for p in d.phase_stats),
+    "no_history": lambda d: not has_history(d),
+    "no_last_grade": lambda d: has_history(d)
+    and all(p.grade_last is None for p in d.phase_stats if p.phase == 1)
+    and any(p.phase == 2 for p in d.phase_stats),
+    "exam_bundle": lambda d: d.entrance_exams and d.entrance_exams.is_bundle,
+    "exam_combination": lambda d: d.entrance_exams and d.entrance_exams.is_combination,
+    "exam_sets": lambda d: d.entrance_exams
+    and not d.entrance_exams.is_combination
+    and len(d.entrance_exams.exams) > 1,
+    "institution_specific": lambda d: d.min_classification is None,
+    "regional_preference": lambda d: d.regional_preference is not None,
+    "other_access_preferences": lambda d: d.other_access_preferences is not None,
+    "prerequisites": lambda d: d.prerequisites is not None,
+}
+
+LAYOUT = """<!DOCTYPE html>
+<html lang="pt">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="/guias/css/guias.css">
+</head>
+<body>
+<div class="width"><div class="minwidth"><div class="layout">
+<div class="header"><a href="https://www.dges.gov.pt/"><img src="/guias/img/logo.png" alt="DGES"></a>
+<ul class="menu"><li><a href="/guias/indcurso.asp">Cursos</a></li><li><a href="/guias/indest.asp">Instituições</a></li><li><a href="/guias/pesquisa.asp">Pesquisa</a></li></ul></div>
+<div class="container"><div class="content"><div id="bot-all"><div class="bot-blue-center"><div id="caixa-orange"><div class="inside">{content}</div></div></div></div></div>
+<div class="footer">Direção-Geral do Ensino Superior</div>
+</div></div></div></div>
+</body>
+</html>
+"""
+
+
+def has_history(course_data) -> bool:
+    """Check if a course has application statistics."""
+    return bool(course_data.phase_stats)
+
+
+def fold(text: str) -> str:
+    """Remove accents and case (listing pages are split by folded first letter)."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).upper()
+
+
+def format_number(value) -> str:
+    """Format a number the way DGES does (decimal comma)."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.1f}".replace(".", ",")
+    return str(value)
+
+
+def render_listing(year: int, courses) -> str:
+    """Render a course listing page."""
+    parts = [f'<div class="lin-curso">Candidatura {year}</div>']
+    last_course = None
+    for course in courses:
+        if (course.course_id, course.name) != last_course:
+            last_course = (course.course_id, course.name)
+            parts.append(
+                '<div class="box10">'
+                f'<div class="lin-curso-c2">{html.escape(course.course_id)}</div>'
+                f'<div class="lin-curso-c3">{html.escape(course.name)}</div></div>'
+            )
+        parts.append(
+            f'<div class="lin-curso"><div class="lin-ce-c2"><a href="detcursopi.asp?'
+            f'code={course.institution_id}&amp;codc={course.course_id}">'
+            f"{html.escape(course.institution_id)}</a></div>"
+            f'<div class="lin-ce-c3">{html.escape(course.institution.name)}</div></div>'
+        )
+    return LAYOUT.format(title="Índice de Cursos", content="\n".join(parts))
+
+
+def render_history(phase_stats) -> str:
+    """Render the application statistics table."""
+    by_phase = {(p.year, p.phase): p for p in phase_stats}
+    years = sorted({p.year for p in phase_stats}, reverse=True)
+    has_phases = any(p.phase == 2 for p in phase_stats)
+    phases = (1, 2) if has_phases else (1,)
+    columns = [by_phase.get((year, phase)) for year in years for phase in phases]
+
+    def row(label, values, strong=False):
+        label = f"<strong>{label}</strong>" if strong else label
+        cells = "".join(f"<td>{value}</td>" for value in values)
+        return f"<tr><td>{label}</td>{cells}</tr>"
+
+    def numbers(getter):
+        return [format_number(getter(p) if p else None) for p in columns]
+
+    rows = [
+        "<tr><td></td>"
+        + "".join(
+            f'<td colspan="{len(phases)}"><span class="bodyTitle">{year}</span></td>'
+            for year in years
+        )
+        + "</tr>"
+    ]
+    if has_phases:
+        rows.append(
+            "<tr><td></td>" + "<td>1ª Fase</td><td>2ª Fase</td>" * len(years) + "</tr>"
+        )
+    rows.append(row("Vagas", numbers(lambda p: p.vacancies), strong=True))
+
+    if any(p and p.has_candidates for p in columns):
+        for label, field in (
+            ("Candidatos", "candidates"),
+            ("do Sexo Feminino", "candidates_fem"),
+            ("do Sexo Masculino", "candidates_masc"),
+            ("em 1ª Opção", "candidates_first_option"),
+        ):
+            rows.append(
+                row(
+                    label,
+                    numbers(lambda p, f=field: getattr(p, f) if p.has_candidates else None),
+                    strong=field == "candidates",
+                )
+            )
+    if any(p and p.has_placed for p in columns):
+        for label, field in (
+            ("Colocados", "placed"),
+            ("do Sexo Feminino", "placed_fem"),
+            ("do Sexo Masculino", "placed_masc"),
+            ("em 1ª Opção", "placed_first_option"),
+        ):
+            rows.append(
+                row(
+                    label,
+                    numbers(lambda p, f=field: getattr(p, f) if p.has_placed else None),
+                    strong=field == "placed",
+                )
+            )
+    if any(p and p.has_averages for p in columns):
+        rows.append(row("Médias dos Colocados", [""] * len(columns), strong=True))
+        for label, field in (
+            ("Nota de Candidatura", "average_application_grade"),
+            ("Provas de Ingresso", "average_entrance_exams"),
+            ("Média do Secundário", "average_hs_average"),
+        ):
+            rows.append(
+                row(
+                    label,
+                    numbers(lambda p, f=field: getattr(p, f) if p.has_averages else None),
+                )
+            )
+    if any(p and p.grade_last is not None for p in columns):
+        rows.append(
+            row(
+                "Nota de Candidatura do Último Colocado pelo Contingente Geral",
+                numbers(lambda p: p.grade_last),
+                strong=True,
+            )
+        )
+    if any(p and p.info_url for p in columns):
+        links = [
+            f'<a href="{p.info_url.removeprefix("https://www.dges.gov.pt/guias/")}">'
+            '<img src="img/pdf.gif" alt="PDF"></a>'
+            if p and p.info_url
+            else ""
+            for p in columns
+        ]
+        rows.append(
+            row("Informação Adicional Sobre Candidatos e Colocados", links, strong=True)
+        )
+
+    return '<table class="caixa">' + "".join(rows) + "</table>"
+
+
+def render_exams(entrance_exams) -> str:
+    """Render the entrance exams section."""
+    bundles = [bundle.exams for bundle in entrance_exams.exams if bundle.exams]
+    if not bundles:
+        return (
+            "A informação sobre as condições de acesso deve"
+            " ser obtida diretamente junto da universidade.<br/>"
+        )
+
+    def exam_lines(exams):
+        return "".join(
+            f"{exam.code}  {html.escape(exam.name)}<br/>" for exam in exams
+        )
+
+    parts = []
+    if entrance_exams.is_combination:
+        parts.append(exam_lines(bundles[0]) + "e<br/>Uma das seguintes provas:<br/>")
+        bundles = bundles[1:]
+    elif entrance_exams.is_bundle:
+        parts.append("Duas das seguintes provas:<br/>")
+    elif len(bundles) > 1:
+        parts.append("Um dos seguintes conjuntos:<br/>")
+
+    parts.append("ou<br/>".join(exam_lines(exams) for exams in bundles))
+    return "".join(parts)
+
+
+def render_course(course_data) -> str:
+    """Render a course details page from the stored data."""
+    course = course_data.course
+    parts = [
+        f'<div class="cx13">{html.escape(course.institution_id)} - '
+        f"{html.escape(course.institution.name)}</div>",
+        f'<div class="cx13">{html.escape(course.course_id)} - {html.escape(course.name)}</div>',
+    ]
+
+    if has_history(course_data):
+        parts.append(render_history(course_data.phase_stats))
+
+    char = course_data.characteristics
+    lines = [
+        ("Grau", char.degree),
+        ("Área CNAEF", char.CNAEF),
+        ("Duração", char.duration),
+        ("ECTS", char.ECTS if char.ECTS != -1 else None),
+        ("Tipo de Ensino", char.type),
+        ("Concurso", char.competition),
+        ("Vagas para 2025", char.current_vacancies),
+    ]
+    stats_url = course_data.extra_stats_url or "https://www.dges.gov.pt/guias/"
+    parts.append(
+        "<h2>Características do par Instituição/Curso</h2>"
+        + "".join(
+            f"{key}: {html.escape(str(value))}<br/>"
+            for key, value in lines
+            if value not in (None, "None")
+        )
+        + f'<a href="{html.escape(stats_url)}">Mais informação sobre o curso</a>'
+    )
+
+    if course_data.prerequisites:
+        prerequisites = course_data.prerequisites
+        parts.append(
+            "<h2>Pré-Requisitos</h2>"
+            f"Tipo de Pré-Requisitos: {html.escape(prerequisites.type)}<br/>"
+            "Grupos:<br/>"
+            f"Grupo {html.escape(prerequisites.group)} - Pré-requisitos do grupo<br/>"
+        )
+
+    if course_data.entrance_exams:
+        parts.append("<h2>Provas de Ingresso</h2>" + render_exams(course_data.entrance_exams))
+
+    classification = course_data.min_classification
+    formula = course_data.calculation_formula
+    if classification and formula:
+        parts.append(
+            "<h2>Classificações Mínimas</h2>"
+            f"Nota de candidatura: {classification.application_grade} pontos<br/>"
+            f"Provas de ingresso: {classification.entrance_exams} pontos<br/>"
+            "<h2>Fórmula de Cálculo</h2>"
+            f"Média do secundário: {formula.hs_average}%<br/>"
+            f"Provas de ingresso: {formula.entrance_exams}%<br/>"
+            + (
+                f"Pré-Requisito: {formula.prerequisites}%<br/>"
+                if formula.prerequisites is not None
+                else ""
+            )
+        )
+    else:
+        parts.append(
+            "<h2>Classificações Mínimas</h2>"
+            "<br/>Para mais informação consulte a instituição.<br/>"
+            "<h2>Fórmula de Cálculo</h2>"
+            "<br/>Para mais informação consulte a instituição.<br/>"
+        )
+
+    if course_data.regional_preference:
+        preference = course_data.regional_preference
+        regions = ", ".join(region.name for region in preference.regions)
+        parts.append(
+            "<h2>Preferência Regional</h2>"
+            f"Percentagem de vagas: {format_number(preference.percentage)}%<br/>"
+            f"Área de influência: {html.escape(regions)}<br/>"
+        )
+
+    if course_data.other_access_preferences:
+        preferences = course_data.other_access_preferences
+        parts.append(
+            "<h2>Outros Acessos Preferenciais</h2>"
+            f"Percentagem de vagas: {format_number(preferences.percentage)}%<br/>"
+            "Cursos:<br/>"
+            + "".join(
+                f"{html.escape(shallow.course_id)} {html.escape(shallow.name)}<br/>"
+                for shallow in preferences.courses
+            )
+        )
+
+    parts.append('<a href="indcurso.asp">Voltar ao índice de cursos</a>')
+    return LAYOUT.format(title=html.escape(course.name), content="\n".join(parts))
+
+
+def same(expected, actual) -> bool:
+    """Compare parsed and stored data, ignoring SQLite's type coercions."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return expected.keys() == actual.keys() and all(
+            same(expected[key], actual[key]) for key in expected
+        )
+    if isinstance(expected, list) and isinstance(actual, list):
+        return len(expected) == len(actual) and all(
+            same(a, b) for a, b in zip(expected, actual)
+        )
+    return expected == actual or str(expected) == str(actual)
+
+
+def detached_copy(course) -> Course:
+    """Copy a course (and its institution) for the parser to attach to."""
+    return Course(
+        course_id=course.course_id,
+        name=course.name,
+        url=course.url,
+        institution_id=course.institution_id,
+        institution=Institution(id=course.institution_id, name=course.institution.name),
+    )
+
+
+def parsed_dict(course_data) -> dict:
+    """JSON dict of a parsed course, without the database ID."""
+    result = course_data_to_dict(course_data)
+    result.pop("id")
+    return result
+
+
+def select_sample(database) -> dict:
+    """Pick a few courses for each of the layouts (first ones by ID)."""
+    sample = {}
+    for case, check in CASES.items():
+        matches = [d for d in database if check(d)][:COURSES_PER_CASE]
+        for course_data in matches:
+            sample.setdefault(course_data.id, (course_data, []))[1].append(case)
+    return sample
+
+
+def write_fixture(name: str, text: str):
+    """Write a fixture page."""
+    with open(os.path.join(FIXTURES_DIR, name), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def main():
+    """Record (or reconstruct) the fixtures and their manifest."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--reconstruct",
+        action="store_true",
+        help="render the pages from database.db instead of fetching them",
+    )
+    args = parser.parse_args()
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    database = sorted(get_full_course_data(), key=lambda d: d.id)
+    year = max(
+        (p.year for d in database for p in d.phase_stats),
+        default=datetime.now().year - 1,
+    ) + 1
+
+    manifest = {
+        "source": "reconstructed" if args.reconstruct else "recorded",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "listings": [],
+        "courses": [],
+    }
+
+    for letter in LISTING_LETTERS:
+        url = BASE_URL + letter
+        if args.reconstruct:
+            courses = sorted(
+                (d.course for d in database if fold(d.course.name).startswith(letter)),
+                key=lambda c: (fold(c.name), c.course_id, c.institution_id),
+            )
+            text = render_listing(year, courses)
+        else:
+            soup = get_soup(url)
+            if not soup:
+                sys.exit(f"Failed to fetch {url}")
+            text = str(soup)
+
+        name = f"listing_{letter}.html"
+        write_fixture(name, text)
+        parsed, _ = parse_listing_page(BeautifulSoup(text, "html.parser"))
+        manifest["listings"].append({"file": name, "url": url, "courses": len(parsed)})
+
+    mismatches = 0
+    for course_data, cases in select_sample(database).values():
+        course = course_data.course
+        if args.reconstruct:
+            text = render_course(course_data)
+        else:
+            soup = get_soup(course.url)
+            if not soup:
+                sys.exit(f"Failed to fetch {course.url}")
+            text = str(soup)
+
+        name = f"course_{course.institution_id}_{course.course_id}.html"
+        write_fixture(name, text)
+
+        try:
+            parsed = parse_course_page(
+                BeautifulSoup(text, "html.parser"), detached_copy(course)
+            )
+            expected = parsed_dict(parsed)
+        except ParseError:
+            expected = None
+        stored = parsed_dict(course_data)
+        if args.reconstruct and not same(stored, expected):
+            print(f"Parsed data differs from the database for {name}")
+            mismatches += 1
+
+        manifest["courses"].append(
+            {
+                "file": name,
+                "url": course.url,
+                "cases": cases,
+                "expected": expected,
+            }
+        )
+
+    with open(os.path.join(FIXTURES_DIR, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+
+    print(
+        f"Wrote {len(manifest['listings'])} listing and"
+        f" {len(manifest['courses'])} course fixtures to {FIXTURES_DIR}"
+    )
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Admission grade calculator over the whole catalogue at once.
+
+Every way of satisfying a course's entrance exams (a set of exams, two of a
+list, or a required exam plus one of a list) is expanded into an "option" row
+of exam indexes, so a student's grades are scored against every option of
+every course with a few numpy operations, and the best eligible option of
+each course is picked with a grouped maximum.
+
+All grades use the DGES 0-200 scale, like the database.
+"""
+
+import math
+import sqlite3
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from datafiles import DATABASE_PATH
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 2000
+MAX_GRADE = 200
+
+
+def exam_options(
+    bundles: List[List[str]], is_combination: bool, is_bundle: bool
+) -> List[Tuple[str, ...]]:
+    """Sets of exams that satisfy the entrance exams of a course."""
+    if is_combination:
+        # A required exam and one of the others
+        (required, *_), *rest = bundles
+        others = {code for bundle in rest for code in bundle if code != required}
+        return [(required, code) for code in sorted(others)] or [(required,)]
+    if is_bundle:
+        # Two of the listed exams
+        return [
+            pair
+            for bundle in bundles
+            for pair in (combinations(bundle, 2) if len(bundle) > 1 else [tuple(bundle)])
+        ]
+    # One of the sets, every exam of a set is required
+    return [tuple(bundle) for bundle in bundles if bundle]
+
+
+def parse_exam_grades(text: str) -> Dict[str, float]:
+    """Parse exam grades given as "code:grade,code:grade" (e.g. "19:180,07:165.5")."""
+    exams = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        code, separator, grade = part.partition(":")
+        if not separator:
+            raise ValueError(f"Invalid exam grade: {part}")
+        exams[code.strip()] = float(grade)
+    return exams
+
+
+def read_request(args) -> dict:
+    """Calculator arguments from the query string of a request (ValueError if invalid)."""
+    year = args.get("year")
+    prerequisites = args.get("prerequisites")
+    try:
+        arguments = {
+            "hs_average": float(args["hs_average"]),
+            "exams": parse_exam_grades(args.get("exams", "")),
+            "prerequisites": float(prerequisites) if prerequisites else None,
+            "year": int(year) if year else None,
+            "phase": int(args.get("phase", 1)),
+        }
+    except (KeyError, ValueError) as e:
+        raise ValueError("Invalid grades") from e
+
+    try:
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError as e:
+        raise ValueError("Invalid limit") from e
+    arguments["limit"] = max(1, min(limit, MAX_LIMIT))
+    return arguments
+
+
+class GradeCalculator:
+    """Precomputed arrays of the formulas, minimums, exam options and grades."""
+
+    def __init__(self, courses: List[tuple], options: Dict[int, list], grades_last: list):
+        # courses: (unique ID, course ID, name, institution, weights..., minimums...)
+        self.count = len(courses)
+        self.ids = np.array([row[0] for row in courses], dtype=np.int64)
+        self.names = [(row[1], row[2], row[3]) for row in courses]
+        columns = np.array([row[4:] for row in courses], dtype=np.float64).reshape(-1, 5)
+        self.hs_weight, self.exam_weight, self.prerequisites_weight = (
+            np.nan_to_num(columns[:, :3].T) / 100
+        )
+        self.min_app_grade, self.min_exam_grade = columns[:, 3], columns[:, 4]
+        self.has_formula = ~np.isnan(columns[:, 0])
+
+        self.exam_codes = sorted(
+            {code for choices in options.values() for option in choices for code in option}
+        )
+        self.exam_index = {code: i for i, code in enumerate(self.exam_codes)}
+        padding = len(self.exam_codes)
+
+        # One row per option, grouped by course in row order
+        option_rows, option_exams = [], []
+        for row, unique_id in enumerate(self.ids.tolist()):
+            for option in options.get(unique_id, ()):
+                option_rows.append(row)
+                option_exams.append([self.exam_index[code] for code in option])
+        width = max((len(option) for option in option_exams), default=1)
+        self.option_rows = np.array(option_rows, dtype=np.int64)
+        # One row per exam slot, reducing along the first axis is much faster
+        self.option_exams = np.full((width, len(option_exams)), padding, dtype=np.int64)
+        for i, option in enumerate(option_exams):
+            self.option_exams[: len(option), i] = option
+        self.option_sizes = np.array([len(option) for option in option_exams], float)
+        self.option_min_exam = np.nan_to_num(self.min_exam_grade[self.option_rows])
+        self.rows_with_options = np.unique(self.option_rows)
+        self.option_starts = np.searchsorted(self.option_rows, self.rows_with_options)
+
+        # grades_last: (unique ID, year, phase 1 grade, phase 2 grade)
+        self.years = sorted({year for _, year, _, _ in grades_last})
+        row_of = {unique_id: row for row, unique_id in enumerate(self.ids.tolist())}
+        self.grade_last = np.full((len(self.years), 2, self.count), np.nan)
+        for unique_id, year, phase1, phase2 in grades_last:
+            year_index = self.years.index(year)
+            for phase, grade in enumerate((phase1, phase2)):
+                if grade is not None:
+                    self.grade_last[year_index, phase, row_of[unique_id]] = grade
+
+    def best_exam_scores(self, exams: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Best exam component of every course and the option it came from."""
+        values = np.full(len(self.exam_codes) + 1, np.nan)
+        values[-1] = 0  # padding
+        for code, grade in exams.items():
+            if code in self.exam_index:
+                values[self.exam_index[code]] = grade
+        floors = values.copy()
+        floors[-1] = np.inf
+
+        # NaN when the student lacks one of the exams
+        component = values[self.option_exams].sum(axis=0) / self.option_sizes
+        lowest = floors[self.option_exams].min(axis=0)
+        with np.errstate(invalid="ignore"):
+            eligible = lowest >= self.option_min_exam
+        component = np.where(eligible, component, -np.inf)
+
+        best = np.full(self.count, -np.inf)
+        best_option = np.full(self.count, -1, dtype=np.int64)
+        if len(component):
+            best[self.rows_with_options] = np.maximum.reduceat(component, self.option_starts)
+            # First option of each course reaching its best score
+            is_best = component == best[self.option_rows]
+            first = np.flatnonzero(is_best)
+            rows = self.option_rows[first]
+            keep = np.r_[True, rows[1:] != rows[:-1]]
+            best_option[rows[keep]] = first[keep]
+        return best, best_option
+
+    def calculate(
+        self,
+        hs_average: float,
+        exams: Dict[str, float],
+        prerequisites: Optional[float] = None,
+        year: Optional[int] = None,
+        phase: int = 1,
+        limit: int = DEFAULT_LIMIT,
+    ) -> dict:
+        """Application grade of every course the student can apply to, best first."""
+        for grade in (hs_average, prerequisites, *exams.values()):
+            if grade is not None and not 0 <= grade <= MAX_GRADE:
+                raise ValueError(f"Grades must be between 0 and {MAX_GRADE}")
+        if year is None:
+            year = self.years[-1] if self.years else None
+        if year not in self.years:
+            raise ValueError(f"No placement data for {year}")
+        if phase not in (1, 2):
+            raise ValueError("Phase must be 1 or 2")
+
+        best, best_option = self.best_exam_scores(exams)
+        with np.errstate(invalid="ignore"):  # no formula, 0 * -inf
+            grade = self.hs_weight * hs_average + self.exam_weight * best
+            if prerequisites is None:
+                grade = np.where(self.prerequisites_weight > 0, -np.inf, grade)
+            else:
+                grade = grade + self.prerequisites_weight * prerequisites
+            # DGES rounds the application grade to one decimal
+            grade = np.round(grade, 1)
+
+            eligible = (
+                self.has_formula
+                & np.isfinite(grade)
+                & (grade >= np.nan_to_num(self.min_app_grade))
+            )
+            grade_last = self.grade_last[self.years.index(year), phase - 1]
+            margin = grade - grade_last
+            reachable = eligible & (margin >= 0)
+
+        # Reachable courses first (most competitive first), then the ones without
+        # a last placed grade, then the closest misses
+        category = np.where(reachable, 0, np.where(np.isnan(grade_last), 1, 2))
+        secondary = np.where(
+            category == 0, -grade_last, np.where(category == 2, -margin, 0)
+        )
+        candidates = np.flatnonzero(eligible)
+        order = candidates[np.lexsort((secondary[candidates], category[candidates]))]
+
+        rows = order[:limit]
+        options = self.option_exams[:, best_option[rows]].T.tolist()
+        courses = []
+        for row, unique_id, application_grade, last, difference, option in zip(
+            rows.tolist(),
+            self.ids[rows].tolist(),
+            grade[rows].tolist(),
+            grade_last[rows].tolist(),
+            margin[rows].round(1).tolist(),
+            options,
+        ):
+            course_id, name, institution = self.names[row]
+            courses.append(
+                {
+                    "id": unique_id,
+                    "course_id": course_id,
+                    "name": name,
+                    "institution": institution,
+                    "application_grade": application_grade,
+                    "exams": [self.exam_codes[i] for i in option if i < len(self.exam_codes)],
+                    "grade_last": None if math.isnan(last) else last,
+                    "margin": None if math.isnan(difference) else difference,
+                }
+            )
+
+        return {
+            "year": year,
+            "phase": phase,
+            "eligible": int(eligible.sum()),
+            "reachable": int(reachable.sum()),
+            "courses": courses,
+        }
+
+
+def build_calculator(path: str = DATABASE_PATH) -> GradeCalculator:
+    """Build the calculator arrays from the database."""
+    # Like the serving engine: read only, and the file is replaced rather than modified
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+    try:
+        courses = conn.execute(
+            "SELECT coursedata.id, course.course_id, course.name, institution.name,"
+            " calculationformula.hs_average, calculationformula.entrance_exams,"
+            " calculationformula.prerequisites,"
+            " minimumclassification.application_grade,"
+            " minimumclassification.entrance_exams"
+            " FROM coursedata"
+            " JOIN course ON coursedata.course_id = course.id"
+            " JOIN institution ON course.institution_id = institution.id"
+            " LEFT JOIN calculationformula"
+            " ON coursedata.calculation_formula_id = calculationformula.id"
+            " LEFT JOIN minimumclassification"
+            " ON coursedata.min_classification_id = minimumclassification.id"
+            " ORDER BY coursedata.id"
+        ).fetchall()
+
+        bundles: Dict[int, Dict[int, List[str]]] = {}
+        flags = {}
+        for unique_id, is_combination, is_bundle, bundle_id, code in conn.execute(
+            "SELECT coursedata.id, entranceexams.is_combination, entranceexams.is_bundle,"
+            " exambundle.id, exam.code FROM coursedata"
+            " JOIN entranceexams ON coursedata.entrance_exams_id = entranceexams.id"
+            " JOIN exambundle ON exambundle.entrance_exams_id = entranceexams.id"
+            " JOIN exambundleexamlink AS link ON link.exam_bundle_id = exambundle.id"
+            " JOIN exam ON exam.id = link.exam_id"
+            " ORDER BY coursedata.id, exambundle.id, link.id"
+        ):
+            bundles.setdefault(unique_id, {}).setdefault(bundle_id, []).append(code)
+            flags[unique_id] = (bool(is_combination), bool(is_bundle))
+
+        grades_last = conn.execute(
+            "SELECT course_data_id, year,"
+            " MAX(CASE WHEN phase = 1 THEN grade_last END),"
+            " MAX(CASE WHEN phase = 2 THEN grade_last END)"
+            " FROM phasestats WHERE phase > 0 GROUP BY course_data_id, year"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    options = {
+        unique_id: exam_options(list(course_bundles.values()), *flags[unique_id])
+        for unique_id, course_bundles in bundles.items()
+    }
+    return GradeCalculator(courses, options, grades_last)
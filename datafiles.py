@@ -0,0 +1,60 @@
+"""Location and identity of the served database (no SQLAlchemy needed)."""
+
+import hashlib
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+DATABASE_PATH = "database.db"
+
+
+def database_build_id(path: str = DATABASE_PATH) -> str:
+    """Get an ID that changes whenever the database content changes."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def database_last_modified(path: str = DATABASE_PATH) -> datetime:
+    """Get the time the database was last modified."""
+    return datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+
+
+def build_path(path: str = DATABASE_PATH) -> str:
+    """Where a new version of a database is built before it replaces it."""
+    return path + ".tmp"
+
+
+def remove_database_files(path: str):
+    """Remove a database file with its journal files."""
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def copy_database(source: str, destination: str):
+    """Copy a database (with what is still in its WAL) to a new file."""
+    remove_database_files(destination)
+    source_conn = sqlite3.connect(source)
+    destination_conn = sqlite3.connect(destination)
+    try:
+        source_conn.backup(destination_conn)
+    finally:
+        destination_conn.close()
+        source_conn.close()
+
+
+def replace_database(new_path: str, path: str = DATABASE_PATH):
+    """Move a complete database over another one.
+
+    Servers open the database immutable and reload when the file changes, so
+    they must only ever see the old file or the complete new one.
+    """
+    for suffix in ("-journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.replace(new_path, path)
+    logging.info("Database written to %s", path)
@@ -0,0 +1,138 @@
+"""Exports the catalogue as a static, versioned bundle for CDN/edge serving."""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+from datafiles import database_build_id
+from query import course_data_to_dict, get_full_course_data
+from snapshot import SNAPSHOT_NAME, write_snapshot
+
+OUTPUT_DIR = os.path.join("static", "data")
+MANIFEST_NAME = "manifest.json"
+
+# Columns of the compact search index, in row order
+INDEX_FIELDS = [
+    "id",
+    "course_id",
+    "name",
+    "institution_id",
+    "institution_name",
+    "degree",
+    "current_vacancies",
+]
+
+
+def dump_compact(data) -> bytes:
+    """Serialize data as compact UTF-8 JSON."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_file(path: str, content: bytes, compress: bool = False):
+    """Write a file (and optionally a precompressed .gz copy next to it)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+    if compress:
+        # mtime=0 keeps the output byte-identical between runs
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+
+
+def build_index(courses: list) -> dict:
+    """Build the compact search index used by the client side search."""
+    rows = []
+    for course in courses:
+        characteristics = course.get("characteristics") or {}
+        rows.append(
+            [
+                course["id"],
+                course["course"]["id"],
+                course["course"]["name"],
+                course["course"]["institution"]["id"],
+                course["course"]["institution"]["name"],
+                characteristics.get("degree"),
+                characteristics.get("current_vacancies"),
+            ]
+        )
+
+    return {"fields": INDEX_FIELDS, "rows": rows}
+
+
+def export_bundle(output_dir: str = OUTPUT_DIR, prune: bool = False) -> dict:
+    """Export the full catalogue to a versioned static bundle and return its manifest."""
+    # The server only uses a snapshot exported from the database it serves
+    build_id = database_build_id()
+    courses = [course_data_to_dict(course) for course in get_full_course_data()]
+
+    catalogue = dump_compact(courses)
+    version = hashlib.sha1(catalogue).hexdigest()[:12]
+    version_dir = os.path.join(output_dir, version)
+
+    # Per course files, named after the unique ID used by /c/<course_id>
+    for course in courses:
+        write_file(
+            os.path.join(version_dir, "courses", f"{course['id']}.json"),
+            dump_compact(course),
+        )
+
+    write_file(
+        os.path.join(version_dir, "index.json"),
+        dump_compact(build_index(courses)),
+        compress=True,
+    )
+
+    # The full catalogue shard is only ever served compressed
+    write_file(
+        os.path.join(version_dir, "catalogue.json.gz"),
+        gzip.compress(catalogue, compresslevel=9, mtime=0),
+    )
+
+    write_snapshot(os.path.join(version_dir, SNAPSHOT_NAME), courses, build_id)
+
+    manifest = {
+        "version": version,
+        "build_id": build_id,
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "total_courses": len(courses),
+        "index": f"{version}/index.json",
+        "catalogue": f"{version}/catalogue.json.gz",
+        "courses": f"{version}/courses/",
+        "snapshot": f"{version}/{SNAPSHOT_NAME}",
+    }
+
+    # The manifest is written last so clients never see a half written version
+    write_file(
+        os.path.join(output_dir, MANIFEST_NAME),
+        json.dumps(manifest, indent=4).encode("utf-8"),
+    )
+
+    if prune:
+        for entry in os.listdir(output_dir):
+            path = os.path.join(output_dir, entry)
+            if entry != version and os.path.isdir(path):
+                shutil.rmtree(path)
+
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-o", "--output", default=OUTPUT_DIR, help="output directory for the bundle"
+    )
+    parser.add_argument(
+        "--prune", action="store_true", help="remove previously exported versions"
+    )
+    args = parser.parse_args()
+
+    result = export_bundle(args.output, prune=args.prune)
+    print(
+        f"Exported {result['total_courses']} course(s) "
+        f"as version {result['version']} to {args.output}"
+    )
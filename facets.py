@@ -0,0 +1,176 @@
+"""Facet counts (courses per degree, CNAEF area, region, exam...) from bitmaps.
+
+Every facet value keeps a Python int with bit N set when the course with unique
+ID N has that value, so counting the courses of every value under the current
+filters is a few ANDs and popcounts. Each facet is counted with the filters of
+the other facets applied, so the alternatives to the selected value stay
+visible. Filters that are not facets (names, grades...) go through SQL once to
+get the matching IDs.
+"""
+
+import sqlite3
+from typing import Dict, Iterable, Optional
+
+from datafiles import DATABASE_PATH
+from lazy import lazy_import
+
+query = lazy_import("query")
+
+# Search parameters answered from the bitmaps
+FACETS = ("degree", "cnaef", "type", "competition", "region", "exam_code")
+
+# Every other filter of query.apply_filters
+SQL_FILTERS = (
+    "course_id",
+    "course_name",
+    "institution_id",
+    "institution_name",
+    "unique_id",
+    "duration",
+    "ects",
+    "vacancies",
+    "min_app_grade",
+    "min_exam_grade",
+    "min_grade_last",
+    "max_grade_last",
+)
+
+
+def to_bitmap(ids: Iterable[int]) -> int:
+    """Bitmap with the bit of every ID set."""
+    bitmap = 0
+    for unique_id in ids:
+        bitmap |= 1 << unique_id
+    return bitmap
+
+
+class FacetIndex:
+    """Bitmaps of every facet value over the course unique IDs."""
+
+    def __init__(
+        self, all_courses: int, with_exams: int, values: Dict[str, Dict[str, int]]
+    ):
+        self.all_courses = all_courses
+        self.with_exams = with_exams
+        self.values = values
+
+    def selection(self, name: str, params: dict) -> Optional[int]:
+        """Bitmap of the courses the filter of a facet keeps (None if it is not set)."""
+        value = params[name]
+        if not value:
+            return None
+        bitmaps = self.values[name]
+        if name != "exam_code":
+            return bitmaps.get(value, 0)
+
+        codes = value if isinstance(value, list) else [value]
+        if params["exam_combination"] == "all":
+            selected = self.all_courses
+            for code in codes:
+                selected &= bitmaps.get(code, 0)
+            return selected
+
+        if params["exam_combination"] == "only":
+            # Courses requiring no exam outside the selected ones
+            others = 0
+            for code, bitmap in bitmaps.items():
+                if code not in codes:
+                    others |= bitmap
+            return self.with_exams & ~others
+
+        selected = 0
+        for code in codes:
+            selected |= bitmaps.get(code, 0)
+        return selected
+
+    def counts(self, params: dict, base: Optional[int] = None) -> dict:
+        """Matching courses and per value counts of every facet for normalized params."""
+        if base is None:
+            base = self.all_courses
+
+        selections = {}
+        for name in FACETS:
+            selected = self.selection(name, params)
+            if selected is not None:
+                selections[name] = selected
+
+        total = base
+        for selected in selections.values():
+            total &= selected
+
+        facets = {}
+        for name in FACETS:
+            mask = base
+            for other, selected in selections.items():
+                if other != name:
+                    mask &= selected
+
+            counts = [
+                (value, (mask & bitmap).bit_count())
+                for value, bitmap in self.values[name].items()
+            ]
+            counts.sort(key=lambda item: (-item[1], item[0]))
+            facets[name] = [
+                {"value": value, "count": count} for value, count in counts if count
+            ]
+
+        return {"total": total.bit_count(), "facets": facets}
+
+
+def facet_counts(index: FacetIndex, params: dict) -> dict:
+    """Facet counts for normalized search params, querying SQL only when needed."""
+    base = None
+    if any(params[name] for name in SQL_FILTERS):
+        sql_params = dict(params, **{name: None for name in FACETS})
+        base = to_bitmap(query.matching_ids(sql_params))
+    return index.counts(params, base)
+
+
+def build_facet_index(path: str = DATABASE_PATH) -> FacetIndex:
+    """Build the bitmaps from the database."""
+    # Like the serving engine: read only, and the file is replaced rather than modified
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+    try:
+        all_courses = to_bitmap(row[0] for row in conn.execute("SELECT id FROM coursedata"))
+        with_exams = to_bitmap(
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM coursedata WHERE entrance_exams_id IS NOT NULL"
+            )
+        )
+
+        values: Dict[str, Dict[str, int]] = {name: {} for name in FACETS}
+
+        def add(name, unique_id, value):
+            if value is not None:
+                values[name][value] = values[name].get(value, 0) | 1 << unique_id
+
+        for unique_id, degree, cnaef, kind, competition in conn.execute(
+            "SELECT coursedata.id, degree, CNAEF, type, competition FROM coursedata"
+            " JOIN characteristics ON coursedata.characteristics_id = characteristics.id"
+        ):
+            add("degree", unique_id, degree)
+            add("cnaef", unique_id, cnaef)
+            add("type", unique_id, kind)
+            add("competition", unique_id, competition)
+
+        for unique_id, region in conn.execute(
+            "SELECT coursedata.id, region.name FROM coursedata"
+            " JOIN regionalpreferenceregionlink AS link"
+            " ON link.regional_preference_id = coursedata.regional_preference_id"
+            " JOIN region ON region.id = link.region_id"
+        ):
+            add("region", unique_id, region)
+
+        for unique_id, code in conn.execute(
+            "SELECT coursedata.id, exam.code FROM coursedata"
+            " JOIN exambundle ON exambundle.entrance_exams_id"
+            " = coursedata.entrance_exams_id"
+            " JOIN exambundleexamlink AS link ON link.exam_bundle_id = exambundle.id"
+            " JOIN exam ON exam.id = link.exam_id"
+        ):
+            add("exam_code", unique_id, code)
+    finally:
+        conn.close()
+
+    return FacetIndex(all_courses, with_exams, values)
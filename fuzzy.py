@@ -0,0 +1,163 @@
+"""Typo tolerant name matching with a trigram index.
+
+Names are folded (lowercase, no accents) and split into the trigrams of their
+words ("  e", " en", "eng", ...). A query is scored against every name sharing
+one of its trigrams by the share of the query's trigrams the name contains, so
+"engenharia informatica" and "enjenharia informática" both find "Engenharia
+Informática". Name searches that find few courses fall back to the names
+matched here.
+"""
+
+import sqlite3
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from datafiles import DATABASE_PATH
+from lazy import lazy_import
+from snapshot import CatalogueSnapshot
+from suggest import SuggestionIndex, fold
+
+query = lazy_import("query")
+
+# Share of the query's trigrams a name must contain
+SIMILARITY_THRESHOLD = 0.6
+MAX_NAMES = 20
+
+# Shorter texts are still being typed, their prefix matches are enough
+MIN_SUGGESTION_LENGTH = 4
+
+# Name searches finding fewer courses than this also get the fuzzy matches
+FEW_RESULTS = 3
+FUZZY_PARAMETERS = ("course_name", "institution_name")
+
+
+def trigrams(text: str) -> set:
+    """Trigrams of the words of a folded text, padded like PostgreSQL's pg_trgm."""
+    grams = set()
+    for word in "".join(c if c.isalnum() else " " for c in text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to the names containing them."""
+
+    def __init__(self, names: Iterable[str]):
+        self.names = sorted(set(names))
+        self.sizes = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for position, name in enumerate(self.names):
+            grams = trigrams(fold(name))
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(position)
+
+    def search(
+        self,
+        text: str,
+        limit: int = MAX_NAMES,
+        threshold: float = SIMILARITY_THRESHOLD,
+    ) -> List[Tuple[str, float]]:
+        """Names most similar to the text, with their similarity (0 to 1)."""
+        grams = trigrams(fold(text))
+        if not grams:
+            return []
+
+        shared = defaultdict(int)
+        for gram in grams:
+            for position in self.postings.get(gram, ()):
+                shared[position] += 1
+
+        minimum = threshold * len(grams)
+        matches = [
+            # Shorter names first among equally similar ones
+            (count / len(grams), -self.sizes[position], position)
+            for position, count in shared.items()
+            if count >= minimum
+        ]
+        matches.sort(reverse=True)
+        return [
+            (self.names[position], round(similarity, 3))
+            for similarity, _, position in matches[:limit]
+        ]
+
+
+def build_fuzzy_indexes(
+    path: str = DATABASE_PATH, snapshot: Optional[CatalogueSnapshot] = None
+) -> Dict[str, TrigramIndex]:
+    """Trigram indexes of the course and institution names in the database (or snapshot)."""
+    if snapshot is not None:
+        courses = snapshot.courses()
+        return {
+            "course_name": TrigramIndex(row[2] for row in courses),
+            "institution_name": TrigramIndex(row[4] for row in courses),
+        }
+
+    # Like the serving engine: read only, and the file is replaced rather than modified
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+    try:
+        courses = [row[0] for row in conn.execute("SELECT DISTINCT name FROM course")]
+        institutions = [
+            row[0] for row in conn.execute("SELECT DISTINCT name FROM institution")
+        ]
+    finally:
+        conn.close()
+
+    return {
+        "course_name": TrigramIndex(courses),
+        "institution_name": TrigramIndex(institutions),
+    }
+
+
+def with_fuzzy_matches(indexes: Dict[str, TrigramIndex], config: dict, results) -> list:
+    """Add the courses with similar names when a name search found few of them."""
+    params = query.normalize_parameters(config)
+    limit = int(params["results_per_page"])
+    if len(results) >= min(FEW_RESULTS, limit):
+        return list(results)
+
+    # Ranked by query.full_search, most similar names first
+    fuzzy_params = dict(params)
+    for key in FUZZY_PARAMETERS:
+        if params[key] and params[f"{key}_operator"] == "contains":
+            names = [name for name, _ in indexes[key].search(params[key])]
+            if names:
+                fuzzy_params[key] = names
+                fuzzy_params[f"{key}_operator"] = "one_of"
+    if fuzzy_params == params:
+        return list(results)
+
+    seen = {course_data.id for course_data in results}
+    extra = [
+        course_data
+        for course_data in query.full_search(fuzzy_params)
+        if course_data.id not in seen
+    ]
+    return list(results) + extra[: limit - len(results)]
+
+
+def suggest(
+    suggestions: SuggestionIndex,
+    indexes: Dict[str, TrigramIndex],
+    text: str,
+    limit: int,
+) -> List[dict]:
+    """Prefix suggestions, completed with the most similar names when there are few."""
+    found = suggestions.lookup(text, limit)
+    if len(found) >= limit or len(fold(text).strip()) < MIN_SUGGESTION_LENGTH:
+        return found
+
+    matches = [
+        match for index in indexes.values() for match in index.search(text, limit)
+    ]
+    matches.sort(key=lambda match: -match[1])
+    seen = {id(entry) for entry in found}
+    for name, _ in matches:
+        for entry in suggestions.by_name.get(name, ()):
+            if id(entry) not in seen:
+                seen.add(id(entry))
+                found.append(entry)
+                if len(found) == limit:
+                    return found
+    return found
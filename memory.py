@@ -0,0 +1,228 @@
+"""Memory diagnostics for the server workers.
+
+As a module it provides the `/admin/memory` report: process RSS, live ORM
+objects per model class and, when tracing is enabled (FLASK_MEMORY_TRACE=true),
+memory kept and peak allocated per route plus the top allocators by module.
+Tracing with tracemalloc slows requests down noticeably.
+
+As a script it measures the footprint of a worker from import to steady state:
+
+    python memory.py --requests 200
+"""
+
+import argparse
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+TRACE_FRAMES = 10
+TOP_ALLOCATORS = 15
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak instead of current outside Linux (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def model_object_counts() -> Dict[str, int]:
+    """Live instances of every SQLModel table class (and SQLAlchemy sessions)."""
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy.orm import Session
+    from sqlmodel import SQLModel
+
+    tables = {
+        mapper.class_ for mapper in SQLModel._sa_registry.mappers  # pylint: disable=protected-access
+    }
+    counts = Counter()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if cls in tables:
+            counts[cls.__name__] += 1
+        elif isinstance(obj, Session):
+            counts["Session"] += 1
+    return dict(counts.most_common())
+
+
+def module_name(filename: str) -> str:
+    """Shorten a source file path to a dotted module like name."""
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path + os.sep):
+            filename = filename[len(path) + 1 :]
+            break
+    return filename.removesuffix(".py").replace(os.sep, ".")
+
+
+def top_allocators(snapshot, baseline=None, limit: int = TOP_ALLOCATORS) -> list:
+    """Biggest allocators grouped by module (growth since the baseline if given)."""
+    sizes = defaultdict(lambda: [0, 0])
+    if baseline is None:
+        for stat in snapshot.statistics("filename"):
+            entry = sizes[module_name(stat.traceback[0].filename)]
+            entry[0] += stat.size
+            entry[1] += stat.count
+    else:
+        for stat in snapshot.compare_to(baseline, "filename"):
+            entry = sizes[module_name(stat.traceback[0].filename)]
+            entry[0] += stat.size_diff
+            entry[1] += stat.count_diff
+
+    ordered = sorted(sizes.items(), key=lambda item: abs(item[1][0]), reverse=True)
+    return [
+        {"module": name, "size": size, "blocks": count}
+        for name, (size, count) in ordered[:limit]
+    ]
+
+
+class MemoryDiagnostics:
+    """Tracks memory around requests when tracing is enabled."""
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.routes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def before_request(self):
+        """Remember the traced memory when a request starts."""
+        if self.trace:
+            # Peaks are process wide, concurrent requests blur each other's
+            tracemalloc.reset_peak()
+            self._local.start = tracemalloc.get_traced_memory()[0]
+
+    def after_request(self, route: str):
+        """Record the memory a request kept and its allocation peak."""
+        start: Optional[int] = getattr(self._local, "start", None)
+        if not self.trace or start is None:
+            return
+        self._local.start = None
+
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            stats = self.routes.setdefault(
+                route, {"requests": 0, "kept": 0, "max_kept": 0, "max_peak": 0}
+            )
+            stats["requests"] += 1
+            stats["kept"] += current - start
+            stats["max_kept"] = max(stats["max_kept"], current - start)
+            stats["max_peak"] = max(stats["max_peak"], peak - start)
+
+    def summary(self) -> dict:
+        """Cheap figures of this process, shared with the other workers."""
+        with self._lock:
+            routes = {route: dict(stats) for route, stats in self.routes.items()}
+        summary = {"pid": os.getpid(), "rss": rss_bytes()}
+        if self.trace:
+            summary["traced"] = tracemalloc.get_traced_memory()[0]
+            summary["routes"] = routes
+        return summary
+
+    def report(self) -> dict:
+        """Footprint of this process."""
+        gc.collect()
+        report = {
+            "pid": os.getpid(),
+            "rss": rss_bytes(),
+            "gc_objects": len(gc.get_objects()),
+            "models": model_object_counts(),
+            "tracing": self.trace,
+        }
+        if self.trace:
+            current, _ = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            with self._lock:
+                routes = {route: dict(stats) for route, stats in self.routes.items()}
+            report["traced"] = current
+            report["routes"] = routes
+            # Only what was allocated since tracing started (at import)
+            report["top_allocators"] = top_allocators(snapshot)
+        return report
+
+
+def main():
+    """Measure a worker's memory footprint from import to steady state."""
+    parser = argparse.ArgumentParser(description="Measure the memory of a server worker.")
+    parser.add_argument("--requests", type=int, default=200, help="requests to send")
+    parser.add_argument(
+        "--no-trace",
+        action="store_true",
+        help="skip tracemalloc (faster, RSS and object counts only)",
+    )
+    args = parser.parse_args()
+
+    if not args.no_trace:
+        tracemalloc.start(TRACE_FRAMES)
+    steps = [("start", rss_bytes())]
+
+    os.environ.setdefault("FLASK_RATELIMIT_ENABLED", "false")
+    start = time.perf_counter()
+    import server  # pylint: disable=import-outside-toplevel
+
+    steps.append(("import server", rss_bytes()))
+    import_snapshot = tracemalloc.take_snapshot() if not args.no_trace else None
+
+    server.warm_up()
+    steps.append(("warm up", rss_bytes()))
+    startup = time.perf_counter() - start
+
+    # Same kind of traffic as benchmarks/loadtest.py, without the HTTP server
+    client = server.app.test_client()
+    paths = [
+        "/",
+        "/c/{id}",
+        "/api/search?unique_id={id}",
+        "/api/search?course_name=a&view=summary&results_per_page=100",
+        "/api/search?course_name=engenharia&sort_by=grade_desc",
+        "/api/search?region=Porto&results_per_page=50",
+    ]
+    for i in range(args.requests):
+        client.get(paths[i % len(paths)].format(id=i % 1500 + 1))
+        if i == args.requests // 2 - 1:
+            steps.append((f"{i + 1} requests", rss_bytes()))
+    steps.append((f"{args.requests} requests", rss_bytes()))
+
+    gc.collect()
+    print(f"Startup (import and warm up) took {startup:.2f} seconds\n")
+    print(f"{'step':<24} {'RSS MiB':>8}")
+    for name, rss in steps:
+        print(f"{name:<24} {rss / 2**20:>8.1f}")
+
+    print(f"\n{'live objects':<24} {'count':>8}")
+    counts = model_object_counts()
+    for name, count in counts.items():
+        print(f"{name:<24} {count:>8}")
+    if not counts:
+        print("none, no ORM objects or sessions outlive the requests")
+
+    if import_snapshot is not None:
+        snapshot = tracemalloc.take_snapshot()
+        print(f"\n{'top allocators':<40} {'KiB':>9} {'blocks':>8}")
+        for entry in top_allocators(snapshot):
+            print(
+                f"{entry['module'][-40:]:<40} {entry['size'] / 1024:>9.1f}"
+                f" {entry['blocks']:>8}"
+            )
+        print(f"\n{'growth after import':<40} {'KiB':>9} {'blocks':>8}")
+        for entry in top_allocators(snapshot, import_snapshot):
+            print(
+                f"{entry['module'][-40:]:<40} {entry['size'] / 1024:>+9.1f}"
+                f" {entry['blocks']:>+8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
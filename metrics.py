@@ -0,0 +1,231 @@
+"""Minimal Prometheus text format metrics.
+
+Values are kept per process. `Registry.state()` exports them so the values of
+every worker can be combined with `Registry.merge()` before rendering.
+"""
+
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from profiling import LATENCY_BUCKETS, Histogram
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _sum_states(states: List[list]) -> list:
+    """Add up [labels, value] pairs with the same labels."""
+    totals: Dict[Labels, float] = {}
+    for state in states:
+        for labels, value in state:
+            totals[tuple(labels)] = totals.get(tuple(labels), 0) + value
+    return [[list(labels), value] for labels, value in totals.items()]
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+    shared = True  # combined across the workers
+    cumulative = True  # kept after a worker exits
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        """Increment the counter of the given label values."""
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def state(self) -> list:
+        """[labels, value] pairs of this process."""
+        with self._lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+
+    @staticmethod
+    def merge(states: List[list]) -> list:
+        """Sum the states of several processes."""
+        return _sum_states(states)
+
+    def samples(self, state: Optional[list] = None) -> List[str]:
+        """Lines of the exposition format."""
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in (self.state() if state is None else state)
+        ]
+
+
+class Gauge:
+    """Gauge read from a callback when rendering.
+
+    Gauges of per process values (`per_worker`) are summed across the running
+    workers, the others are read by the process that renders them.
+    """
+
+    kind = "gauge"
+    cumulative = False
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Dict[Labels, float]],
+        labelnames: Labels = (),
+        per_worker: bool = False,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+        self.shared = per_worker
+
+    def state(self) -> list:
+        """[labels, value] pairs read from the callback."""
+        return [[list(labels), value] for labels, value in self.callback().items()]
+
+    @staticmethod
+    def merge(states: List[list]) -> list:
+        """Sum the states of several processes."""
+        return _sum_states(states)
+
+    def samples(self, state: Optional[list] = None) -> List[str]:
+        """Lines of the exposition format."""
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in (self.state() if state is None else state)
+        ]
+
+
+class LabeledHistogram:
+    """Histogram per label values."""
+
+    kind = "histogram"
+    shared = True
+    cumulative = True
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets=LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.histograms: Dict[Labels, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        """Record a value for the given label values."""
+        with self._lock:
+            histogram = self.histograms.get(labels)
+            if histogram is None:
+                histogram = self.histograms[labels] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def state(self) -> list:
+        """[labels, histogram state] pairs of this process."""
+        with self._lock:
+            items = list(self.histograms.items())
+        return [[list(labels), histogram.state()] for labels, histogram in items]
+
+    @staticmethod
+    def merge(states: List[list]) -> list:
+        """Add up the states of several processes."""
+        parts: Dict[Labels, List[dict]] = {}
+        for state in states:
+            for labels, histogram in state:
+                parts.setdefault(tuple(labels), []).append(histogram)
+        return [
+            [list(labels), Histogram.merge_states(histograms)]
+            for labels, histograms in parts.items()
+        ]
+
+    def samples(self, state: Optional[list] = None) -> List[str]:
+        """Lines of the exposition format (cumulative buckets)."""
+        lines = []
+        for labels, histogram_state in self.state() if state is None else state:
+            histogram = Histogram.from_state(histogram_state, self.buckets)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(histogram.sum)}")
+            lines.append(f"{self.name}_count{label_text} {histogram.count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """Add a metric and return it."""
+        self.metrics.append(metric)
+        return metric
+
+    def state(self) -> dict:
+        """Values of this process for the metrics combined across workers."""
+        return {metric.name: metric.state() for metric in self.metrics if metric.shared}
+
+    def merge(self, states: List[dict], cumulative_only: bool = False) -> dict:
+        """Combine the states of several processes.
+
+        With `cumulative_only` the gauges are left out, for the totals of the
+        workers that exited.
+        """
+        merged = {}
+        for metric in self.metrics:
+            if not metric.shared or (cumulative_only and not metric.cumulative):
+                continue
+            parts = [state[metric.name] for state in states if metric.name in state]
+            merged[metric.name] = metric.merge(parts)
+        return merged
+
+    def render(self, state: Optional[dict] = None) -> str:
+        """Render every metric in the Prometheus text exposition format.
+
+        `state` is the output of `merge()`, this process only if not given.
+        """
+        if state is None:
+            state = self.state()
+
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.shared:
+                lines.extend(metric.samples(state.get(metric.name, [])))
+            else:
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
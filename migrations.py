@@ -0,0 +1,376 @@
+"""Versioned, forward only upgrades of an existing database.db.
+
+The scraper always recreates the tables, so without these every schema change
+(a new index, column or derived table) would need a full re-crawl. Each
+migration upgrades the database from the previous version and the version is
+kept in SQLite's `PRAGMA user_version`, databases from before the versioning
+are recognized by their tables. A fresh scrape is stamped with the latest
+version. The migrations run on a copy (database.db.tmp) that replaces the
+database when they are all done, so running servers never see a half
+migrated file.
+
+    python migrations.py           # apply the pending migrations
+    python migrations.py --status  # show the version and the pending ones
+
+To change the schema, change the models and add a migration at the end of
+MIGRATIONS doing the same to an existing database (never edit an old one).
+"""
+
+import argparse
+import logging
+import sqlite3
+from typing import Callable, List, Optional, Union
+
+from sqlalchemy import create_engine
+
+from datafiles import (
+    DATABASE_PATH,
+    build_path,
+    copy_database,
+    remove_database_files,
+    replace_database,
+)
+
+
+def columns(conn: sqlite3.Connection, table: str) -> set:
+    """Column names of a table (empty if it doesn't exist)."""
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def has_table(conn: sqlite3.Connection, name: str) -> bool:
+    """Check if a table or index exists."""
+    return bool(
+        conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    )
+
+
+# Exams and regions stored once, linked to the bundles and regional preferences
+NORMALIZE_EXAMS_AND_REGIONS = """
+ALTER TABLE exam RENAME TO old_exam;
+CREATE TABLE exam (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    code VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (code)
+);
+CREATE TABLE exambundleexamlink (
+    id INTEGER NOT NULL,
+    exam_bundle_id INTEGER,
+    exam_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(exam_bundle_id) REFERENCES exambundle (id),
+    FOREIGN KEY(exam_id) REFERENCES exam (id)
+);
+CREATE INDEX ix_exambundleexamlink_exam_bundle_id
+    ON exambundleexamlink (exam_bundle_id);
+
+-- First name seen for every code, in the order they were scraped
+INSERT INTO exam (name, code)
+SELECT old_exam.name, old_exam.code FROM old_exam
+JOIN (SELECT MIN(id) AS id FROM old_exam GROUP BY code) AS first
+ON old_exam.id = first.id
+ORDER BY old_exam.id;
+INSERT INTO exambundleexamlink (exam_bundle_id, exam_id)
+SELECT old_exam.exam_bundle_id, exam.id FROM old_exam
+JOIN exam ON exam.code = old_exam.code
+ORDER BY old_exam.id;
+DROP TABLE old_exam;
+
+ALTER TABLE region RENAME TO old_region;
+CREATE TABLE region (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+CREATE TABLE regionalpreferenceregionlink (
+    id INTEGER NOT NULL,
+    regional_preference_id INTEGER,
+    region_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(regional_preference_id) REFERENCES regionalpreference (id),
+    FOREIGN KEY(region_id) REFERENCES region (id)
+);
+CREATE INDEX ix_regionalpreferenceregionlink_regional_preference_id
+    ON regionalpreferenceregionlink (regional_preference_id);
+
+INSERT INTO region (name)
+SELECT name FROM old_region GROUP BY name ORDER BY MIN(id);
+INSERT INTO regionalpreferenceregionlink (regional_preference_id, region_id)
+SELECT old_region.regional_preference_id, region.id FROM old_region
+JOIN region ON region.name = old_region.name
+ORDER BY old_region.id;
+DROP TABLE old_region;
+"""
+
+# One phasestats row per course, year and phase instead of five tables
+FLATTEN_PHASE_STATS = """
+CREATE TABLE phasestats (
+    course_data_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    phase INTEGER NOT NULL,
+    vacancies INTEGER,
+    grade_last FLOAT,
+    info_url VARCHAR,
+    has_candidates BOOLEAN NOT NULL,
+    candidates INTEGER,
+    candidates_fem INTEGER,
+    candidates_masc INTEGER,
+    candidates_first_option INTEGER,
+    has_placed BOOLEAN NOT NULL,
+    placed INTEGER,
+    placed_fem INTEGER,
+    placed_masc INTEGER,
+    placed_first_option INTEGER,
+    has_averages BOOLEAN NOT NULL,
+    average_application_grade FLOAT,
+    average_entrance_exams FLOAT,
+    average_hs_average FLOAT,
+    PRIMARY KEY (course_data_id, year, phase),
+    FOREIGN KEY(course_data_id) REFERENCES coursedata (id)
+) WITHOUT ROWID;
+
+INSERT INTO phasestats
+SELECT coursedata.id, yeardata.year, phases.phase,
+       phasedata.vacancies, phasedata.grade_last, phasedata.info_url,
+       candidates.id IS NOT NULL, candidates.total, candidates.fem,
+       candidates.masc, candidates.first_option,
+       placed.id IS NOT NULL, placed.total, placed.fem,
+       placed.masc, placed.first_option,
+       averages.id IS NOT NULL, averages.application_grade,
+       averages.entrance_exams, averages.hs_average
+FROM coursedata
+JOIN yeardata
+    ON yeardata.previous_applications_id = coursedata.previous_applications_id
+JOIN (
+    SELECT id AS year_id, 1 AS phase, phase1_id AS phase_id FROM yeardata
+    UNION ALL
+    SELECT id, 2, phase2_id FROM yeardata
+) AS phases ON phases.year_id = yeardata.id
+JOIN phasedata ON phasedata.id = phases.phase_id
+LEFT JOIN candidatestats AS candidates ON candidates.id = phasedata.candidates_id
+LEFT JOIN candidatestats AS placed ON placed.id = phasedata.placed_id
+LEFT JOIN averages ON averages.id = phasedata.averages_id
+ORDER BY coursedata.id, yeardata.year, phases.phase;
+
+-- Years without any phase are kept as a row of phase 0 without statistics
+INSERT INTO phasestats
+    (course_data_id, year, phase, has_candidates, has_placed, has_averages)
+SELECT coursedata.id, yeardata.year, 0, 0, 0, 0
+FROM coursedata
+JOIN yeardata
+    ON yeardata.previous_applications_id = coursedata.previous_applications_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM phasedata
+    WHERE phasedata.id IN (yeardata.phase1_id, yeardata.phase2_id)
+);
+
+-- SQLite can't drop a column with a foreign key, rebuild the table
+CREATE TABLE new_coursedata (
+    id INTEGER NOT NULL,
+    course_id VARCHAR,
+    characteristics_id INTEGER,
+    entrance_exams_id INTEGER,
+    min_classification_id INTEGER,
+    calculation_formula_id INTEGER,
+    regional_preference_id INTEGER,
+    other_access_preferences_id INTEGER,
+    prerequisites_id INTEGER,
+    extra_stats_url VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(course_id) REFERENCES course (id),
+    FOREIGN KEY(characteristics_id) REFERENCES characteristics (id),
+    FOREIGN KEY(entrance_exams_id) REFERENCES entranceexams (id),
+    FOREIGN KEY(min_classification_id) REFERENCES minimumclassification (id),
+    FOREIGN KEY(calculation_formula_id) REFERENCES calculationformula (id),
+    FOREIGN KEY(regional_preference_id) REFERENCES regionalpreference (id),
+    FOREIGN KEY(other_access_preferences_id)
+        REFERENCES otheraccesspreferences (id),
+    FOREIGN KEY(prerequisites_id) REFERENCES prerequisites (id)
+);
+INSERT INTO new_coursedata
+SELECT id, course_id, characteristics_id, entrance_exams_id,
+       min_classification_id, calculation_formula_id, regional_preference_id,
+       other_access_preferences_id, prerequisites_id, extra_stats_url
+FROM coursedata;
+DROP TABLE coursedata;
+ALTER TABLE new_coursedata RENAME TO coursedata;
+
+DROP TABLE yeardata;
+DROP TABLE previousapplications;
+DROP TABLE phasedata;
+DROP TABLE candidatestats;
+DROP TABLE averages;
+"""
+
+# Foreign keys looked up by the section loaders and the exam filters
+INDEX_FOREIGN_KEYS = """
+CREATE INDEX ix_exambundle_entrance_exams_id ON exambundle (entrance_exams_id);
+CREATE INDEX ix_shallowcourse_other_access_preferences_id
+    ON shallowcourse (other_access_preferences_id);
+"""
+
+
+def build_trends(path: str):
+    """Create and fill the trend aggregate tables from the stored statistics."""
+    # pylint: disable=import-outside-toplevel
+    from aggregates import update_aggregates
+
+    target = create_engine(f"sqlite:///{path}")
+    try:
+        update_aggregates(target)
+    finally:
+        target.dispose()
+
+
+class Migration:
+    """A schema change: SQL run in a transaction, or a function of the path."""
+
+    def __init__(
+        self,
+        description: str,
+        change: Union[str, Callable[[str], None]],
+        applied: Optional[Callable[[sqlite3.Connection], bool]] = None,
+    ):
+        self.description = description
+        self.change = change
+        # Recognizes the change in unversioned databases
+        self.applied = applied
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        "Store exams and regions once and link them to the courses",
+        NORMALIZE_EXAMS_AND_REGIONS,
+        lambda conn: "exam_bundle_id" not in columns(conn, "exam"),
+    ),
+    Migration(
+        "Flatten the yearly application statistics into phasestats",
+        FLATTEN_PHASE_STATS,
+        lambda conn: "previous_applications_id" not in columns(conn, "coursedata"),
+    ),
+    Migration(
+        "Compute the course and institution trend aggregates",
+        build_trends,
+        lambda conn: has_table(conn, "coursetrends"),
+    ),
+    Migration(
+        "Index the foreign keys of the exam bundles and shallow courses",
+        INDEX_FOREIGN_KEYS,
+        lambda conn: has_table(conn, "ix_exambundle_entrance_exams_id"),
+    ),
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Version of a database, detected from its tables if it predates the versioning."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version:
+        return version
+
+    # Every migration up to the first one that isn't there yet
+    for version, migration in enumerate(MIGRATIONS):
+        if not migration.applied(conn):
+            return version
+    return LATEST_VERSION
+
+
+def set_version(conn: sqlite3.Connection, version: int):
+    """Stamp a database with a version."""
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+
+def migrate(path: str, start: int):
+    """Apply the migrations after `start` to a database, in place."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        for version in range(start + 1, LATEST_VERSION + 1):
+            migration = MIGRATIONS[version - 1]
+            logging.info("Migration %d: %s...", version, migration.description)
+            if isinstance(migration.change, str):
+                # The version changes in the same transaction as the schema
+                conn.executescript(
+                    f"BEGIN;\n{migration.change}\n"
+                    f"PRAGMA user_version = {version};\nCOMMIT;"
+                )
+            else:
+                migration.change(path)
+                set_version(conn, version)
+
+        if start < LATEST_VERSION:
+            conn.execute("ANALYZE")
+            conn.execute("VACUUM")
+        else:
+            set_version(conn, start)  # stamp unversioned databases
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def upgrade(path: str = DATABASE_PATH) -> int:
+    """Apply the pending migrations in order, returns how many were applied.
+
+    Servers open the database immutable, so the migrations run on a copy that
+    then replaces it, like a new scrape.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        stamped = conn.execute("PRAGMA user_version").fetchone()[0] > 0
+        start = current_version(conn)
+    finally:
+        conn.close()
+
+    if start > LATEST_VERSION:
+        raise RuntimeError(
+            f"Database version {start} is newer than this code ({LATEST_VERSION})"
+        )
+    if start == LATEST_VERSION and stamped:
+        logging.info("Database is at version %d.", LATEST_VERSION)
+        return 0
+
+    new_path = build_path(path)
+    copy_database(path, new_path)
+    try:
+        migrate(new_path, start)
+    except BaseException:
+        remove_database_files(new_path)
+        raise
+    replace_database(new_path, path)
+
+    logging.info("Database is at version %d.", LATEST_VERSION)
+    return LATEST_VERSION - start
+
+
+def status(path: str = DATABASE_PATH):
+    """Print the version of a database and its pending migrations."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        version = current_version(conn)
+    finally:
+        conn.close()
+
+    print(f"{path} is at version {version} of {LATEST_VERSION}")
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f"  pending {number}: {migration.description}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--path", default=DATABASE_PATH, help="database to upgrade")
+    parser.add_argument(
+        "--status", action="store_true", help="only show the pending migrations"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    if args.status:
+        status(args.path)
+    else:
+        upgrade(args.path)
@@ -2,11 +2,64 @@
 
 from typing import List, Optional
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Field, Relationship, SQLModel, create_engine
 
-SQLITE_URL = "sqlite:///database.db"
+from datafiles import DATABASE_PATH
+
+SQLITE_URL = f"sqlite:///{DATABASE_PATH}"
 engine = create_engine(SQLITE_URL, echo=False)
 
+SERVING_POOL_SIZE = 8
+SERVING_MAX_OVERFLOW = 8
+# Compiled statements kept per engine, every filter/sort combination is one
+SERVING_QUERY_CACHE_SIZE = 2000
+
+# Applied to every connection of the serving engine
+SERVING_PRAGMAS = (
+    "query_only=ON",
+    "mmap_size=268435456",  # 256 MiB, more than the whole database
+    "cache_size=-16000",  # 16 MB of page cache per connection
+    "temp_store=MEMORY",  # sorts for ORDER BY/DISTINCT never touch disk
+)
+
+
+def create_serving_engine(
+    path: str = DATABASE_PATH,
+    immutable: bool = True,
+    pool_size: int = SERVING_POOL_SIZE,
+    max_overflow: int = SERVING_MAX_OVERFLOW,
+) -> Engine:
+    """Create a read only engine tuned for concurrent serving.
+
+    With `immutable` SQLite skips all locking and change detection, so the
+    database file must not be modified while it is open (restart instead).
+    """
+    url = f"sqlite:///file:{path}?mode=ro&uri=true"
+    if immutable:
+        url += "&immutable=1"
+
+    serving_engine = create_engine(
+        url,
+        echo=False,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        query_cache_size=SERVING_QUERY_CACHE_SIZE,
+        connect_args={"check_same_thread": False},
+    )
+
+    @event.listens_for(serving_engine, "connect")
+    def apply_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for pragma in SERVING_PRAGMAS:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
+    return serving_engine
+
 
 class Institution(SQLModel, table=True):
     """Model for an institution."""
@@ -28,79 +81,43 @@ class Course(SQLModel, table=True):
     institution: Optional[Institution] = Relationship(back_populates="courses")
 
 
-class CandidateStats(SQLModel, table=True):
-    """Model for the candidates statistics."""
-
-    id: Optional[int] = Field(default=None, primary_key=True)
-
-    is_placed: bool = Field(default=False)
-    total: Optional[int]
-    fem: Optional[int]
-    masc: Optional[int]
-    first_option: Optional[int]
-
-
-class Averages(SQLModel, table=True):
-    """Model for the averages of candidates."""
-
-    id: Optional[int] = Field(default=None, primary_key=True)
-
-    application_grade: Optional[float]
-    entrance_exams: Optional[float]
-    hs_average: Optional[float]
-
+class PhaseStats(SQLModel, table=True):
+    """Model for the application statistics of a course in a phase of a year.
 
-class PhaseData(SQLModel, table=True):
-    """Model for a phase with its data."""
+    One row per course, year and phase, clustered by course so the whole
+    history of a course is read with a single range scan. A year without any
+    phase statistics is kept as a row of phase 0.
+    """
 
-    id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = {"sqlite_with_rowid": False}
 
-    candidates_id: Optional[int] = Field(default=None, foreign_key="candidatestats.id")
-    placed_id: Optional[int] = Field(default=None, foreign_key="candidatestats.id")
-    averages_id: Optional[int] = Field(default=None, foreign_key="averages.id")
+    course_data_id: Optional[int] = Field(
+        default=None, foreign_key="coursedata.id", primary_key=True
+    )
+    year: int = Field(primary_key=True)
+    phase: int = Field(primary_key=True)
 
     vacancies: Optional[int]
-    candidates: Optional[CandidateStats] = Relationship(
-        sa_relationship_kwargs={"foreign_keys": "[PhaseData.candidates_id]"}
-    )
-    placed: Optional[CandidateStats] = Relationship(
-        sa_relationship_kwargs={"foreign_keys": "[PhaseData.placed_id]"}
-    )
-    averages: Optional[Averages] = Relationship()
     grade_last: Optional[float]
     info_url: Optional[str]
 
+    # Missing sections of the statistics table are told apart from empty ones
+    has_candidates: bool = Field(default=False)
+    candidates: Optional[int]
+    candidates_fem: Optional[int]
+    candidates_masc: Optional[int]
+    candidates_first_option: Optional[int]
 
-class YearData(SQLModel, table=True):
-    """Model for a year with its data."""
-
-    id: Optional[int] = Field(default=None, primary_key=True)
-    previous_applications_id: Optional[int] = Field(
-        default=None, foreign_key="previousapplications.id"
-    )
-
-    year: int
-
-    phase1_id: Optional[int] = Field(default=None, foreign_key="phasedata.id")
-    phase2_id: Optional[int] = Field(default=None, foreign_key="phasedata.id")
-
-    phase1: Optional["PhaseData"] = Relationship(
-        sa_relationship_kwargs={"foreign_keys": "[YearData.phase1_id]"}
-    )
-    phase2: Optional["PhaseData"] = Relationship(
-        sa_relationship_kwargs={"foreign_keys": "[YearData.phase2_id]"}
-    )
-    previous_applications: Optional["PreviousApplications"] = Relationship(
-        back_populates="year_data"
-    )
-
+    has_placed: bool = Field(default=False)
+    placed: Optional[int]
+    placed_fem: Optional[int]
+    placed_masc: Optional[int]
+    placed_first_option: Optional[int]
 
-class PreviousApplications(SQLModel, table=True):
-    """Model for the previous applications of a course."""
-
-    id: Optional[int] = Field(default=None, primary_key=True)
-
-    year_data: List[YearData] = Relationship(back_populates="previous_applications")
+    has_averages: bool = Field(default=False)
+    average_application_grade: Optional[float]
+    average_entrance_exams: Optional[float]
+    average_hs_average: Optional[float]
 
 
 class Characteristics(SQLModel, table=True):
@@ -118,14 +135,23 @@ class Characteristics(SQLModel, table=True):
 
 
 class Exam(SQLModel, table=True):
-    """Model for an exam."""
+    """Model for an exam (one row per exam code, shared by every course)."""
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
     name: str
-    code: str
-    exam_bundle_id: Optional[int] = Field(default=None, foreign_key="exambundle.id")
-    exam_bundle: Optional["ExamBundle"] = Relationship(back_populates="exams")
+    code: str = Field(unique=True)
+
+
+class ExamBundleExamLink(SQLModel, table=True):
+    """Link between a bundle and its exams, in the order of the course page."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    exam_bundle_id: Optional[int] = Field(
+        default=None, foreign_key="exambundle.id", index=True
+    )
+    exam_id: Optional[int] = Field(default=None, foreign_key="exam.id")
 
 
 class ExamBundle(SQLModel, table=True):
@@ -133,9 +159,12 @@ class ExamBundle(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
-    exams: List[Exam] = Relationship(back_populates="exam_bundle")
+    exams: List[Exam] = Relationship(
+        link_model=ExamBundleExamLink,
+        sa_relationship_kwargs={"order_by": "ExamBundleExamLink.id"},
+    )
     entrance_exams_id: Optional[int] = Field(
-        default=None, foreign_key="entranceexams.id"
+        default=None, foreign_key="entranceexams.id", index=True
     )
     entrance_exams: Optional["EntranceExams"] = Relationship(back_populates="exams")
 
@@ -151,17 +180,22 @@ class EntranceExams(SQLModel, table=True):
 
 
 class Region(SQLModel, table=True):
-    """Model for a region."""
+    """Model for a region (one row per name, shared by every course)."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    name: str = Field(unique=True)
+
+
+class RegionalPreferenceRegionLink(SQLModel, table=True):
+    """Link between a regional preference and its regions, in page order."""
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
-    name: str
     regional_preference_id: Optional[int] = Field(
-        default=None, foreign_key="regionalpreference.id"
-    )
-    regional_preference: Optional["RegionalPreference"] = Relationship(
-        back_populates="regions"
+        default=None, foreign_key="regionalpreference.id", index=True
     )
+    region_id: Optional[int] = Field(default=None, foreign_key="region.id")
 
 
 class RegionalPreference(SQLModel, table=True):
@@ -171,7 +205,8 @@ class RegionalPreference(SQLModel, table=True):
 
     percentage: float
     regions: List[Region] = Relationship(
-        back_populates="regional_preference",
+        link_model=RegionalPreferenceRegionLink,
+        sa_relationship_kwargs={"order_by": "RegionalPreferenceRegionLink.id"},
     )
 
 
@@ -183,7 +218,7 @@ class ShallowCourse(SQLModel, table=True):
     course_id: str
     name: str
     other_access_preferences_id: Optional[int] = Field(
-        default=None, foreign_key="otheraccesspreferences.id"
+        default=None, foreign_key="otheraccesspreferences.id", index=True
     )
     other_access_preferences: Optional["OtherAccessPreferences"] = Relationship(
         back_populates="courses",
@@ -239,9 +274,6 @@ class CourseData(SQLModel, table=True):
     characteristics_id: Optional[int] = Field(
         default=None, foreign_key="characteristics.id"
     )
-    previous_applications_id: Optional[int] = Field(
-        default=None, foreign_key="previousapplications.id"
-    )
     entrance_exams_id: Optional[int] = Field(
         default=None, foreign_key="entranceexams.id"
     )
@@ -263,12 +295,57 @@ class CourseData(SQLModel, table=True):
 
     course: Course = Relationship()
     characteristics: Characteristics = Relationship()
-    previous_applications: PreviousApplications = Relationship()
+    phase_stats: List[PhaseStats] = Relationship(
+        sa_relationship_kwargs={"order_by": "[PhaseStats.year, PhaseStats.phase]"}
+    )
     entrance_exams: Optional[EntranceExams] = Relationship()
     min_classification: Optional[MinimumClassification] = Relationship()
     calculation_formula: Optional[CalculationFormula] = Relationship()
     regional_preference: Optional[RegionalPreference] = Relationship()
     other_access_preferences: Optional[OtherAccessPreferences] = Relationship()
     prerequisites: Optional[Prerequisites] = Relationship()
+    # Filled in by aggregates.py, not by the scraper
+    trends: Optional["CourseTrends"] = Relationship(
+        sa_relationship_kwargs={"uselist": False, "viewonly": True}
+    )
 
     extra_stats_url: Optional[str]
+
+
+class CourseTrends(SQLModel, table=True):
+    """Model for the trends of a course across the years (see aggregates.py)."""
+
+    course_data_id: Optional[int] = Field(
+        default=None, primary_key=True, foreign_key="coursedata.id"
+    )
+
+    years: int
+    first_year: Optional[int]
+    last_year: Optional[int]
+    grade_last: Optional[float]
+    grade_drift: Optional[float] = Field(default=None, index=True)
+    fill_rate: Optional[float]
+    fill_rate_mean: Optional[float]
+    candidates_per_vacancy: Optional[float] = Field(default=None, index=True)
+    candidates_per_vacancy_mean: Optional[float]
+    first_option_share: Optional[float] = Field(default=None, index=True)
+    first_option_share_mean: Optional[float]
+
+
+class InstitutionTrends(SQLModel, table=True):
+    """Model for the trends of an institution across the years (see aggregates.py)."""
+
+    institution_id: Optional[str] = Field(
+        default=None, primary_key=True, foreign_key="institution.id"
+    )
+
+    courses: int
+    years: int
+    last_year: Optional[int]
+    vacancies: Optional[int]
+    candidates: Optional[int]
+    grade_last_mean: Optional[float]
+    grade_drift: Optional[float]
+    fill_rate: Optional[float]
+    candidates_per_vacancy: Optional[float]
+    first_option_share: Optional[float]
@@ -0,0 +1,251 @@
+"""Preforking WSGI launcher that shares warm state between worker processes.
+
+The master imports and warms the application once, binds the listening socket
+and then forks the workers, so everything built before the fork (imported
+modules, mappers, compiled statement caches, memory maps...) is shared copy on
+write. When one of the watched files changes and then stays unchanged for
+SETTLE_TIME (or on SIGHUP) the master warms up again and replaces the workers
+with a new generation, letting the old ones finish their in-flight requests
+first.
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from werkzeug.serving import make_server
+
+GRACEFUL_TIMEOUT = 30  # seconds old workers get to finish their requests
+POLL_INTERVAL = 1  # seconds between checks of the workers and watched files
+SETTLE_TIME = 5  # seconds a changed file must stay unchanged before reloading
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """Get a signature that changes when a file is modified or replaced."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class PreforkServer:
+    """Master process managing a pool of forked, threaded WSGI workers."""
+
+    def __init__(
+        self,
+        app,
+        warm_up: Callable[[], None],
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int = 2,
+        watch: Optional[List[str]] = None,
+        after_fork: Optional[Callable[[], None]] = None,
+        before_exit: Optional[Callable[[], None]] = None,
+        worker_exited: Optional[Callable[[int], None]] = None,
+    ):
+        self.app = app
+        self.warm_up = warm_up
+        self.after_fork = after_fork  # in every new worker
+        self.before_exit = before_exit  # in a worker, after its last request
+        self.worker_exited = worker_exited  # in the master, with the pid
+        self.host = host
+        self.port = port
+        self.worker_count = max(1, workers)
+        self.watch = {path: file_signature(path) for path in watch or []}
+        self.changed_at: Optional[float] = None  # last change not reloaded yet
+
+        self.socket: Optional[socket.socket] = None
+        self.workers: Set[int] = set()
+        self.retired: Dict[int, float] = {}  # pid -> time it was asked to stop
+        self.reload_requested = False
+        self.stopping = False
+
+    def run(self):
+        """Warm up, fork the workers and supervise them until stopped."""
+        self.socket = socket.create_server((self.host, self.port), reuse_port=False)
+        self.socket.set_inheritable(True)
+
+        self.warm()
+        for _ in range(self.worker_count):
+            self.spawn_worker()
+
+        logging.info(
+            "Serving on http://%s:%d with %d workers",
+            self.host,
+            self.port,
+            self.worker_count,
+        )
+
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+
+        while not self.stopping:
+            time.sleep(POLL_INTERVAL)
+            self.reap_workers()
+
+            if self.files_changed():
+                logging.info("Watched files changed, reloading workers")
+                self.reload_requested = True
+
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+
+        self.shutdown()
+
+    def handle_stop(self, *_):
+        """Signal handler for SIGTERM/SIGINT."""
+        self.stopping = True
+
+    def handle_reload(self, *_):
+        """Signal handler for SIGHUP."""
+        self.reload_requested = True
+
+    def warm(self):
+        """Warm up the application state in the master before forking."""
+        start = time.perf_counter()
+        self.warm_up()
+        logging.info("Warm up done in %.2f seconds", time.perf_counter() - start)
+
+    def files_changed(self) -> bool:
+        """Check if watched files changed and have stopped changing since."""
+        now = time.monotonic()
+        for path, signature in self.watch.items():
+            current = file_signature(path)
+            if current != signature:
+                self.watch[path] = current
+                self.changed_at = now
+
+        # A file still being written would reload the workers on every check
+        if self.changed_at is not None and now - self.changed_at >= SETTLE_TIME:
+            self.changed_at = None
+            return True
+        return False
+
+    def reload(self):
+        """Re-warm and replace every worker with a fresh one."""
+        try:
+            self.warm()
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error("Warm up failed, keeping the current workers: %s", e)
+            return
+
+        old_workers = self.workers
+        self.workers = set()
+        for _ in range(self.worker_count):
+            self.spawn_worker()
+
+        for pid in old_workers:
+            self.stop_worker(pid)
+
+    def spawn_worker(self):
+        """Fork a new worker process."""
+        pid = os.fork()
+        if pid:
+            self.workers.add(pid)
+            return
+
+        # Worker process, never returns
+        exit_code = 0
+        try:
+            self.run_worker()
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error("Worker %d crashed: %s", os.getpid(), e)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)  # pylint: disable=protected-access
+
+    def run_worker(self):
+        """Serve requests on the shared socket until asked to stop."""
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+
+        if self.after_fork:
+            self.after_fork()
+        # Threads started before serving (by after_fork) are not requests
+        background = set(threading.enumerate())
+
+        server = make_server(
+            self.host, self.port, self.app, threaded=True, fd=self.socket.fileno()
+        )
+
+        def stop(*_):
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever()
+
+        # Let in-flight requests finish before exiting
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while (
+            any(thread not in background for thread in threading.enumerate())
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.1)
+
+        if self.before_exit:
+            self.before_exit()
+
+    def stop_worker(self, pid: int):
+        """Ask a worker to finish its requests and exit."""
+        self.retired[pid] = time.monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.retired.pop(pid, None)
+
+    def reap_workers(self):
+        """Collect exited workers, replacing the ones that died unexpectedly."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+
+            if self.worker_exited and (pid in self.retired or pid in self.workers):
+                try:
+                    self.worker_exited(pid)
+                except Exception as e:  # pylint: disable=broad-except
+                    logging.error("Cleaning up after worker %d failed: %s", pid, e)
+
+            if pid in self.retired:
+                self.retired.pop(pid)
+            elif pid in self.workers:
+                self.workers.discard(pid)
+                if not self.stopping:
+                    logging.warning(
+                        "Worker %d exited unexpectedly (status %d), restarting",
+                        pid,
+                        status,
+                    )
+                    self.spawn_worker()
+
+        # Force old workers that outlived the graceful timeout
+        now = time.monotonic()
+        for pid, retired_at in list(self.retired.items()):
+            if now - retired_at > GRACEFUL_TIMEOUT + POLL_INTERVAL:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    self.retired.pop(pid, None)
+
+    def shutdown(self):
+        """Stop every worker and wait for them to exit."""
+        logging.info("Shutting down")
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+        self.workers.clear()
+
+        while self.retired:
+            time.sleep(0.1)
+            self.reap_workers()
+
+        self.socket.close()
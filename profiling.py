@@ -0,0 +1,425 @@
+"""Per request profiling of full_search, with a slow query log and histograms."""
+
+import contextvars
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from lazy import lazy_import
+
+# Only needed once something is profiled, keeps importing this module cheap
+query = lazy_import("query")
+
+SLOW_QUERY_SECONDS = 0.25
+SLOW_QUERY_LOG = "slow_queries.log"
+# Slow queries waiting for their plans (more are dropped), and plans kept per SQL
+SLOW_QUERY_QUEUE_SIZE = 100
+PLAN_CACHE_SIZE = 256
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    math.inf,
+)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, math.inf)  # bytes or rows
+SIZE_STATS = ("objects_loaded", "response_size")
+
+STAGES = ("build", "compile", "execute", "hydrate", "serialize", "total")
+
+# Options whose values are kept in the query shape (with every *_operator),
+# free text ones become "*"
+ENUMERATED_OPTIONS = {
+    "exam_combination",
+    "results_per_page",
+    "sort_by",
+    "grade_sort_phase",
+    "grade_sort_year",
+    "view",
+    "fields",
+}
+
+_current_profile: contextvars.ContextVar[Optional["SearchProfile"]] = (
+    contextvars.ContextVar("search_profile", default=None)
+)
+
+
+class Histogram:
+    """Thread safe histogram with fixed bucket upper bounds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record a value."""
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            self.count += 1
+            self.sum += value
+
+    def state(self) -> dict:
+        """Counts and sum, to be combined with the other workers' (JSON friendly)."""
+        with self._lock:
+            return {"counts": list(self.counts), "count": self.count, "sum": self.sum}
+
+    @staticmethod
+    def merge_states(states: List[dict]) -> dict:
+        """Add up histogram states with the same buckets."""
+        counts, count, total = None, 0, 0.0
+        for state in states:
+            counts = (
+                list(state["counts"])
+                if counts is None
+                else [a + b for a, b in zip(counts, state["counts"])]
+            )
+            count += state["count"]
+            total += state["sum"]
+        return {"counts": counts or [], "count": count, "sum": total}
+
+    @classmethod
+    def from_state(cls, state: dict, buckets=LATENCY_BUCKETS) -> "Histogram":
+        """Rebuild a histogram from its state."""
+        histogram = cls(buckets)
+        histogram.counts = list(state["counts"]) or histogram.counts
+        histogram.count = state["count"]
+        histogram.sum = state["sum"]
+        return histogram
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate a percentile (0-1) as the upper bound of its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        """Summary of the histogram (infinite bounds as "+Inf")."""
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "buckets": {
+                ("+Inf" if math.isinf(bound) else str(bound)): count
+                for bound, count in zip(self.buckets, self.counts)
+            },
+        }
+
+
+def query_shape(params: dict) -> str:
+    """Describe which options a search uses, without the free text values."""
+    parts = []
+    for key, value in params.items():
+        if value is None or value == query.DEFAULT_PARAMETERS[key]:
+            continue
+        enumerated = key in ENUMERATED_OPTIONS or key.endswith("_operator")
+        parts.append(f"{key}={value}" if enumerated else f"{key}=*")
+    return "&".join(parts) or "(defaults)"
+
+
+class SearchProfile:
+    """Timings and sizes of a single search request."""
+
+    def __init__(self, params: dict):
+        self.params = params
+        self.shape = query_shape(params)
+        self.timings = dict.fromkeys(STAGES, 0.0)
+        self.statements: List[tuple] = []
+        self.objects_loaded = 0
+        self.courses = 0
+        self.response_size = 0
+        self.engine = None  # of the first statement, for the query plans
+
+        self.start = time.perf_counter()
+        self._first_execute: Optional[float] = None
+        self._execute_start = 0.0
+        self._cursor_start = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block of code as one of the stages."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def to_dict(self) -> dict:
+        """JSON friendly representation for the slow query log."""
+        return {
+            "shape": self.shape,
+            "params": {
+                k: v
+                for k, v in self.params.items()
+                if v != query.DEFAULT_PARAMETERS[k]
+            },
+            "timings": {k: round(v, 6) for k, v in self.timings.items()},
+            "courses": self.courses,
+            "objects_loaded": self.objects_loaded,
+            "response_size": self.response_size,
+        }
+
+
+class SearchProfiler:
+    """Collects search profiles through SQLAlchemy events and aggregates them."""
+
+    def __init__(
+        self,
+        slow_query_seconds: float = SLOW_QUERY_SECONDS,
+        slow_query_log: str = SLOW_QUERY_LOG,
+    ):
+        self.slow_query_seconds = slow_query_seconds
+        self.stats: Dict[str, Dict[str, Histogram]] = {}
+        self._lock = threading.Lock()
+        self._listening = False
+        self._slow_queue: Optional[queue.Queue] = None
+        self._writer_pid: Optional[int] = None
+        self._plans: Dict[str, List[str]] = {}
+
+        self.slow_log = logging.getLogger("slow_queries")
+        self.slow_log.propagate = False
+        if slow_query_log and not self.slow_log.handlers:
+            # Opened by the first slow query, not when the app is imported
+            handler = logging.FileHandler(slow_query_log, encoding="utf-8", delay=True)
+            handler.setFormatter(
+                logging.Formatter("%(asctime)s - %(message)s", "%Y-%m-%d %H:%M:%S")
+            )
+            self.slow_log.addHandler(handler)
+
+    def listen(self):
+        """Subscribe to the SQLAlchemy events of every engine (once)."""
+        # pylint: disable=import-outside-toplevel
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from sqlalchemy.orm import Mapper
+
+        with self._lock:
+            if self._listening:
+                return
+            event.listen(Engine, "before_execute", self._before_execute)
+            event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+            event.listen(Mapper, "load", self._on_load)
+            self._listening = True
+
+    @staticmethod
+    def _before_execute(*_):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile._execute_start = time.perf_counter()
+            if profile._first_execute is None:
+                profile._first_execute = profile._execute_start
+
+    @staticmethod
+    def _before_cursor_execute(conn, _cursor, statement, parameters, *_):
+        profile = _current_profile.get()
+        if profile is not None:
+            if profile.engine is None:
+                profile.engine = conn.engine
+            now = time.perf_counter()
+            # Statement compilation happens between these two events
+            if profile._execute_start:
+                profile.timings["compile"] += now - profile._execute_start
+                profile._execute_start = 0.0
+            profile._cursor_start = now
+            profile.statements.append((statement, parameters))
+
+    @staticmethod
+    def _after_cursor_execute(*_):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.timings["execute"] += time.perf_counter() - profile._cursor_start
+
+    @staticmethod
+    def _on_load(*_):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.objects_loaded += 1
+
+    @contextmanager
+    def profile(self, params: dict):
+        """Profile the search run inside the block."""
+        if not self._listening:
+            self.listen()
+        profile = SearchProfile(params)
+        token = _current_profile.set(profile)
+        try:
+            yield profile
+        finally:
+            _current_profile.reset(token)
+            self.record(profile)
+
+    def record(self, profile: SearchProfile):
+        """Aggregate a finished profile and log it if it was slow."""
+        timings = profile.timings
+        timings["total"] = time.perf_counter() - profile.start
+        if profile._first_execute is not None:
+            timings["build"] = profile._first_execute - profile.start
+        timings["hydrate"] = max(
+            0.0,
+            timings["total"]
+            - timings["build"]
+            - timings["compile"]
+            - timings["execute"]
+            - timings["serialize"],
+        )
+
+        with self._lock:
+            if profile.shape not in self.stats:
+                self.stats[profile.shape] = {
+                    **{stage: Histogram() for stage in STAGES},
+                    **{name: Histogram(SIZE_BUCKETS) for name in SIZE_STATS},
+                }
+            stats = self.stats[profile.shape]
+
+        for stage in STAGES:
+            stats[stage].observe(timings[stage])
+        stats["objects_loaded"].observe(profile.objects_loaded)
+        stats["response_size"].observe(profile.response_size)
+
+        if timings["total"] >= self.slow_query_seconds:
+            self.log_slow_query(profile)
+
+    def start_writer(self):
+        """Start the thread writing the slow query log of this process (once)."""
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            # A forked worker has the queue of its parent but not its thread
+            self._slow_queue = queue.Queue(maxsize=SLOW_QUERY_QUEUE_SIZE)
+            self._writer_pid = os.getpid()
+            threading.Thread(
+                target=self._write_slow_queries,
+                args=(self._slow_queue,),
+                name="slow-query-log",
+                daemon=True,
+            ).start()
+
+    def flush(self):
+        """Wait until the queued slow queries are written."""
+        if self._writer_pid == os.getpid():
+            self._slow_queue.join()
+
+    def log_slow_query(self, profile: SearchProfile):
+        """Queue a profile for the slow query log, the request doesn't wait for it."""
+        self.start_writer()
+        try:
+            self._slow_queue.put_nowait(profile)
+        except queue.Full:
+            logging.warning("Slow query log is behind, dropped %s", profile.shape)
+
+    def _write_slow_queries(self, profiles: queue.Queue):
+        while True:
+            profile = profiles.get()
+            try:
+                self.write_slow_query(profile)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Could not write to the slow query log")
+            finally:
+                profiles.task_done()
+
+    def write_slow_query(self, profile: SearchProfile):
+        """Write a profile, its SQL and the query plans to the slow query log."""
+        entry = profile.to_dict()
+        entry["statements"] = []
+        if profile.engine is None:  # nothing was executed
+            self.slow_log.warning(json.dumps(entry, ensure_ascii=False, default=str))
+            return
+
+        # The plan only depends on the SQL, explain each statement once
+        if len(self._plans) + len(profile.statements) > PLAN_CACHE_SIZE:
+            self._plans.clear()
+        missing = [
+            (statement, parameters)
+            for statement, parameters in profile.statements
+            if statement not in self._plans
+        ]
+        if missing:
+            with profile.engine.connect() as conn:
+                for statement, parameters in missing:
+                    plan = conn.exec_driver_sql(
+                        f"EXPLAIN QUERY PLAN {statement}", parameters
+                    ).all()
+                    self._plans[statement] = [row[-1] for row in plan]
+
+        for statement, parameters in profile.statements:
+            entry["statements"].append(
+                {
+                    "sql": statement,
+                    "parameters": list(parameters),
+                    "plan": self._plans[statement],
+                }
+            )
+        self.slow_log.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def state(self) -> dict:
+        """Histogram states per query shape (JSON friendly)."""
+        with self._lock:
+            items = list(self.stats.items())
+        return {
+            shape: {name: histogram.state() for name, histogram in stats.items()}
+            for shape, stats in items
+        }
+
+    @staticmethod
+    def merge(states: List[dict]) -> dict:
+        """Combine the states of several processes."""
+        parts: Dict[str, Dict[str, List[dict]]] = {}
+        for state in states:
+            for shape, stats in state.items():
+                for name, histogram in stats.items():
+                    parts.setdefault(shape, {}).setdefault(name, []).append(histogram)
+        return {
+            shape: {name: Histogram.merge_states(h) for name, h in stats.items()}
+            for shape, stats in parts.items()
+        }
+
+    def report(self, state: Optional[dict] = None) -> dict:
+        """Aggregated histograms per query shape, slowest shapes first."""
+        if state is None:
+            state = self.state()
+
+        report = {
+            shape: {
+                name: Histogram.from_state(
+                    histogram, SIZE_BUCKETS if name in SIZE_STATS else LATENCY_BUCKETS
+                ).to_dict()
+                for name, histogram in stats.items()
+            }
+            for shape, stats in state.items()
+        }
+        return dict(
+            sorted(
+                report.items(),
+                key=lambda item: item[1]["total"]["mean"] or 0,
+                reverse=True,
+            )
+        )
@@ -2,57 +2,93 @@
 
 import gzip
 import json
-from typing import Sequence
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
 
-from sqlalchemy import or_, true
-from sqlalchemy.orm import joinedload
+from sqlalchemy import case
+from sqlalchemy.orm import joinedload, selectinload
 from sqlmodel import Session, select
 
 from models import (
-    Averages,
     Characteristics,
     Course,
     CourseData,
+    CourseTrends,
     EntranceExams,
+    Exam,
     ExamBundle,
     Institution,
+    InstitutionTrends,
     MinimumClassification,
     OtherAccessPreferences,
-    PhaseData,
-    PreviousApplications,
+    PhaseStats,
+    Region,
     RegionalPreference,
-    YearData,
-    engine,
+    create_serving_engine,
 )
 
-QUERY_TEMPLATE = select(CourseData).options(
-    joinedload(CourseData.course).joinedload(Course.institution),
-    joinedload(CourseData.characteristics),
-    joinedload(CourseData.previous_applications)
-    .selectinload(PreviousApplications.year_data)
-    .options(
-        joinedload(YearData.phase1).options(
-            joinedload(PhaseData.candidates),
-            joinedload(PhaseData.placed),
-            joinedload(PhaseData.averages),
-        ),
-        joinedload(YearData.phase2).options(
-            joinedload(PhaseData.candidates),
-            joinedload(PhaseData.placed),
-            joinedload(PhaseData.averages),
-        ),
-    ),
-    joinedload(CourseData.entrance_exams)
-    .selectinload(EntranceExams.exams)
-    .selectinload(ExamBundle.exams),
-    joinedload(CourseData.min_classification),
-    joinedload(CourseData.calculation_formula),
-    joinedload(CourseData.regional_preference).selectinload(RegionalPreference.regions),
-    joinedload(CourseData.other_access_preferences).selectinload(
-        OtherAccessPreferences.courses
-    ),
-    joinedload(CourseData.prerequisites),
-)
+engine = create_serving_engine()
+
+# Eager loading options for each optional section of course_data_to_dict
+SECTION_LOADERS = {
+    "last_grade": [joinedload(CourseData.trends)],
+    "characteristics": [joinedload(CourseData.characteristics)],
+    "historical_data": [selectinload(CourseData.phase_stats)],
+    "entrance_exams": [
+        joinedload(CourseData.entrance_exams)
+        .selectinload(EntranceExams.exams)
+        .selectinload(ExamBundle.exams)
+    ],
+    "min_classification": [joinedload(CourseData.min_classification)],
+    "calculation_formula": [joinedload(CourseData.calculation_formula)],
+    "regional_preference": [
+        joinedload(CourseData.regional_preference).selectinload(
+            RegionalPreference.regions
+        )
+    ],
+    "other_access_preferences": [
+        joinedload(CourseData.other_access_preferences).selectinload(
+            OtherAccessPreferences.courses
+        )
+    ],
+    "prerequisites": [joinedload(CourseData.prerequisites)],
+}
+
+# What the result list shows besides the names (the rest loads on expand)
+SUMMARY_FIELDS = ("last_grade",)
+
+
+@lru_cache(maxsize=None)
+def query_template(fields: Optional[Tuple[str, ...]] = None):
+    """Get the select loading the given sections (all of them by default)."""
+    if fields is None:
+        fields = tuple(SECTION_LOADERS)
+
+    options = [joinedload(CourseData.course).joinedload(Course.institution)]
+    for field in fields:
+        options.extend(SECTION_LOADERS[field])
+
+    return select(CourseData).options(*options)
+
+
+# Sorts on the precomputed trends (see aggregates.py)
+TREND_SORTS = {
+    "competition_desc": CourseTrends.candidates_per_vacancy.desc(),
+    "competition_asc": CourseTrends.candidates_per_vacancy.asc(),
+    "grade_drift_desc": CourseTrends.grade_drift.desc(),
+    "grade_drift_asc": CourseTrends.grade_drift.asc(),
+    "first_option_desc": CourseTrends.first_option_share.desc(),
+}
+
+
+# Sorts on the application statistics of a phase
+GRADE_SORTS = {
+    "grade_asc": PhaseStats.grade_last.asc(),
+    "grade_desc": PhaseStats.grade_last.desc(),
+    "average_asc": PhaseStats.average_hs_average.asc(),
+    "average_desc": PhaseStats.average_hs_average.desc(),
+}
+
 
 # Define default parameters
 DEFAULT_PARAMETERS = {
@@ -100,14 +136,21 @@ DEFAULT_PARAMETERS = {
     "sort_by": "course_id",
     "grade_sort_phase": "1",
     "grade_sort_year": "latest",
+    # Response shape
+    "view": "full",
+    "fields": None,
 }
 
 
-def full_search(config: dict) -> Sequence[CourseData]:
-    """Full search with all parameters for the webserver."""
+def get_full_course_data() -> Sequence[CourseData]:
+    """Get every course with all of its data."""
+    with Session(engine) as session:
+        query = query_template().join(CourseData.course).order_by(Course.course_id)
+        return session.exec(query).unique().all()
 
-    if not config:
-        return []
+
+def normalize_parameters(config: dict) -> dict:
+    """Merge a search config with the defaults, dropping unknown options."""
 
     # Filter config to only include known options
     params = DEFAULT_PARAMETERS.copy()
@@ -120,384 +163,399 @@ def full_search(config: dict) -> Sequence[CourseData]:
     # Check and set default for results per page
     if params["results_per_page"] not in ("10", "25", "50", "100"):
         params["results_per_page"] = "10"
-    limit = int(params["results_per_page"])
 
-    with Session(engine) as session:
-        query = QUERY_TEMPLATE
+    return params
 
-        # Basic information
-        if params["course_id"]:
-            if params["course_id_operator"] == "exact":
-                query = query.where(
-                    CourseData.course.has(Course.course_id == params["course_id"])
-                )
-            elif params["course_id_operator"] == "contains":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.course_id.like(f"%{params['course_id']}%")
-                    )
+
+def resolve_fields(params: dict) -> Optional[Tuple[str, ...]]:
+    """Get the sections to load/serialize for normalized params (None means all)."""
+    if params["fields"]:
+        requested = {field.strip() for field in params["fields"].split(",")}
+        return tuple(field for field in SECTION_LOADERS if field in requested)
+    if params["view"] == "summary":
+        return SUMMARY_FIELDS
+    return None
+
+
+def estimate_search_cost(params: dict) -> int:
+    """Estimate the relative cost of a search (1 for the cheapest ones)."""
+    cost = 1
+
+    # Every page of 25 courses to hydrate and serialize
+    cost += int(params["results_per_page"]) // 25
+    if resolve_fields(params) is None or "historical_data" in resolve_fields(params):
+        cost += 1
+
+    # Sorts and filters going through the application statistics of every year
+    if params["sort_by"] in ("grade_asc", "grade_desc", "average_asc", "average_desc"):
+        cost += 2
+    if params["min_grade_last"] or params["max_grade_last"]:
+        cost += 2
+
+    if params["exam_code"]:
+        cost += 2 if params["exam_combination"] == "only" else 1
+
+    return cost
+
+
+def as_list(value) -> list:
+    """The value itself if it is a list, else a list with it."""
+    return value if isinstance(value, list) else [value]
+
+
+def apply_filters(query, params: dict):
+    """Add the WHERE clauses of the search filters in params to a select."""
+    # Basic information
+    if params["course_id"]:
+        if params["course_id_operator"] == "exact":
+            query = query.where(
+                CourseData.course.has(Course.course_id == params["course_id"])
+            )
+        elif params["course_id_operator"] == "contains":
+            query = query.where(
+                CourseData.course.has(
+                    Course.course_id.like(f"%{params['course_id']}%")
                 )
-            elif params["course_id_operator"] == "starts_with":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.course_id.like(f"{params['course_id']}%")
-                    )
+            )
+        elif params["course_id_operator"] == "starts_with":
+            query = query.where(
+                CourseData.course.has(
+                    Course.course_id.like(f"{params['course_id']}%")
                 )
+            )
 
-        if params["course_name"]:
-            if params["course_name_operator"] == "exact":
-                query = query.where(
-                    CourseData.course.has(Course.name == params["course_name"])
-                )
-            elif params["course_name_operator"] == "contains":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.name.like(f"%{params['course_name']}%")
-                    )
+    if params["course_name"]:
+        if params["course_name_operator"] == "exact":
+            query = query.where(
+                CourseData.course.has(Course.name == params["course_name"])
+            )
+        elif params["course_name_operator"] == "contains":
+            query = query.where(
+                CourseData.course.has(
+                    Course.name.like(f"%{params['course_name']}%")
                 )
-            elif params["course_name_operator"] == "starts_with":
-                query = query.where(
-                    CourseData.course.has(Course.name.like(f"{params['course_name']}%"))
+            )
+        elif params["course_name_operator"] == "starts_with":
+            query = query.where(
+                CourseData.course.has(Course.name.like(f"{params['course_name']}%"))
+            )
+        elif params["course_name_operator"] == "one_of":
+            # Names matched by the fuzzy search (see fuzzy.py)
+            query = query.where(
+                CourseData.course.has(
+                    Course.name.in_(as_list(params["course_name"]))
                 )
+            )
 
-        if params["institution_id"]:
-            if params["institution_id_operator"] == "exact":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.institution_id == params["institution_id"]
-                    )
+    if params["institution_id"]:
+        if params["institution_id_operator"] == "exact":
+            query = query.where(
+                CourseData.course.has(
+                    Course.institution_id == params["institution_id"]
                 )
-            elif params["institution_id_operator"] == "contains":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.institution_id.like(f"%{params['institution_id']}%")
-                    )
+            )
+        elif params["institution_id_operator"] == "contains":
+            query = query.where(
+                CourseData.course.has(
+                    Course.institution_id.like(f"%{params['institution_id']}%")
                 )
-            elif params["institution_id_operator"] == "starts_with":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.institution_id.like(f"{params['institution_id']}%")
-                    )
+            )
+        elif params["institution_id_operator"] == "starts_with":
+            query = query.where(
+                CourseData.course.has(
+                    Course.institution_id.like(f"{params['institution_id']}%")
                 )
+            )
 
-        if params["institution_name"]:
-            if params["institution_name_operator"] == "exact":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.institution.has(
-                            Institution.name == params["institution_name"]
-                        )
+    if params["institution_name"]:
+        if params["institution_name_operator"] == "exact":
+            query = query.where(
+                CourseData.course.has(
+                    Course.institution.has(
+                        Institution.name == params["institution_name"]
                     )
                 )
-            elif params["institution_name_operator"] == "contains":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.institution.has(
-                            Institution.name.like(f"%{params['institution_name']}%")
-                        )
+            )
+        elif params["institution_name_operator"] == "contains":
+            query = query.where(
+                CourseData.course.has(
+                    Course.institution.has(
+                        Institution.name.like(f"%{params['institution_name']}%")
                     )
                 )
-            elif params["institution_name_operator"] == "starts_with":
-                query = query.where(
-                    CourseData.course.has(
-                        Course.institution.has(
-                            Institution.name.like(f"{params['institution_name']}%")
-                        )
+            )
+        elif params["institution_name_operator"] == "starts_with":
+            query = query.where(
+                CourseData.course.has(
+                    Course.institution.has(
+                        Institution.name.like(f"{params['institution_name']}%")
                     )
                 )
+            )
+        elif params["institution_name_operator"] == "one_of":
+            query = query.where(
+                CourseData.course.has(
+                    Course.institution.has(
+                        Institution.name.in_(as_list(params["institution_name"]))
+                    )
+                )
+            )
 
-        if params["unique_id"]:
-            query = query.where(CourseData.id == params["unique_id"])
+    if params["unique_id"]:
+        query = query.where(CourseData.id == params["unique_id"])
 
-        # Characteristics filters
-        if params["degree"]:
-            query = query.where(CourseData.characteristics.has(degree=params["degree"]))
+    # Characteristics filters
+    if params["degree"]:
+        query = query.where(CourseData.characteristics.has(degree=params["degree"]))
 
-        if params["cnaef"]:
-            query = query.where(CourseData.characteristics.has(CNAEF=params["cnaef"]))
+    if params["cnaef"]:
+        query = query.where(CourseData.characteristics.has(CNAEF=params["cnaef"]))
 
-        if params["duration"]:
-            query = query.where(
-                CourseData.characteristics.has(duration=params["duration"])
-            )
+    if params["duration"]:
+        query = query.where(
+            CourseData.characteristics.has(duration=params["duration"])
+        )
 
-        if params["ects"]:
-            if params["ects_operator"] == "equal":
-                query = query.where(CourseData.characteristics.has(ECTS=params["ects"]))
-            elif params["ects_operator"] == "less":
-                query = query.where(
-                    CourseData.characteristics.has(
-                        Characteristics.ECTS < float(params["ects"])
-                    )
+    if params["ects"]:
+        if params["ects_operator"] == "equal":
+            query = query.where(CourseData.characteristics.has(ECTS=params["ects"]))
+        elif params["ects_operator"] == "less":
+            query = query.where(
+                CourseData.characteristics.has(
+                    Characteristics.ECTS < float(params["ects"])
                 )
-            elif params["ects_operator"] == "greater":
-                query = query.where(
-                    CourseData.characteristics.has(
-                        Characteristics.ECTS > float(params["ects"])
-                    )
+            )
+        elif params["ects_operator"] == "greater":
+            query = query.where(
+                CourseData.characteristics.has(
+                    Characteristics.ECTS > float(params["ects"])
                 )
-            elif params["ects_operator"] == "between" and params["ects_max"]:
-                query = query.where(
-                    CourseData.characteristics.has(
-                        Characteristics.ECTS.between(
-                            float(params["ects"]), float(params["ects_max"])
-                        )
+            )
+        elif params["ects_operator"] == "between" and params["ects_max"]:
+            query = query.where(
+                CourseData.characteristics.has(
+                    Characteristics.ECTS.between(
+                        float(params["ects"]), float(params["ects_max"])
                     )
                 )
+            )
 
-        if params["type"]:
-            query = query.where(CourseData.characteristics.has(type=params["type"]))
+    if params["type"]:
+        query = query.where(CourseData.characteristics.has(type=params["type"]))
 
-        if params["competition"]:
-            query = query.where(
-                CourseData.characteristics.has(competition=params["competition"])
-            )
+    if params["competition"]:
+        query = query.where(
+            CourseData.characteristics.has(competition=params["competition"])
+        )
 
-        if params["vacancies"]:
-            if params["vacancies_operator"] == "equal":
-                query = query.where(
-                    CourseData.characteristics.has(
-                        current_vacancies=int(params["vacancies"])
-                    )
+    if params["vacancies"]:
+        if params["vacancies_operator"] == "equal":
+            query = query.where(
+                CourseData.characteristics.has(
+                    current_vacancies=int(params["vacancies"])
                 )
-            elif params["vacancies_operator"] == "less":
-                query = query.where(
-                    CourseData.characteristics.has(
-                        Characteristics.current_vacancies < int(params["vacancies"])
-                    )
+            )
+        elif params["vacancies_operator"] == "less":
+            query = query.where(
+                CourseData.characteristics.has(
+                    Characteristics.current_vacancies < int(params["vacancies"])
                 )
-            elif params["vacancies_operator"] == "greater":
-                query = query.where(
-                    CourseData.characteristics.has(
-                        Characteristics.current_vacancies > int(params["vacancies"])
-                    )
+            )
+        elif params["vacancies_operator"] == "greater":
+            query = query.where(
+                CourseData.characteristics.has(
+                    Characteristics.current_vacancies > int(params["vacancies"])
                 )
-            elif params["vacancies_operator"] == "between" and params["vacancies_max"]:
-                query = query.where(
-                    CourseData.characteristics.has(
-                        Characteristics.current_vacancies.between(
-                            int(params["vacancies"]), int(params["vacancies_max"])
-                        )
+            )
+        elif params["vacancies_operator"] == "between" and params["vacancies_max"]:
+            query = query.where(
+                CourseData.characteristics.has(
+                    Characteristics.current_vacancies.between(
+                        int(params["vacancies"]), int(params["vacancies_max"])
                     )
                 )
-            elif params["vacancies_operator"] == "available":
-                query = query.where(
-                    CourseData.characteristics.has(Characteristics.current_vacancies > 0)
-                )
-
-        # Entrance exam filters
-        if params["exam_code"]:
-            exam_codes = (
-                params["exam_code"]
-                if isinstance(params["exam_code"], list)
-                else [params["exam_code"]]
+            )
+        elif params["vacancies_operator"] == "available":
+            query = query.where(
+                CourseData.characteristics.has(Characteristics.current_vacancies > 0)
             )
 
-            if params["exam_combination"] == "all":
-                # All selected exams must be present
-                for code in exam_codes:
-                    query = query.where(
-                        CourseData.entrance_exams.has(
-                            EntranceExams.exams.any(ExamBundle.exams.any(code=code))
-                        )
-                    )
-            elif params["exam_combination"] == "only":
-                # Exact match
+    # Entrance exam filters
+    if params["exam_code"]:
+        exam_codes = (
+            params["exam_code"]
+            if isinstance(params["exam_code"], list)
+            else [params["exam_code"]]
+        )
+
+        if params["exam_combination"] == "all":
+            # All selected exams must be present
+            for code in exam_codes:
                 query = query.where(
                     CourseData.entrance_exams.has(
-                        ~EntranceExams.exams.any(
-                            ExamBundle.exams.any(
-                                ~ExamBundle.exams.any(code.in_(exam_codes))
-                            )
-                        )
+                        EntranceExams.exams.any(ExamBundle.exams.any(Exam.code == code))
                     )
                 )
-            else:  # "any" or default behavior
-                query = query.where(
-                    CourseData.entrance_exams.has(
-                        EntranceExams.exams.any(
-                            ExamBundle.exams.any(code.in_(exam_codes))
-                        )
+        elif params["exam_combination"] == "only":
+            # No bundle with an exam outside the selected ones
+            query = query.where(
+                CourseData.entrance_exams.has(
+                    ~EntranceExams.exams.any(
+                        ExamBundle.exams.any(Exam.code.not_in(exam_codes))
                     )
                 )
-
-        # Classification filters
-        if params["min_app_grade"]:
-            if params["min_app_grade_operator"] == "equal":
-                query = query.where(
-                    CourseData.min_classification.has(
-                        application_grade=float(params["min_app_grade"])
+            )
+        else:  # "any" or default behavior
+            query = query.where(
+                CourseData.entrance_exams.has(
+                    EntranceExams.exams.any(
+                        ExamBundle.exams.any(Exam.code.in_(exam_codes))
                     )
                 )
-            elif params["min_app_grade_operator"] == "less":
-                query = query.where(
-                    CourseData.min_classification.has(
-                        MinimumClassification.application_grade < float(params["min_app_grade"])
-                    )
+            )
+
+    # Classification filters
+    if params["min_app_grade"]:
+        if params["min_app_grade_operator"] == "equal":
+            query = query.where(
+                CourseData.min_classification.has(
+                    application_grade=float(params["min_app_grade"])
                 )
-            elif params["min_app_grade_operator"] == "greater":
-                query = query.where(
-                    CourseData.min_classification.has(
-                        MinimumClassification.application_grade > float(params["min_app_grade"])
-                    )
+            )
+        elif params["min_app_grade_operator"] == "less":
+            query = query.where(
+                CourseData.min_classification.has(
+                    MinimumClassification.application_grade < float(params["min_app_grade"])
                 )
-            elif (
-                params["min_app_grade_operator"] == "between"
-                and params["min_app_grade_max"]
-            ):
-                query = query.where(
-                    CourseData.min_classification.has(
-                        MinimumClassification.application_grade.between(
-                            float(params["min_app_grade"]),
-                            float(params["min_app_grade_max"]),
-                        )
-                    )
+            )
+        elif params["min_app_grade_operator"] == "greater":
+            query = query.where(
+                CourseData.min_classification.has(
+                    MinimumClassification.application_grade > float(params["min_app_grade"])
                 )
-
-        if params["min_exam_grade"]:
-            if params["min_exam_grade_operator"] == "equal":
-                query = query.where(
-                    CourseData.min_classification.has(
-                        entrance_exams=float(params["min_exam_grade"])
+            )
+        elif (
+            params["min_app_grade_operator"] == "between"
+            and params["min_app_grade_max"]
+        ):
+            query = query.where(
+                CourseData.min_classification.has(
+                    MinimumClassification.application_grade.between(
+                        float(params["min_app_grade"]),
+                        float(params["min_app_grade_max"]),
                     )
                 )
-            elif params["min_exam_grade_operator"] == "less":
-                query = query.where(
-                    CourseData.min_classification.has(
-                        MinimumClassification.entrance_exams < float(params["min_exam_grade"])
-                    )
+            )
+
+    if params["min_exam_grade"]:
+        if params["min_exam_grade_operator"] == "equal":
+            query = query.where(
+                CourseData.min_classification.has(
+                    entrance_exams=float(params["min_exam_grade"])
                 )
-            elif params["min_exam_grade_operator"] == "greater":
-                query = query.where(
-                    CourseData.min_classification.has(
-                        MinimumClassification.entrance_exams > float(params["min_exam_grade"])
-                    )
+            )
+        elif params["min_exam_grade_operator"] == "less":
+            query = query.where(
+                CourseData.min_classification.has(
+                    MinimumClassification.entrance_exams < float(params["min_exam_grade"])
                 )
-            elif (
-                params["min_exam_grade_operator"] == "between"
-                and params["min_exam_grade_max"]
-            ):
-                query = query.where(
-                    CourseData.min_classification.has(
-                        MinimumClassification.entrance_exams.between(
-                            float(params["min_exam_grade"]),
-                            float(params["min_exam_grade_max"]),
-                        )
-                    )
+            )
+        elif params["min_exam_grade_operator"] == "greater":
+            query = query.where(
+                CourseData.min_classification.has(
+                    MinimumClassification.entrance_exams > float(params["min_exam_grade"])
                 )
-
-        # Region filters
-        if params["region"]:
+            )
+        elif (
+            params["min_exam_grade_operator"] == "between"
+            and params["min_exam_grade_max"]
+        ):
             query = query.where(
-                CourseData.regional_preference.has(
-                    RegionalPreference.regions.any(name=params["region"])
+                CourseData.min_classification.has(
+                    MinimumClassification.entrance_exams.between(
+                        float(params["min_exam_grade"]),
+                        float(params["min_exam_grade_max"]),
+                    )
                 )
             )
 
-        # Historical data filters
-        if params["min_grade_last"] or params["max_grade_last"]:
+    # Region filters
+    if params["region"]:
+        query = query.where(
+            CourseData.regional_preference.has(
+                RegionalPreference.regions.any(Region.name == params["region"])
+            )
+        )
+
+    # Historical data filters (in any year and phase)
+    if params["min_grade_last"] or params["max_grade_last"]:
+        grade_condition = None
+        if params["min_grade_last"] and params["max_grade_last"]:
+            if params["last_grade_operator"] == "between":
+                # Find courses where last grade is between the specified values
+                grade_condition = PhaseStats.grade_last.between(
+                    float(params["min_grade_last"]), float(params["max_grade_last"])
+                )
+        elif params["min_grade_last"]:
+            grade_condition = PhaseStats.grade_last >= float(params["min_grade_last"])
+        elif params["max_grade_last"]:
+            grade_condition = PhaseStats.grade_last <= float(params["max_grade_last"])
+
+        if grade_condition is not None:
+            query = query.where(CourseData.phase_stats.any(grade_condition))
             if params["year_filter"]:
-                year_filter = int(params["year_filter"])
-                historical_condition = PreviousApplications.year_data.any(
-                    YearData.year == year_filter
-                )
-            else:
-                historical_condition = true()
-
-            if params["min_grade_last"] and params["max_grade_last"]:
-                if params["last_grade_operator"] == "between":
-                    # Find courses where last grade is between the specified values
-                    phase_condition = or_(
-                        YearData.phase1.has(
-                            PhaseData.grade_last.between(
-                                float(params["min_grade_last"]),
-                                float(params["max_grade_last"]),
-                            )
-                        ),
-                        YearData.phase2.has(
-                            PhaseData.grade_last.between(
-                                float(params["min_grade_last"]),
-                                float(params["max_grade_last"]),
-                            )
-                        ),
+                query = query.where(
+                    CourseData.phase_stats.any(
+                        PhaseStats.year == int(params["year_filter"])
                     )
+                )
 
-                    if params["year_filter"]:
-                        query = query.where(
-                            CourseData.previous_applications.has(
-                                PreviousApplications.year_data.any(historical_condition)
-                            )
-                        )
-                        query = query.where(
-                            CourseData.previous_applications.has(
-                                PreviousApplications.year_data.any(phase_condition)
-                            )
-                        )
-                    else:
-                        # If no year filter, just apply the phase condition
-                        query = query.where(
-                            CourseData.previous_applications.has(
-                                PreviousApplications.year_data.any(phase_condition)
-                            )
-                        )
-            elif params["min_grade_last"]:
-                # Find courses where last grade is greater than the minimum
-                phase_condition = or_(
-                    YearData.phase1.has(
-                        PhaseData.grade_last >= float(params["min_grade_last"])
-                    ),
-                    YearData.phase2.has(
-                        PhaseData.grade_last >= float(params["min_grade_last"])
-                    ),
-                )
-
-                # Apply both conditions separately
-                if params["year_filter"]:
-                    query = query.where(
-                        CourseData.previous_applications.has(
-                            PreviousApplications.year_data.any(historical_condition)
-                        )
-                    )
-                    query = query.where(
-                        CourseData.previous_applications.has(
-                            PreviousApplications.year_data.any(phase_condition)
-                        )
-                    )
-                else:
-                    query = query.where(
-                        CourseData.previous_applications.has(
-                            PreviousApplications.year_data.any(phase_condition)
-                        )
-                    )
-            elif params["max_grade_last"]:
-                # Find courses where last grade is less than the maximum
-                phase_condition = or_(
-                    YearData.phase1.has(
-                        PhaseData.grade_last <= float(params["max_grade_last"])
-                    ),
-                    YearData.phase2.has(
-                        PhaseData.grade_last <= float(params["max_grade_last"])
-                    ),
-                )
-
-                # Apply both conditions separately
-                if params["year_filter"]:
-                    query = query.where(
-                        CourseData.previous_applications.has(
-                            PreviousApplications.year_data.any(historical_condition)
-                        )
-                    )
-                    query = query.where(
-                        CourseData.previous_applications.has(
-                            PreviousApplications.year_data.any(phase_condition)
-                        )
-                    )
-                else:
-                    query = query.where(
-                        CourseData.previous_applications.has(
-                            PreviousApplications.year_data.any(phase_condition)
-                        )
-                    )
+    return query
+
+
+def similarity_order(params: dict) -> list:
+    """ORDER BY clauses keeping the order of the "one_of" name lists (most similar first)."""
+    names = {}
+    if params["course_name"] and params["course_name_operator"] == "one_of":
+        names[
+            select(Course.name)
+            .where(Course.id == CourseData.course_id)
+            .correlate(CourseData)
+            .scalar_subquery()
+        ] = as_list(params["course_name"])
+    if params["institution_name"] and params["institution_name_operator"] == "one_of":
+        names[
+            select(Institution.name)
+            .join(Course, Course.institution_id == Institution.id)
+            .where(Course.id == CourseData.course_id)
+            .correlate(CourseData)
+            .scalar_subquery()
+        ] = as_list(params["institution_name"])
+
+    return [
+        case({name: rank for rank, name in enumerate(ranked)}, value=column)
+        for column, ranked in names.items()
+    ]
+
+
+def matching_ids(params: dict) -> Sequence[int]:
+    """Get the unique IDs of every course matching the filters in normalized params."""
+    with Session(engine) as session:
+        return session.exec(apply_filters(select(CourseData.id), params).distinct()).all()
+
+
+def full_search(config: dict) -> Sequence[CourseData]:
+    """Full search with all parameters for the webserver."""
+
+    if not config:
+        return []
+
+    params = normalize_parameters(config)
+    limit = int(params["results_per_page"])
+
+    with Session(engine) as session:
+        query = apply_filters(query_template(resolve_fields(params)), params)
+        query = query.order_by(*similarity_order(params))
 
         # Apply sorting
         if params["sort_by"]:
@@ -511,62 +569,23 @@ def full_search(config: dict) -> Sequence[CourseData]:
                     .join(Course.institution)
                     .order_by(Institution.name.asc())
                 )
-            elif params["sort_by"] in ("grade_asc", "grade_desc"):
+            elif params["sort_by"] in TREND_SORTS:
+                query = query.outerjoin(
+                    CourseTrends, CourseTrends.course_data_id == CourseData.id
+                ).order_by(TREND_SORTS[params["sort_by"]].nullslast(), CourseData.id)
+            elif params["sort_by"] in GRADE_SORTS:
                 phase_preference = params.get("grade_sort_phase", "1")
                 year_preference = params.get("grade_sort_year", "latest")
 
-                query = query.outerjoin(CourseData.previous_applications)
-                query = query.outerjoin(PreviousApplications.year_data)
-
-                if year_preference != "latest" and year_preference.isdigit():
-                    query = query.where(YearData.year == int(year_preference))
-
-                if phase_preference == "1":
-                    query = query.outerjoin(YearData.phase1)
-                    if params["sort_by"]  == "grade_asc":
-                        query = query.order_by(PhaseData.grade_last.asc().nullslast())
-                    else:
-                        query = query.order_by(PhaseData.grade_last.desc().nullslast())
-                elif phase_preference == "2":
-                    query = query.outerjoin(YearData.phase2)
-                    if params["sort_by"]  == "grade_asc":
-                        query = query.order_by(PhaseData.grade_last.asc().nullslast())
-                    else:
-                        query = query.order_by(PhaseData.grade_last.desc().nullslast())
-            elif params["sort_by"] in ("average_asc", "average_desc"):
-                phase_preference = params.get("grade_sort_phase", "1")
-                year_preference = params.get("grade_sort_year", "latest")
-
-                query = query.outerjoin(CourseData.previous_applications)
-                query = query.outerjoin(PreviousApplications.year_data)
-
-                if year_preference != "latest" and year_preference.isdigit():
-                    query = query.where(YearData.year == int(year_preference))
-
-                if phase_preference == "1":
-                    query = query.outerjoin(YearData.phase1)
-                    # Add explicit join with Averages table
-                    query = query.outerjoin(PhaseData.averages)
-                    if params["sort_by"] == "average_asc":
-                        query = query.order_by(
-                            Averages.hs_average.asc().nullslast()
-                        )
-                    else:
-                        query = query.order_by(
-                            Averages.hs_average.desc().nullslast()
-                        )
-                elif phase_preference == "2":
-                    query = query.outerjoin(YearData.phase2)
-                    # Add explicit join with Averages table
-                    query = query.outerjoin(PhaseData.averages)
-                    if params["sort_by"] == "average_asc":
-                        query = query.order_by(
-                            Averages.hs_average.asc().nullslast()
-                        )
-                    else:
-                        query = query.order_by(
-                            Averages.hs_average.desc().nullslast()
-                        )
+                if phase_preference in ("1", "2"):
+                    query = query.outerjoin(
+                        PhaseStats,
+                        (PhaseStats.course_data_id == CourseData.id)
+                        & (PhaseStats.phase == int(phase_preference)),
+                    )
+                    if year_preference != "latest" and year_preference.isdigit():
+                        query = query.where(PhaseStats.year == int(year_preference))
+                    query = query.order_by(GRADE_SORTS[params["sort_by"]].nullslast())
 
         # Apply limit
         if limit:
@@ -578,11 +597,60 @@ def full_search(config: dict) -> Sequence[CourseData]:
         return result
 
 
-def course_data_to_dict(course_data):
-    """Convert a CourseData object to a JSON dict."""
+def get_trends(unique_id=None, institution_id=None):
+    """Trends of a course, of an institution, or of every institution (most competitive first)."""
+    with Session(engine) as session:
+        if unique_id is not None:
+            trends = session.get(CourseTrends, unique_id)
+            return trends.model_dump() if trends else None
+        if institution_id is not None:
+            trends = session.get(InstitutionTrends, institution_id)
+            return trends.model_dump() if trends else None
+
+        query = select(InstitutionTrends).order_by(
+            InstitutionTrends.candidates_per_vacancy.desc().nullslast()
+        )
+        return [trends.model_dump() for trends in session.exec(query)]
+
+
+def phase_stats_to_dict(stats: PhaseStats) -> dict:
+    """Convert the statistics of a phase to the nested historical data format."""
+    phase_data = {"vacancies": stats.vacancies, "grade_last": stats.grade_last}
+
+    if stats.has_candidates:
+        phase_data["candidates"] = {
+            "total": stats.candidates,
+            "fem": stats.candidates_fem,
+            "masc": stats.candidates_masc,
+            "first_option": stats.candidates_first_option,
+        }
+
+    if stats.has_placed:
+        phase_data["placed"] = {
+            "total": stats.placed,
+            "fem": stats.placed_fem,
+            "masc": stats.placed_masc,
+            "first_option": stats.placed_first_option,
+        }
+
+    if stats.has_averages:
+        phase_data["averages"] = {
+            "application_grade": stats.average_application_grade,
+            "entrance_exams": stats.average_entrance_exams,
+            "hs_average": stats.average_hs_average,
+        }
+
+    return phase_data
+
+
+def course_data_to_dict(course_data, fields: Optional[Tuple[str, ...]] = None):
+    """Convert a CourseData object to a JSON dict (optionally only some sections)."""
     if not course_data:
         return None
 
+    if fields is None:
+        fields = tuple(SECTION_LOADERS)
+
     result = {
         "id": course_data.id,
         "course": {
@@ -597,8 +665,13 @@ def course_data_to_dict(course_data):
         "extra_stats_url": course_data.extra_stats_url,
     }
 
+    # Last placed grade (of the latest year with one, see aggregates.py)
+    if "last_grade" in fields:
+        trends = course_data.trends
+        result["last_grade"] = trends.grade_last if trends else None
+
     # Characteristics
-    if course_data.characteristics:
+    if "characteristics" in fields and course_data.characteristics:
         char = course_data.characteristics
         result["characteristics"] = {
             "degree": char.degree,
@@ -611,7 +684,7 @@ def course_data_to_dict(course_data):
         }
 
     # Entrance exams
-    if course_data.entrance_exams:
+    if "entrance_exams" in fields and course_data.entrance_exams:
         ee = course_data.entrance_exams
         result["entrance_exams"] = {
             "is_combination": ee.is_combination,
@@ -629,7 +702,7 @@ def course_data_to_dict(course_data):
                 result["entrance_exams"]["bundles"].append(exam_bundle)
 
     # Minimum classification
-    if course_data.min_classification:
+    if "min_classification" in fields and course_data.min_classification:
         mc = course_data.min_classification
         result["min_classification"] = {
             "application_grade": mc.application_grade,
@@ -637,7 +710,7 @@ def course_data_to_dict(course_data):
         }
 
     # Calculation formula
-    if course_data.calculation_formula:
+    if "calculation_formula" in fields and course_data.calculation_formula:
         cf = course_data.calculation_formula
         result["calculation_formula"] = {
             "hs_average": cf.hs_average,
@@ -646,7 +719,7 @@ def course_data_to_dict(course_data):
         }
 
     # Regional preference
-    if course_data.regional_preference:
+    if "regional_preference" in fields and course_data.regional_preference:
         rp = course_data.regional_preference
         result["regional_preference"] = {
             "percentage": rp.percentage,
@@ -654,7 +727,7 @@ def course_data_to_dict(course_data):
         }
 
     # Other access preferences
-    if course_data.other_access_preferences:
+    if "other_access_preferences" in fields and course_data.other_access_preferences:
         oap = course_data.other_access_preferences
         result["other_access_preferences"] = {
             "percentage": oap.percentage,
@@ -667,59 +740,21 @@ def course_data_to_dict(course_data):
             ]
 
     # Prerequisites
-    if course_data.prerequisites:
+    if "prerequisites" in fields and course_data.prerequisites:
         prereq = course_data.prerequisites
         result["prerequisites"] = {"type": prereq.type, "group": prereq.group}
 
     # Historical data
-    if (
-        course_data.previous_applications
-        and course_data.previous_applications.year_data
-    ):
-        result["historical_data"] = []
-
-        for year_data in sorted(
-            course_data.previous_applications.year_data,
-            key=lambda y: y.year,
-            reverse=True,
-        ):
-            year_entry = {"year": year_data.year, "phase1": None, "phase2": None}
-
-            # Phase 1
-            for num in [1, 2]:
-                if (year_data.phase1 and num == 1) or (year_data.phase2 and num == 2):
-                    p = year_data.phase1 if num == 1 else year_data.phase2
-                    phase_data = {
-                        "vacancies": p.vacancies,
-                        "grade_last": p.grade_last,
-                    }
-
-                    if p.candidates:
-                        phase_data["candidates"] = {
-                            "total": p.candidates.total,
-                            "fem": p.candidates.fem,
-                            "masc": p.candidates.masc,
-                            "first_option": p.candidates.first_option,
-                        }
-
-                    if p.placed:
-                        phase_data["placed"] = {
-                            "total": p.placed.total,
-                            "fem": p.placed.fem,
-                            "masc": p.placed.masc,
-                            "first_option": p.placed.first_option,
-                        }
-
-                    if p.averages:
-                        phase_data["averages"] = {
-                            "application_grade": p.averages.application_grade,
-                            "entrance_exams": p.averages.entrance_exams,
-                            "hs_average": p.averages.hs_average,
-                        }
-
-                    year_entry[f"phase{num}"] = phase_data
-
-            result["historical_data"].append(year_entry)
+    if "historical_data" in fields:
+        years = {}
+        for stats in sorted(course_data.phase_stats, key=lambda p: (-p.year, p.phase)):
+            year_entry = years.setdefault(
+                stats.year, {"year": stats.year, "phase1": None, "phase2": None}
+            )
+            if stats.phase:
+                year_entry[f"phase{stats.phase}"] = phase_stats_to_dict(stats)
+
+        result["historical_data"] = list(years.values())
 
     return result
 
@@ -0,0 +1,112 @@
+"""SQLite backed rate limit storage, shared by every worker process on a host.
+
+Importing this module registers the `sqlite://` scheme with the `limits`
+package, so Flask-Limiter can use it through `RATELIMIT_STORAGE_URI`
+(`sqlite:///relative/path.db` or `sqlite:////absolute/path.db`).
+Only the fixed window strategy (Flask-Limiter's default) is supported.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+# Expired counters are purged every this many increments
+PURGE_INTERVAL = 1000
+
+
+class SQLiteStorage(Storage):
+    """Fixed window rate limit counters kept in a local SQLite database."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        # Same convention as SQLAlchemy: three slashes relative, four absolute
+        self.path = uri.split("://", 1)[1][1:] or ":memory:"
+        self._local = threading.local()
+        self._increments = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "key TEXT PRIMARY KEY, value INTEGER NOT NULL, expiry REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection of the current thread (and process)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Counters are disposable, durability is not worth an fsync per hit
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        """Increment a counter, starting a new window if the old one expired."""
+        now = time.time()
+        conn = self._connection()
+        (value,) = conn.execute(
+            "INSERT INTO counters (key, value, expiry) VALUES (?1, ?2, ?3) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = CASE WHEN expiry <= ?4 THEN ?2 ELSE value + ?2 END, "
+            "expiry = CASE WHEN expiry <= ?4 THEN ?3 ELSE expiry END "
+            "RETURNING value",
+            (key, amount, now + expiry, now),
+        ).fetchone()
+
+        self._increments += 1
+        if self._increments % PURGE_INTERVAL == 0:
+            conn.execute("DELETE FROM counters WHERE expiry <= ?", (now,))
+
+        return value
+
+    def get(self, key: str) -> int:
+        """Get the current value of a counter."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM counters WHERE key = ? AND expiry > ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        """Get the time at which a counter's window ends."""
+        now = time.time()
+        row = (
+            self._connection()
+            .execute(
+                "SELECT expiry FROM counters WHERE key = ? AND expiry > ?", (key, now)
+            )
+            .fetchone()
+        )
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        """Check that the database is usable."""
+        try:
+            self._connection().execute("SELECT 1 FROM counters LIMIT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self) -> int:
+        """Remove every counter."""
+        return self._connection().execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str):
+        """Remove a single counter."""
+        self._connection().execute("DELETE FROM counters WHERE key = ?", (key,))
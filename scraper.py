@@ -1,17 +1,33 @@
 """Scrapes all courses from DGES and saves them to an SQLite database."""
 
+import argparse
+import json
 import logging
+import os
 import time
+import traceback
+from datetime import datetime, timezone
 from logging.handlers import MemoryHandler
-from typing import Any, Dict, Optional
-
-from bs4.element import NavigableString, Tag
-from sqlmodel import Session, SQLModel
-
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, PreformattedString, Tag
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel, select
+
+from aggregates import update_aggregates
+from datafiles import (
+    DATABASE_PATH,
+    build_path,
+    copy_database,
+    remove_database_files,
+    replace_database,
+)
+from export import export_bundle
+from migrations import LATEST_VERSION
 from models import (
-    Averages,
     CalculationFormula,
-    CandidateStats,
     Characteristics,
     Course,
     CourseData,
@@ -21,107 +37,100 @@ from models import (
     Institution,
     MinimumClassification,
     OtherAccessPreferences,
-    PhaseData,
+    PhaseStats,
     Prerequisites,
-    PreviousApplications,
     Region,
     RegionalPreference,
     ShallowCourse,
-    YearData,
     engine,
 )
-from utils import get_next, get_soup
+from utils import FETCH_STATS, ParseError, get_next, get_page, get_soup, make_soup
 
-# Set up logging
-file_handler = logging.FileHandler("scraper.log")
-memory_handler = MemoryHandler(
-    capacity=100, flushLevel=logging.ERROR, target=file_handler
-)
-formatter = logging.Formatter(
-    "%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
-file_handler.setFormatter(formatter)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        memory_handler,
-        logging.StreamHandler(),
-    ],
-)
+REPORT_PATH = "scraper_report.json"
 
-# Clear the log file
-with open("scraper.log", "w", encoding="utf-8"):
-    pass
+# The database is built here and then moved over DATABASE_PATH in one step
+BUILD_PATH = build_path(DATABASE_PATH)
 
+# Course pages that failed to parse, with their errors (see --reparse)
+QUARANTINE_DIR = "quarantine"
 
 # Base URL for course listings by letter
 BASE_URL = "https://www.dges.gov.pt/guias/indcurso.asp?letra="
 LETTERS = "ABCDEFGHIJLMNOPQRSTVZ"
 
+# Course page texts
+CHARACTERISTICS_HEADING = "Características do par Instituição/Curso"
+NO_ACCESS_INFO = (
+    "A informação sobre as condições de acesso deve"
+    " ser obtida diretamente junto da universidade."
+)
+INSTITUTION_INFO = "Para mais informação consulte a instituição."
+BLANK_LINE = ""  # an empty line of a section (<br><br>)
 
-def build_candidate(
-    stats: Dict[str, Any], is_placed: bool = False
-) -> Optional[CandidateStats]:
-    """Builds a CandidateStats object from the given dictionary."""
+# Tags whose text is part of the surrounding line, and tags with no page text
+INLINE_TAGS = {"b", "strong", "i", "em", "u", "span", "font", "small", "sub", "sup"}
+SKIPPED_TAGS = {"head", "script", "style"}
 
-    if not stats:
-        return None
 
-    return CandidateStats(
-        is_placed=is_placed,
-        total=stats.get("total"),
-        fem=stats.get("fem"),
-        masc=stats.get("masc"),
-        first_option=stats.get("first_option"),
-    )
+# Exams and regions are shared by every course, one object per code/name
+EXAMS: Dict[str, Exam] = {}
+REGIONS: Dict[str, Region] = {}
 
 
-def build_averages(media: Dict[str, Any]) -> Optional[Averages]:
-    """Builds an Averages object from the given dictionary."""
+def intern_exam(code: str, name: str) -> Exam:
+    """Get the Exam of a code, created the first time the code is seen."""
+    if code not in EXAMS:
+        EXAMS[code] = Exam(code=code, name=name)
+    return EXAMS[code]
 
-    if not media:
-        return None
-    return Averages(
-        application_grade=media.get("application_grade"),
-        entrance_exams=media.get("entrance_exams"),
-        hs_average=media.get("hs_average"),
-    )
+
+def intern_region(name: str) -> Region:
+    """Get the Region of a name, created the first time the name is seen."""
+    if name not in REGIONS:
+        REGIONS[name] = Region(name=name)
+    return REGIONS[name]
 
 
-def build_phase(phase_dict: Dict[str, Any]) -> PhaseData:
-    """Builds a PhaseData object from the given dictionary."""
+def build_phase_stats(year: int, phase: int, phase_dict: Dict[str, Any]) -> PhaseStats:
+    """Builds a PhaseStats object from the given dictionary."""
 
-    return PhaseData(
+    return PhaseStats(
+        year=year,
+        phase=phase,
         vacancies=phase_dict.get("vacancies"),
-        candidates=build_candidate(
-            {
-                k: phase_dict[k]
-                for k in ["total", "fem", "masc", "first_option"]
-                if k in phase_dict
-            }
+        grade_last=phase_dict.get("grade_last"),
+        info_url=phase_dict.get("info_url"),
+        has_candidates=any(
+            k in phase_dict for k in ["total", "fem", "masc", "first_option"]
         ),
-        placed=build_candidate(
-            {
-                k[2:]: phase_dict[k]
-                for k in ["p_total", "p_fem", "p_masc", "p_first_option"]
-                if k in phase_dict
-            },
-            is_placed=True,
+        candidates=phase_dict.get("total"),
+        candidates_fem=phase_dict.get("fem"),
+        candidates_masc=phase_dict.get("masc"),
+        candidates_first_option=phase_dict.get("first_option"),
+        has_placed=any(
+            k in phase_dict for k in ["p_total", "p_fem", "p_masc", "p_first_option"]
         ),
-        averages=build_averages(
-            {
-                k: phase_dict[k]
-                for k in ["application_grade", "entrance_exams", "hs_average"]
-                if k in phase_dict
-            }
+        placed=phase_dict.get("p_total"),
+        placed_fem=phase_dict.get("p_fem"),
+        placed_masc=phase_dict.get("p_masc"),
+        placed_first_option=phase_dict.get("p_first_option"),
+        has_averages=any(
+            k in phase_dict
+            for k in ["application_grade", "entrance_exams", "hs_average"]
         ),
-        grade_last=phase_dict.get("grade_last"),
-        info_url=phase_dict.get("info_url"),
+        average_application_grade=phase_dict.get("application_grade"),
+        average_entrance_exams=phase_dict.get("entrance_exams"),
+        average_hs_average=phase_dict.get("hs_average"),
     )
 
 
+def until_blank(lines: List[str]) -> List[str]:
+    """The lines of a section before its first empty line."""
+    if BLANK_LINE in lines:
+        return lines[: lines.index(BLANK_LINE)]
+    return lines
+
+
 def parse_value(val: str) -> Any:
     """Parses a string value into an appropriate type (int, float, or str)."""
 
@@ -138,47 +147,30 @@ def parse_value(val: str) -> Any:
         return val
 
 
-def get_structured(header: Tag | NavigableString | None):
-    """Get the structured data from a header tag."""
-    if not header:
-        return None, None, None
-
-    current_element = get_next(get_next(header))
-
-    if current_element.text == "Para mais informação consulte a instituição.":
-        logging.debug(
-            "No minimum classification/calculation data - institution specific info"
-        )
-    else:
-        value1 = current_element.text.strip()
-
-        current_element = get_next(get_next(current_element))
-        value2 = current_element.text.strip()
-
-        current_element = get_next(get_next(current_element))
-        value3 = current_element.text.strip()
-
-        return value1, value2, value3
-
-    return None, None, None
-
-
-start_time = time.time()
-
-logging.info("Getting all courses from DGES...")
-
-# Iterate over each letter to get all courses
-courses = []
-year = 0  # pylint: disable=invalid-name
-for letter in LETTERS:
-    listing_url = BASE_URL + letter
+def setup_logging():
+    """Log to the console and (buffered) to scraper.log."""
+    file_handler = logging.FileHandler("scraper.log", mode="w")
+    memory_handler = MemoryHandler(
+        capacity=100, flushLevel=logging.ERROR, target=file_handler
+    )
+    formatter = logging.Formatter(
+        "%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    file_handler.setFormatter(formatter)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            memory_handler,
+            logging.StreamHandler(),
+        ],
+    )
 
-    soup = get_soup(listing_url)
-    if not soup:
-        logging.warning("Failed to get soup for letter %s", letter)
-        continue
 
-    logging.info("Processing letter %s", letter)
+def parse_listing_page(soup: BeautifulSoup, year: int = 0) -> Tuple[List[Course], int]:
+    """Parse a course listing page, returning its courses and the listing year."""
+    courses = []
 
     # Get the div with everything
     stuff_div = soup.select_one(
@@ -187,12 +179,12 @@ for letter in LETTERS:
     )
 
     if not stuff_div:
-        logging.warning("No content found for letter %s", letter)
-        continue
+        logging.warning("No content found in listing page")
+        return courses, year
 
     # Iterate over each item in the div (can be course, institution, br, etc...)
     last_course = {}
-    for i, item in enumerate(stuff_div.children):
+    for item in stuff_div.children:
         if 'class="box10"' in repr(item):
             # Get the course ID and name
             course_id = get_next(get_next(item))
@@ -242,214 +234,271 @@ for letter in LETTERS:
         elif 'class="lin-curso"' in repr(item):
             year = int(item.text.strip().split(" ")[1])
 
-logging.info("Loaded %d courses", len(courses))
-
-database = []
-for n, course in enumerate(courses):
-    logging.info("%s - Processing course: %s with URL: %s", n, course.name, course.url)
-    soup = get_soup(course.url)
-    if not soup:
-        logging.warning("Failed to get soup for course %s", course.name)
-        continue
-
-    year_data = []
-    table = soup.find("table")
-    if table:
-        if not isinstance(table, Tag):
-            logging.error("Table is the wrong type for course %s", course.name)
-            continue
+    return courses, year
 
-        rows = table.find_all("tr")
 
-        if len(rows) < 2:
-            logging.error("Table has too few rows for course %s", course.name)
-            continue
+def scrape_listing() -> List[Course]:
+    """Get every course (with its institution) from the course listing pages."""
+    logging.info("Getting all courses from DGES...")
 
-        # Extract column headers (first row)
-        year_headers = []
-        for cell in rows[0].find_all(["th", "td"])[1:]:
-            text = cell.get_text(strip=True)
+    # Iterate over each letter to get all courses
+    courses = []
+    year = 0
+    for letter in LETTERS:
+        listing_url = BASE_URL + letter
 
-            span = cell.find("span", class_="bodyTitle")
-            if span:
-                text = span.get_text(strip=True)
+        soup = get_soup(listing_url)
+        if not soup:
+            logging.warning("Failed to get soup for letter %s", letter)
+            continue
 
-            colspan = int(cell.get("colspan", "1"))
-            if text and text != " ":  # avoid blank stuff
-                year_headers.extend([text] * colspan)
+        logging.info("Processing letter %s", letter)
+        try:
+            letter_courses, year = parse_listing_page(soup, year)
+        except ParseError as e:
+            logging.error("Failed to parse the listing of letter %s: %s", letter, e)
+            continue
+        courses.extend(letter_courses)
+
+    logging.info("Loaded %d courses", len(courses))
+    return courses
+
+
+class CoursePage:
+    """The parts of a course page the parser needs, found in a single walk of it.
+
+    The text after every h2 heading is split into lines at the <br> tags, the
+    section ends at the next heading or link. An empty line (<br><br>) is kept
+    as BLANK_LINE, it ends the lists of a section. The statistics table is kept
+    whole for parse_phase_table.
+    """
+
+    def __init__(self, soup: BeautifulSoup):
+        self.table: Optional[Tag] = None
+        self.extra_stats_url: Optional[str] = None
+        self.sections: Dict[str, List[str]] = {}
+        self._lines: Optional[List[str]] = None  # lines of the current section
+        self._line: List[str] = []
+        self._walk(soup)
+        self._end_line()
+
+    def _end_line(self, line_break: bool = False, section_end: bool = False):
+        if self._lines is not None:
+            text = "".join(self._line).strip()
+            if text:
+                self._lines.append(text)
+            elif (line_break or self._line) and not section_end and self._lines:
+                if self._lines[-1] != BLANK_LINE:
+                    self._lines.append(BLANK_LINE)
+        self._line = []
+
+    def _walk(self, node: Tag):
+        for child in node.children:
+            if isinstance(child, NavigableString):
+                if self._lines is not None and not isinstance(
+                    child, PreformattedString  # comments, doctype...
+                ):
+                    self._line.append(child)
+                continue
 
-        logging.debug("Extracted year headers: %s", year_headers)
+            if child.name in INLINE_TAGS:
+                self._walk(child)
+                continue
 
-        # Check if there are phase headers in the second row
-        has_phase_headers = False  # pylint: disable=invalid-name
-        phase_headers = []
-        cells_second_row = rows[1].find_all(["td", "th"])
+            if child.name == "br":
+                self._end_line(line_break=True)
+                continue
 
-        # Skip the first cell which usually has a section label
-        for cell in cells_second_row[1:]:
-            text = cell.get_text(strip=True)
+            self._end_line(section_end=child.name in ("h2", "a"))
+            if child.name == "h2":
+                # Only the first section with a heading is used
+                self._lines = []
+                self.sections.setdefault(child.get_text(strip=True), self._lines)
+            elif child.name == "a":
+                href = child.get("href", "")
+                if "infocursos.mec.pt" in href:
+                    self.extra_stats_url = str(href)
+                    logging.debug("Found course stats URL: %s", href)
+                self._lines = None
+            elif child.name == "table":
+                if self.table is None:
+                    self.table = child
+            elif child.name not in SKIPPED_TAGS:
+                self._walk(child)
+                self._end_line()
+
+
+def row_cells(row: Tag) -> List[Tag]:
+    """The th/td cells of a table row."""
+    return [cell for cell in row.children if cell.name in ("th", "td")]
+
+
+def parse_phase_table(table: Tag, course: Course) -> List[PhaseStats]:
+    """Parse the yearly statistics table of a course page."""
+    rows = table.find_all("tr")
+
+    if len(rows) < 2:
+        raise ParseError(f"Table has too few rows for course {course.name}")
+
+    # Extract column headers (first row)
+    year_headers = []
+    for cell in row_cells(rows[0])[1:]:
+        text = cell.get_text(strip=True)
+
+        span = cell.find("span", class_="bodyTitle")
+        if span:
+            text = span.get_text(strip=True)
+
+        colspan = int(cell.get("colspan", "1"))
+        if text and text != " ":  # avoid blank stuff
+            year_headers.extend([text] * colspan)
+
+    logging.debug("Extracted year headers: %s", year_headers)
+
+    # Check if there are phase headers in the second row
+    has_phase_headers = False  # pylint: disable=invalid-name
+    phase_headers = []
+    cells_second_row = row_cells(rows[1])
+
+    # Skip the first cell which usually has a section label
+    for cell in cells_second_row[1:]:
+        text = cell.get_text(strip=True)
+
+        if "Fase" in text:
+            has_phase_headers = True  # pylint: disable=invalid-name
+            phase_headers.append(text)
+        else:
+            phase_headers.append("1ª Fase")
+
+    # If no phase headers were found, all data is for 1ª Fase
+    if not has_phase_headers:
+        logging.info("No phase headers found, assuming all data is for 1ª Fase")
+
+    # Build column mapping
+    col_mapping = {}
+    for idx, (year, phase) in enumerate(zip(year_headers, phase_headers), start=1):
+        col_mapping[idx] = (year, phase)
+        logging.debug("Column %s maps to year %s, phase %s", idx, year, phase)
+
+    data_struct: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for year in set(year_headers):
+        data_struct[year] = {"1ª Fase": {}, "2ª Fase": {}}
+
+    # Track section based on the first cell
+    current_section = None  # pylint: disable=invalid-name
+    rows_to_skip = 1 if len(rows) < 3 else 2  # pylint: disable=invalid-name
+    if rows_to_skip == 1:
+        logging.info(
+            "Table has too few rows for course %s, assuming its only vacancies",
+            course.name,
+        )
 
-            if "Fase" in text:
-                has_phase_headers = True  # pylint: disable=invalid-name
-                phase_headers.append(text)
+    for row in rows[rows_to_skip:]:
+        # Get the label (first cell)
+        cells = row_cells(row)
+        if not cells:
+            continue
+        first_cell = cells[0]
+
+        label = first_cell.get_text(" ", strip=True).lstrip()
+
+        # Improved section detection - check for <strong> or directly match the section text
+        is_section_header = first_cell.find("strong") is not None
+
+        if is_section_header or label in [
+            "Vagas",
+            "Candidatos",
+            "Colocados",
+            "Médias dos Colocados",
+            "Nota de Candidatura do Último Colocado pelo Contingente Geral",
+            "Informação Adicional Sobre Candidatos e Colocados",
+        ]:
+            current_section = label
+            logging.debug("Found section: %s", current_section)
+
+        # Get cells for this row (skip the first label cell)
+        for idx, cell in enumerate(cells[1:], start=1):
+            # For the special section of PDFs, extract the url
+            if current_section == "Informação Adicional Sobre Candidatos e Colocados":
+                a_tag = cell.find("a")
+                value = None  # pylint: disable=invalid-name
+                if a_tag and a_tag.get("href"):
+                    value = a_tag["href"]
+                    logging.debug("Found info URL: %s", value)
             else:
-                phase_headers.append("1ª Fase")
-
-        # If no phase headers were found, all data is for 1ª Fase
-        if not has_phase_headers:
-            logging.info("No phase headers found, assuming all data is for 1ª Fase")
-
-        # Build column mapping
-        col_mapping = {}
-        for idx, (year, phase) in enumerate(zip(year_headers, phase_headers), start=1):
-            col_mapping[idx] = (year, phase)
-            logging.debug("Column %s maps to year %s, phase %s", idx, year, phase)
-
-        data_struct: Dict[str, Dict[str, Dict[str, Any]]] = {}
-        for year in set(year_headers):
-            data_struct[year] = {"1ª Fase": {}, "2ª Fase": {}}
-
-        # Track section based on the first cell
-        current_section = None  # pylint: disable=invalid-name
-        rows_to_skip = 1 if len(rows) < 3 else 2  # pylint: disable=invalid-name
-        if rows_to_skip == 1:
-            logging.info(
-                "Table has too few rows for course %s, assuming its only vacancies",
-                course.name,
-            )
-
-        for row in rows[rows_to_skip:]:
-            # Get the label (first cell)
-            first_cell = row.find(["th", "td"])
-            if not first_cell:
-                continue
-
-            label = first_cell.get_text(" ", strip=True).lstrip()
-
-            # Improved section detection - check for <strong> or directly match the section text
-            is_section_header = first_cell.find("strong") is not None
-
-            if is_section_header or label in [
-                "Vagas",
-                "Candidatos",
-                "Colocados",
-                "Médias dos Colocados",
-                "Nota de Candidatura do Último Colocado pelo Contingente Geral",
-                "Informação Adicional Sobre Candidatos e Colocados",
-            ]:
-                current_section = label
-                logging.debug("Found section: %s", current_section)
-
-            # Get cells for this row (skip the first label cell)
-            cells = row.find_all(["td", "th"])[1:]
-            for idx, cell in enumerate(cells, start=1):
-                # For the special section of PDFs, extract the url
-                if (
-                    current_section
-                    == "Informação Adicional Sobre Candidatos e Colocados"
-                ):
-                    a_tag = cell.find("a")
-                    value = None  # pylint: disable=invalid-name
-                    if a_tag and a_tag.get("href"):
-                        value = a_tag["href"]
-                        logging.debug("Found info URL: %s", value)
-                else:
-                    cell_text = cell.get_text(strip=True)
-                    value = parse_value(cell_text)
-
-                # Determine the target field name:
-                # pylint: disable=invalid-name
-                field = None
-                if current_section == "Vagas":
-                    field = "vacancies"
-                elif current_section == "Candidatos":
-                    # Distinguish the "header" from the sub‑rows.
-                    if label == "Candidatos":
-                        field = "total"
-                    elif label == "do Sexo Feminino":
-                        field = "fem"
-                    elif label == "do Sexo Masculino":
-                        field = "masc"
-                    elif label == "em 1ª Opção":
-                        field = "first_option"
-                elif current_section == "Colocados":
-                    if label == "Colocados":
-                        field = "p_total"
-                    elif label == "do Sexo Feminino":
-                        field = "p_fem"
-                    elif label == "do Sexo Masculino":
-                        field = "p_masc"
-                    elif label == "em 1ª Opção":
-                        field = "p_first_option"
-                elif current_section == "Médias dos Colocados":
-                    if label == "Nota de Candidatura":
-                        field = "application_grade"
-                    elif label == "Provas de Ingresso":
-                        field = "entrance_exams"
-                    elif label == "Média do Secundário":
-                        field = "hs_average"
-                elif (
-                    current_section
-                    == "Nota de Candidatura do Último Colocado pelo Contingente Geral"
-                ):
-                    field = "grade_last"
-                elif (
-                    current_section
-                    == "Informação Adicional Sobre Candidatos e Colocados"
-                ):
-                    field = "info_url"
-                # pylint: enable=invalid-name
-
-                # Use the mapping from column index to (year, phase)
-                if idx in col_mapping and field:
-                    year, phase = col_mapping[idx]
-                    phase_dictionary = data_struct[year][phase]
-                    if field == "info_url":
-                        if value:
-                            value = f"https://www.dges.gov.pt/guias/{value}"  # pylint: disable=invalid-name
-                    phase_dictionary[field] = value
-
-        # Build the YearData for each year
-        year_data = []
-        for year, phases in data_struct.items():
-            phase1 = build_phase(phases.get("1ª Fase", {}))
-            phase2 = build_phase(phases.get("2ª Fase", {}))
-            year_data.append(
-                YearData(
-                    year=int(year),
-                    phase1=phase1,
-                    phase2=phase2 if has_phase_headers else None,
-                )
+                cell_text = cell.get_text(strip=True)
+                value = parse_value(cell_text)
+
+            # Determine the target field name:
+            # pylint: disable=invalid-name
+            field = None
+            if current_section == "Vagas":
+                field = "vacancies"
+            elif current_section == "Candidatos":
+                # Distinguish the "header" from the sub‑rows.
+                if label == "Candidatos":
+                    field = "total"
+                elif label == "do Sexo Feminino":
+                    field = "fem"
+                elif label == "do Sexo Masculino":
+                    field = "masc"
+                elif label == "em 1ª Opção":
+                    field = "first_option"
+            elif current_section == "Colocados":
+                if label == "Colocados":
+                    field = "p_total"
+                elif label == "do Sexo Feminino":
+                    field = "p_fem"
+                elif label == "do Sexo Masculino":
+                    field = "p_masc"
+                elif label == "em 1ª Opção":
+                    field = "p_first_option"
+            elif current_section == "Médias dos Colocados":
+                if label == "Nota de Candidatura":
+                    field = "application_grade"
+                elif label == "Provas de Ingresso":
+                    field = "entrance_exams"
+                elif label == "Média do Secundário":
+                    field = "hs_average"
+            elif (
+                current_section
+                == "Nota de Candidatura do Último Colocado pelo Contingente Geral"
+            ):
+                field = "grade_last"
+            elif current_section == "Informação Adicional Sobre Candidatos e Colocados":
+                field = "info_url"
+            # pylint: enable=invalid-name
+
+            # Use the mapping from column index to (year, phase)
+            if idx in col_mapping and field:
+                year, phase = col_mapping[idx]
+                phase_dictionary = data_struct[year][phase]
+                if field == "info_url":
+                    if value:
+                        value = f"https://www.dges.gov.pt/guias/{value}"  # pylint: disable=invalid-name
+                phase_dictionary[field] = value
+
+    # Build the PhaseStats of each year (only phase 1 without phase headers)
+    phase_stats = []
+    for year, phases in data_struct.items():
+        phase_stats.append(build_phase_stats(int(year), 1, phases.get("1ª Fase", {})))
+        if has_phase_headers:
+            phase_stats.append(
+                build_phase_stats(int(year), 2, phases.get("2ª Fase", {}))
             )
+    return phase_stats
 
-    # Get extra stats url information
-    extra_stats = None  # pylint: disable=invalid-name
-    all_urls = soup.find_all("a")
-    for url in all_urls:
-        if "infocursos.mec.pt" in url.get("href", ""):
-            extra_stats = str(url["href"])  # pylint: disable=invalid-name
-            logging.debug("Found course stats URL: %s", url["href"])
-
-    # Get even more info
-    info_header = soup.find("h2", string="Características do par Instituição/Curso")
-    if not info_header:
-        logging.error("No info header found for course %s", course.name)
-        continue
-
-    info_header = info_header.next
 
+def parse_characteristics(lines: List[str]) -> Characteristics:
+    """Parse the "Grau: ...", "ECTS: ..." lines of a course."""
     info_dict = {}
-    while info_header:
-        info_header = info_header.next
-        if "<br/>" in repr(info_header):
+    for line in lines:
+        if line == BLANK_LINE:
             continue
-        if repr(info_header).startswith("<a") or not info_header:
-            break
-        data_pair = info_header.text.strip().split(": ", 1)
+
+        data_pair = line.split(": ", 1)
         if len(data_pair) != 2:
-            logging.warning(
-                "Info data is not in the expected format: %s", info_header.text.strip()
-            )
+            logging.warning("Info data is not in the expected format: %s", line)
             continue
 
         key, value = data_pair
@@ -461,7 +510,7 @@ for n, course in enumerate(courses):
     if vacancies:
         current_vacancies = int(vacancies[0])
 
-    characteristics = Characteristics(
+    return Characteristics(
         degree=str(info_dict.get("Grau")),
         CNAEF=str(info_dict.get("Área CNAEF")),
         duration=str(info_dict.get("Duração")),
@@ -471,249 +520,208 @@ for n, course in enumerate(courses):
         current_vacancies=current_vacancies,
     )
 
-    # Get the entrance exam data
-    entrance_exams = None  # pylint: disable=invalid-name
-    entrance_exam_data = soup.find("h2", string="Provas de Ingresso")
-    if entrance_exam_data:
-        logging.info("Found entrance exam header.")
-        entrance_exam_data = entrance_exam_data.next
-        if entrance_exam_data:
-            entrance_exam_data = entrance_exam_data.next
-        exams = []
-        counter = 0  # pylint: disable=invalid-name
-        is_combination = False  # pylint: disable=invalid-name
-        is_bundle = False  # pylint: disable=invalid-name
-        exams_final_data = []
-        exams_data = []
-
-        while (
-            entrance_exam_data
-            and not entrance_exam_data.name == "h2"
-            and not entrance_exam_data.text == "Classificações Mínimas"
-        ):
-            counter += 1
-            if counter == 2 and entrance_exam_data.text.strip() == "e":
-                is_combination = True  # pylint: disable=invalid-name
-                entrance_exam_data = get_next(get_next(get_next(entrance_exam_data)))
-                continue
 
-            if entrance_exam_data.text.strip() == "ou":
-                entrance_exam_data = entrance_exam_data.next
-                exams_final_data.append(exams_data)
-                exams_data = []
-                continue
+def parse_entrance_exams(lines: List[str]) -> EntranceExams:
+    """Parse the entrance exam lines, bundles are separated by "ou"."""
+    is_combination = False  # pylint: disable=invalid-name
+    is_bundle = False  # pylint: disable=invalid-name
+    exams_final_data = []
+    exams_data = []
 
-            entrance_exam_str = entrance_exam_data.text.strip()
-            if entrance_exam_str == (
-                "A informação sobre as condições de acesso deve"
-                " ser obtida diretamente junto da universidade."
-            ):
-                break
+    # "<exam>", "e", "Uma das seguintes provas:", "<exam>"...
+    if lines[1:2] == ["e"]:
+        is_combination = True  # pylint: disable=invalid-name
+        lines = lines[:1] + lines[3:]
 
-            if entrance_exam_str in ("Um dos seguintes conjuntos:", ""):
-                entrance_exam_data = entrance_exam_data.next
-                continue
+    for line in lines:
+        if line == "ou":
+            exams_final_data.append(exams_data)
+            exams_data = []
+            continue
 
-            if entrance_exam_str == "Duas das seguintes provas:":
-                entrance_exam_data = entrance_exam_data.next
-                is_bundle = True  # pylint: disable=invalid-name
-                continue
+        if line == NO_ACCESS_INFO:
+            break
 
-            exam_lst = entrance_exam_str.split("  ", 1)
-            if len(exam_lst) != 2:
-                logging.warning(
-                    "Entrance exam data is not in the expected format: %s",
-                    entrance_exam_str,
-                )
-                entrance_exam_data = entrance_exam_data.next
-                continue
+        if line in (BLANK_LINE, "Um dos seguintes conjuntos:"):
+            continue
 
-            exam_code, exam_name = exam_lst
-            exam_name = exam_name.split(" (", 1)[0].strip()
-            exams.append(Exam(name=exam_name, code=exam_code))
-            exams_data.append(Exam(name=exam_name, code=exam_code))
+        if line == "Duas das seguintes provas:":
+            is_bundle = True  # pylint: disable=invalid-name
+            continue
 
-            entrance_exam_data = entrance_exam_data.next
-            if entrance_exam_data:
-                entrance_exam_data = entrance_exam_data.next
+        exam_lst = line.split("  ", 1)
+        if len(exam_lst) != 2:
+            logging.warning("Entrance exam data is not in the expected format: %s", line)
+            continue
 
-        # Group exams
-        exams_final_data.append(exams_data)
-        if not is_combination:
-            exam_bundles = [ExamBundle(exams=exams) for exams in exams_final_data]
-        else:
-            first_exam = exams_final_data[0].pop(0)
-            exam_bundles = [ExamBundle(exams=[first_exam])] + [
-                ExamBundle(exams=exams) for exams in exams_final_data
-            ]
+        exam_code, exam_name = exam_lst
+        exam_name = exam_name.split(" (", 1)[0].strip()
+        exams_data.append(intern_exam(exam_code, exam_name))
 
-        entrance_exams = EntranceExams(
-            is_combination=is_combination, is_bundle=is_bundle, exams=exam_bundles
-        )
+    # Group exams
+    exams_final_data.append(exams_data)
+    if not is_combination:
+        exam_bundles = [ExamBundle(exams=exams) for exams in exams_final_data]
+    else:
+        first_exam = exams_final_data[0].pop(0)
+        exam_bundles = [ExamBundle(exams=[first_exam])] + [
+            ExamBundle(exams=exams) for exams in exams_final_data
+        ]
 
-    # Get the minimum classification
-    min_classification = None  # pylint: disable=invalid-name
-    min_classification_header = soup.find("h2", string="Classificações Mínimas")
-    application_grade_value, entrance_exams_value, _ = get_structured(
-        min_classification_header
+    return EntranceExams(
+        is_combination=is_combination, is_bundle=is_bundle, exams=exam_bundles
     )
-    if application_grade_value and entrance_exams_value:
-        logging.info("Found minimum classification header.")
-        min_classification = MinimumClassification(
-            application_grade=parse_value(application_grade_value.rsplit(" ", 2)[1]),
-            entrance_exams=parse_value(entrance_exams_value.rsplit(" ", 2)[1]),
-        )
 
-    # Get the calculation formula
-    calc_formula = None  # pylint: disable=invalid-name
-    calc_formula_header = soup.find("h2", string="Fórmula de Cálculo")
 
-    hs_average_value, entrance_exams_value, prerequisites_value = get_structured(calc_formula_header)
-    if hs_average_value and entrance_exams_value:
-        logging.info("Found calculation formula header.")
+def parse_min_classification(lines: List[str]) -> Optional[MinimumClassification]:
+    """Parse the minimum application and entrance exam grades."""
+    if len(lines) < 2 or lines[0] == INSTITUTION_INFO:
+        logging.debug("No minimum classification data - institution specific info")
+        return None
 
-        prerequisites = None
-        if prerequisites_value and prerequisites_value.split(": ")[0] == "Pré-Requisito":
-            prerequisites = prerequisites_value.split(": ")[1].strip()[:-1]
+    # "Nota de candidatura: 100 pontos"
+    return MinimumClassification(
+        application_grade=parse_value(lines[0].rsplit(" ", 2)[1]),
+        entrance_exams=parse_value(lines[1].rsplit(" ", 2)[1]),
+    )
 
-        calc_formula = CalculationFormula(
-            hs_average=parse_value(hs_average_value.rsplit(" ", 2)[2][:-1]),
-            entrance_exams=parse_value(entrance_exams_value.rsplit(" ", 2)[2][:-1]),
-            prerequisites=prerequisites
-        )
 
-    # Get the regional preference
-    regional_preference = None  # pylint: disable=invalid-name
-    regional_preference_header = soup.find("h2", string="Preferência Regional")
-    if regional_preference_header:
-        logging.info("Found regional preference header.")
-        regional_preference_header = get_next(get_next(regional_preference_header))
+def parse_calculation_formula(lines: List[str]) -> Optional[CalculationFormula]:
+    """Parse the weights of the high school average and the entrance exams."""
+    if len(lines) < 2 or lines[0] == INSTITUTION_INFO:
+        logging.debug("No calculation formula data - institution specific info")
+        return None
 
-        percentage = regional_preference_header.text.strip()
+    prerequisites = None
+    if len(lines) > 2 and lines[2].split(": ")[0] == "Pré-Requisito":
+        prerequisites = lines[2].split(": ")[1].strip()[:-1]
 
-        regional_preference_header = get_next(get_next(regional_preference_header))
+    # "Média do secundário: 50%"
+    return CalculationFormula(
+        hs_average=parse_value(lines[0].rsplit(" ", 2)[2][:-1]),
+        entrance_exams=parse_value(lines[1].rsplit(" ", 2)[2][:-1]),
+        prerequisites=prerequisites,
+    )
 
-        regions = regional_preference_header.text.strip().split(": ")[1].split(", ")
-        regional_preference = RegionalPreference(
-            percentage=parse_value(percentage[:-1].split(" ")[-1]),
-            regions=[Region(name=region.strip()) for region in regions],
-        )
 
-    # Get the other access preferences
-    other_access_preferences = None  # pylint: disable=invalid-name
-    oa_preferences_header = soup.find("h2", string="Outros Acessos Preferenciais")
-    if oa_preferences_header:
-        logging.info("Found other access preferences header.")
-        oa_preferences_header = get_next(get_next(oa_preferences_header))
-        percentage = oa_preferences_header.text.strip()
-        oa_preferences_header = get_next(
-            get_next(get_next(get_next(oa_preferences_header)))
-        )
-        courses = []
-        while True:
-            if (
-                not oa_preferences_header
-                or oa_preferences_header.name == "a"
-                or oa_preferences_header.text.strip() == ""
-            ):
-                break
-            if oa_preferences_header.name == "br":
-                oa_preferences_header = oa_preferences_header.next
-                continue
+def parse_regional_preference(lines: List[str]) -> RegionalPreference:
+    """Parse the share of vacancies and the regions with preference."""
+    percentage, regions = lines[0], lines[1].split(": ")[1].split(", ")
+    return RegionalPreference(
+        percentage=parse_value(percentage[:-1].split(" ")[-1]),
+        regions=[intern_region(region.strip()) for region in regions],
+    )
 
-            course_id, course_name = oa_preferences_header.text.strip().split(" ", 1)
-            shallow_course = {
-                "id": course_id,
-                "name": course_name,
-            }
-            courses.append(shallow_course)
-            oa_preferences_header = get_next(get_next(oa_preferences_header))
-
-        if courses:
-            other_access_preferences = OtherAccessPreferences(
-                percentage=parse_value(percentage[:-1].split(" ")[-1]),
-                courses=[
-                    ShallowCourse(course_id=course["id"], name=course["name"])
-                    for course in courses
-                ],
-            )
 
-    # Get prerequisites
-    prerequisites = None  # pylint: disable=invalid-name
-    prerequisites_header = soup.find("h2", string="Pré-Requisitos")
-    if prerequisites_header:
-        logging.info("Found prerequisites header.")
-        prerequisites_header = get_next(get_next(prerequisites_header))
-        prerequisites_list = prerequisites_header.text.strip().split(": ", 1)
-        if len(prerequisites_list) == 2:
-            prerequisite_type = prerequisites_list[1]
-            prerequisites_header = get_next(
-                get_next(get_next(get_next(prerequisites_header)))
-            )
-            groups = []
-            while True:
-                if (
-                    not prerequisites_header
-                    or prerequisites_header.name == "h2"
-                    or prerequisites_header.text.strip() == ""
-                    or prerequisites_header.text.strip() == "Provas de Ingresso"
-                ):
-                    break
-                if prerequisites_header.name == "br":
-                    prerequisites_header = prerequisites_header.next
-                    continue
-
-                prerequisite_group = (
-                    prerequisites_header.text.strip()
-                    .split(" - ", 1)[0]
-                    .split(" ", 1)[1]
-                )
-                logging.debug("Found prerequisite group: %s", prerequisite_group)
-                groups.append(prerequisite_group)
-                prerequisites_header = get_next(get_next(prerequisites_header))
+def parse_other_access_preferences(
+    lines: List[str],
+) -> Optional[OtherAccessPreferences]:
+    """Parse the share of vacancies and the courses with preference."""
+    # "Percentagem de vagas: 30%", "Cursos:", "<id> <name>"... up to a blank line
+    courses = []
+    for line in until_blank(lines)[2:]:
+        course_id, course_name = line.split(" ", 1)
+        courses.append(ShallowCourse(course_id=course_id, name=course_name))
 
-            if groups:
-                if len(groups) > 1:
-                    logging.warning("Multiple prerequisite groups found: %s", groups)
+    if not courses:
+        return None
+    return OtherAccessPreferences(
+        percentage=parse_value(lines[0][:-1].split(" ")[-1]), courses=courses
+    )
 
-                prerequisites = Prerequisites(
-                    type=prerequisite_type,
-                    group=groups[0],
-                )
-        else:
-            logging.warning(
-                "Prerequisites data is not in the expected format: %s",
-                prerequisites_header.text.strip(),
-            )
 
-    database.append(
-        CourseData(
-            course=course,
-            previous_applications=PreviousApplications(year_data=year_data),
-            characteristics=characteristics,
-            entrance_exams=entrance_exams,
-            min_classification=min_classification,
-            calculation_formula=calc_formula,
-            regional_preference=regional_preference,
-            other_access_preferences=other_access_preferences,
-            prerequisites=prerequisites,
-            extra_stats_url=extra_stats,
+def parse_prerequisites(lines: List[str]) -> Optional[Prerequisites]:
+    """Parse the prerequisite type and group."""
+    prerequisites_list = lines[0].split(": ", 1) if lines else []
+    if len(prerequisites_list) != 2:
+        logging.warning(
+            "Prerequisites data is not in the expected format: %s", lines[:1]
         )
+        return None
+
+    # "Tipo de Pré-Requisitos: ...", "Grupos:", "Grupo F - ..."... up to a blank line
+    groups = []
+    for line in until_blank(lines)[2:]:
+        prerequisite_group = line.split(" - ", 1)[0].split(" ", 1)[1]
+        logging.debug("Found prerequisite group: %s", prerequisite_group)
+        groups.append(prerequisite_group)
+
+    if not groups:
+        return None
+    if len(groups) > 1:
+        logging.warning("Multiple prerequisite groups found: %s", groups)
+    return Prerequisites(type=prerequisites_list[1], group=groups[0])
+
+
+# What the section parsers raise on lines they don't expect (a split with too
+# few parts, a number that isn't one...), turned into ParseError
+PARSER_ERRORS = (AttributeError, IndexError, KeyError, ValueError)
+
+# CourseData field and parser of every section, by heading
+SECTION_PARSERS: Dict[str, Tuple[str, Callable[[List[str]], Any]]] = {
+    CHARACTERISTICS_HEADING: ("characteristics", parse_characteristics),
+    "Provas de Ingresso": ("entrance_exams", parse_entrance_exams),
+    "Classificações Mínimas": ("min_classification", parse_min_classification),
+    "Fórmula de Cálculo": ("calculation_formula", parse_calculation_formula),
+    "Preferência Regional": ("regional_preference", parse_regional_preference),
+    "Outros Acessos Preferenciais": (
+        "other_access_preferences",
+        parse_other_access_preferences,
+    ),
+    "Pré-Requisitos": ("prerequisites", parse_prerequisites),
+}
+
+
+def parse_course_page(soup: BeautifulSoup, course: Course) -> CourseData:
+    """Parse a course details page (ParseError if it is not in the expected format)."""
+    page = CoursePage(soup)
+
+    phase_stats = []
+    if page.table:
+        try:
+            phase_stats = parse_phase_table(page.table, course)
+        except PARSER_ERRORS as e:
+            raise ParseError(f"Unexpected statistics table: {e!r}") from e
+
+    if CHARACTERISTICS_HEADING not in page.sections:
+        raise ParseError(f"No info header found for course {course.name}")
+
+    fields = {field: None for field, _ in SECTION_PARSERS.values()}
+    for heading, (field, parser) in SECTION_PARSERS.items():
+        if heading in page.sections:
+            logging.info("Found %s header.", heading)
+            try:
+                fields[field] = parser(page.sections[heading])
+            except PARSER_ERRORS as e:
+                raise ParseError(f"Unexpected {heading} section: {e!r}") from e
+
+    return CourseData(
+        course=course,
+        phase_stats=phase_stats,
+        extra_stats_url=page.extra_stats_url,
+        **fields,
     )
 
-    logging.info("Sleeping for 0.1 seconds...")
-    time.sleep(0.1)
 
-logging.info("Finished processing all courses.")
-logging.info("Saving data to the database...")
+def save_database(database: List[CourseData], target: Engine = engine):
+    """Replace the database contents with the scraped courses."""
+    with Session(target) as session:
+        # Wipe the full database
+        SQLModel.metadata.drop_all(target)
 
-with Session(engine) as session:
-    # Wipe the full database
-    SQLModel.metadata.drop_all(engine)
+        # Create the database tables if they don't exist
+        SQLModel.metadata.create_all(target)
+        # Fresh tables need none of the migrations
+        with target.begin() as conn:
+            conn.exec_driver_sql(f"PRAGMA user_version = {LATEST_VERSION}")
 
-    # Create the database tables if they don't exist
-    SQLModel.metadata.create_all(engine)
+        insert_courses(session, database)
 
+    logging.info("Data saved to the database successfully.")
+
+
+def insert_courses(session: Session, database: List[CourseData]):
+    """Add scraped courses to the database, reusing the institutions already in it."""
     # First insert all unique institutions
     unique_institutions = {}
     for course_data in database:
@@ -776,41 +784,246 @@ with Session(engine) as session:
             for shallow_course in course_data.other_access_preferences.courses:
                 shallow_course.other_access_preferences_id = course_data.other_access_preferences.id
 
-        # Handle previous_applications correctly
-        if (
-            course_data.previous_applications
-            and course_data.previous_applications.year_data
-        ):
-            # Add the PreviousApplications to session to get an ID
-            session.add(course_data.previous_applications)
-            session.flush()
-
-            # Set the ID for reference on CourseData
-            course_data.previous_applications_id = course_data.previous_applications.id
-
-            # Update the relationship on all YearData objects
-            for year in course_data.previous_applications.year_data:
-                year.previous_applications_id = course_data.previous_applications.id
-
     # Add the courses to the database
     session.add_all(database)
     session.commit()
 
-logging.info("Data saved to the database successfully.")
 
-# Apply pragmas to the database
-with engine.connect() as conn:
-    conn.exec_driver_sql("PRAGMA analysis_limit=1000")
-    conn.exec_driver_sql("PRAGMA optimize")
-    conn.exec_driver_sql("PRAGMA vacuum")
-    conn.exec_driver_sql("PRAGMA journal_mode=WAL")
-    conn.exec_driver_sql("PRAGMA locking_mode=NORMAL")
-    conn.exec_driver_sql("PRAGMA synchronous=NORMAL")
-    conn.exec_driver_sql("ANALYZE")
-    conn.exec_driver_sql("PRAGMA query_only=ON")
-    conn.commit()
+def optimize_database(target: Engine = engine):
+    """Apply pragmas to the database and update the query planner statistics."""
+    with target.connect() as conn:
+        conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+        conn.exec_driver_sql("PRAGMA optimize")
+        conn.exec_driver_sql("PRAGMA vacuum")
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        conn.exec_driver_sql("PRAGMA locking_mode=NORMAL")
+        conn.exec_driver_sql("PRAGMA synchronous=NORMAL")
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA query_only=ON")
+        conn.commit()
+
+
+def open_build_database(copy: bool = False) -> Engine:
+    """Engine on a new database at BUILD_PATH, empty or a copy of the current one."""
+    if copy:
+        copy_database(DATABASE_PATH, BUILD_PATH)
+    else:
+        remove_database_files(BUILD_PATH)
+    return create_engine(f"sqlite:///{BUILD_PATH}")
+
+
+def publish_database(target: Engine):
+    """Move the built database over DATABASE_PATH and export its static bundle."""
+    target.dispose()
+    replace_database(BUILD_PATH, DATABASE_PATH)
+    # The server only uses a catalogue snapshot exported from this build
+    manifest = export_bundle()
+    logging.info("Exported version %s of the catalogue", manifest["version"])
+
+
+def quarantine_path(course: Course) -> str:
+    """Path (without extension) of the quarantined page of a course."""
+    return os.path.join(QUARANTINE_DIR, f"{course.institution.id}_{course.course_id}")
+
+
+def release_pages(paths: List[str]):
+    """Remove quarantined pages (that parse now)."""
+    for path in paths:
+        for extension in (".html", ".json"):
+            if os.path.exists(path + extension):
+                os.remove(path + extension)
+
+
+def quarantine_page(course: Course, html: str, error: Exception):
+    """Keep the HTML of a course page that failed to parse, with the error."""
+    os.makedirs(QUARANTINE_DIR, exist_ok=True)
+    path = quarantine_path(course)
+    with open(path + ".html", "w", encoding="utf-8") as f:
+        f.write(html)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "url": course.url,
+                "course_id": course.course_id,
+                "name": course.name,
+                "institution_id": course.institution.id,
+                "institution_name": course.institution.name,
+                "error": f"{type(error).__name__}: {error}",
+                "traceback": "".join(traceback.format_exception(error)),
+                "quarantined": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            },
+            f,
+            indent=4,
+            ensure_ascii=False,
+        )
 
-time_taken = time.time() - start_time
+    logging.error("Quarantined course %s (%s): %s", course.name, course.url, error)
 
-logging.info("Total courses processed: %d", len(database))
-logging.info("Data processing completed in %.2f seconds", time_taken)
+
+def reparse_quarantine():
+    """Parse the quarantined pages again and add the ones that parse to the database."""
+    names = []
+    if os.path.isdir(QUARANTINE_DIR):
+        names = sorted(
+            name[: -len(".json")]
+            for name in os.listdir(QUARANTINE_DIR)
+            if name.endswith(".json")
+        )
+    if not names:
+        logging.info("No quarantined pages in %s", QUARANTINE_DIR)
+        return
+
+    database = []
+    done = []
+    target = open_build_database(copy=True)
+    with Session(target) as session:
+        # The parsed courses must share the exams and regions already stored
+        EXAMS.update({exam.code: exam for exam in session.exec(select(Exam))})
+        REGIONS.update({region.name: region for region in session.exec(select(Region))})
+        stored = {
+            tuple(row)
+            for row in session.exec(select(Course.institution_id, Course.course_id))
+        }
+
+        for name in names:
+            path = os.path.join(QUARANTINE_DIR, name)
+            with open(path + ".json", encoding="utf-8") as f:
+                page = json.load(f)
+            with open(path + ".html", encoding="utf-8") as f:
+                html = f.read()
+
+            if (page["institution_id"], page["course_id"]) in stored:
+                logging.info("Course %s is already in the database", page["name"])
+                done.append(path)
+                continue
+
+            institution = session.get(Institution, page["institution_id"])
+            course = Course(
+                course_id=page["course_id"],
+                name=page["name"],
+                url=page["url"],
+                institution=institution
+                or Institution(id=page["institution_id"], name=page["institution_name"]),
+            )
+            try:
+                course_data = parse_course_page(BeautifulSoup(html, "html.parser"), course)
+            except Exception as e:  # pylint: disable=broad-except
+                quarantine_page(course, html, e)
+                course.institution = None  # out of the stored institution's courses
+                continue
+
+            logging.info("Parsed quarantined course %s", course.name)
+            session.add(course_data)
+            database.append(course_data)
+            done.append(path)
+
+        if database:
+            insert_courses(session, database)
+
+    if database:
+        update_aggregates(target)
+        optimize_database(target)
+        publish_database(target)
+    else:
+        target.dispose()
+        remove_database_files(BUILD_PATH)
+
+    release_pages(done)
+    logging.info(
+        "Reparsed %d quarantined pages, %d still fail",
+        len(done),
+        len(names) - len(done),
+    )
+
+
+def main():
+    """Scrape every course and save them to the database."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--reparse",
+        action="store_true",
+        help=f"only parse the course pages in {QUARANTINE_DIR}/ again",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.reparse:
+        reparse_quarantine()
+        return
+
+    started = datetime.now(timezone.utc)
+    start_time = time.time()
+    stages = {}
+
+    stage_start = time.time()
+    courses = scrape_listing()
+    stages["listing"] = time.time() - stage_start
+
+    stage_start = time.time()
+    database = []
+    failed_courses = []
+    for n, course in enumerate(courses):
+        logging.info("%s - Processing course: %s with URL: %s", n, course.name, course.url)
+        html = get_page(course.url)
+        if html is None:
+            logging.warning("Failed to get soup for course %s", course.name)
+            continue
+
+        try:
+            course_data = parse_course_page(make_soup(html), course)
+        except Exception as e:  # pylint: disable=broad-except
+            # One bad page must not end the crawl
+            quarantine_page(course, html, e)
+            failed_courses.append(course.url)
+        else:
+            database.append(course_data)
+
+        logging.info("Sleeping for 0.1 seconds...")
+        time.sleep(0.1)
+    stages["courses"] = time.time() - stage_start
+
+    logging.info("Finished processing all courses.")
+    logging.info("Saving data to the database...")
+
+    stage_start = time.time()
+    # Quarantined pages that parsed this time, released once they are saved (an
+    # aborted run keeps them for --reparse)
+    parsed_pages = [quarantine_path(course_data.course) for course_data in database]
+    target = open_build_database()
+    save_database(database, target)
+    stages["save"] = time.time() - stage_start
+
+    stage_start = time.time()
+    update_aggregates(target)
+    stages["aggregates"] = time.time() - stage_start
+
+    stage_start = time.time()
+    optimize_database(target)
+    publish_database(target)
+    stages["optimize"] = time.time() - stage_start
+    release_pages(parsed_pages)
+
+    time_taken = time.time() - start_time
+
+    logging.info("Total courses processed: %d", len(database))
+    logging.info("Data processing completed in %.2f seconds", time_taken)
+
+    # Machine readable summary of the run
+    report = {
+        "started": started.isoformat(timespec="seconds"),
+        "duration": round(time_taken, 3),
+        "stages": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+        "courses_listed": len(courses),
+        "courses_saved": len(database),
+        "fetch": dict(FETCH_STATS),
+        "parse_failures": len(failed_courses),
+        "failed_courses": failed_courses,
+    }
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    logging.info("Run report written to %s", REPORT_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,309 @@
 """Website backend for course search."""
 
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
 from datetime import datetime
+from functools import wraps
 
-from flask import Flask, jsonify, render_template, request
+from flask import (
+    Flask,
+    abort,
+    g,
+    jsonify,
+    make_response,
+    render_template,
+    request,
+)
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
-from query import course_data_to_dict, full_search
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+import ratelimit  # pylint: disable=unused-import # noqa: F401 (sqlite:// storage)
+from datafiles import DATABASE_PATH, database_build_id, database_last_modified
+from facets import build_facet_index, facet_counts
+from fuzzy import build_fuzzy_indexes, with_fuzzy_matches
+from fuzzy import suggest as fuzzy_suggest
+from lazy import lazy_import
+from memory import MemoryDiagnostics
+from metrics import Counter, Gauge, LabeledHistogram, Registry
+from profiling import SLOW_QUERY_SECONDS, SearchProfiler
+from snapshot import load_snapshot
+from suggest import DEFAULT_LIMIT, MAX_LIMIT, build_suggestion_index
+from workerstats import WorkerStats
+
+# SQLModel/SQLAlchemy (and numpy) are most of the startup time and are only
+# needed by the searches (and the calculator), so they load on first use (or in
+# warm_up, before forking)
+query = lazy_import("query")
+calculator = lazy_import("calculator")
 
 app = Flask(__name__)
+
+# Rate limits are shared by all the workers of a host through SQLite by default,
+# override with FLASK_RATELIMIT_STORAGE_URI (e.g. "redis://..." for many hosts)
+app.config["RATELIMIT_STORAGE_URI"] = "sqlite:///ratelimit.db"
+# Where the preforked workers combine their metrics and profiles
+app.config["WORKER_STATS_PATH"] = "worker_stats.db"
+# Admin endpoints are disabled unless FLASK_ADMIN_TOKEN is set
+app.config["ADMIN_TOKEN"] = None
+app.config["SLOW_QUERY_SECONDS"] = SLOW_QUERY_SECONDS
+# tracemalloc based memory tracking of every request (slow, for diagnostics)
+app.config["MEMORY_TRACE"] = False
+app.config.from_prefixed_env()
+
 limiter = Limiter(
     get_remote_address,
     app=app,
     default_limits=["2 per second"],
 )
 
+DATA_DIR = os.path.join(app.static_folder, "data")
+
+profiler = SearchProfiler(slow_query_seconds=app.config["SLOW_QUERY_SECONDS"])
+memory = MemoryDiagnostics(trace=app.config["MEMORY_TRACE"])
+
+# Prefix index of the search box suggestions, trigram indexes of the names,
+# facet bitmaps and calculator arrays, built on first use (or in warm_up)
+SUGGESTIONS = None
+FUZZY = None
+FACETS = None
+GRADE_CALCULATOR = None
+
+# The data only changes once per scrape, so every response is tied to the DB build
+CACHE_MAX_AGE = 3600
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/css", "text/javascript")
+BUILD_ID = database_build_id()
+LAST_MODIFIED = database_last_modified()
+
+# Memory mapped catalogue from the last `python export.py` of this database build,
+# shared by all workers
+SNAPSHOT = load_snapshot(DATA_DIR, BUILD_ID)
+
+# Run before forking so every worker shares SQLAlchemy's compiled statement cache
+WARM_UP_SEARCHES = [
+    # What the website sends: course page or expanded result, and search box
+    {"unique_id": "1"},
+    {"course_name": "a", "view": "summary"},
+    # Full responses and the other sort modes
+    {"course_name": "a"},
+    {"course_name": "a", "sort_by": "name_asc", "view": "summary"},
+    {"institution_name": "a", "sort_by": "institution_asc"},
+    {"course_name": "a", "sort_by": "grade_desc"},
+    {"course_name": "a", "sort_by": "average_desc"},
+]
+
+SCRAPER_REPORT = "scraper_report.json"
+
+# Prometheus metrics (of this process, combined across workers when rendered)
+metrics = Registry()
+REQUEST_LATENCY = metrics.register(
+    LabeledHistogram(
+        "dges_request_duration_seconds",
+        "Request latency per route.",
+        ("route", "method"),
+    )
+)
+REQUESTS = metrics.register(
+    Counter(
+        "dges_requests_total",
+        "Requests per route and status code.",
+        ("route", "method", "status"),
+    )
+)
+CACHE_REQUESTS = metrics.register(
+    Counter(
+        "dges_cache_requests_total",
+        "Cacheable responses, by whether the client's ETag was still valid.",
+        ("route", "result"),
+    )
+)
+COURSE_LOOKUPS = metrics.register(
+    Counter(
+        "dges_course_lookups_total",
+        "Course page existence checks, by source (snapshot or database).",
+        ("source",),
+    )
+)
+
+
+def pool_stats():
+    """Connection pool gauges of the serving engine."""
+    pool = query.engine.pool
+    return {
+        ("size",): pool.size(),
+        ("checked_in",): pool.checkedin(),
+        ("checked_out",): pool.checkedout(),
+        # SQLAlchemy counts down from -pool_size until the pool is full
+        ("overflow",): max(0, pool.overflow()),
+    }
+
+
+def scraper_stats():
+    """Numbers from the report of the last scraper run, if there is one."""
+    try:
+        with open(SCRAPER_REPORT, encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    stats = {
+        ("duration_seconds",): report["duration"],
+        ("courses_listed",): report["courses_listed"],
+        ("courses_saved",): report["courses_saved"],
+        ("parse_failures",): report["parse_failures"],
+    }
+    for key, value in report["fetch"].items():
+        stats[(f"fetch_{key}",)] = value
+    return stats
+
+
+metrics.register(
+    Gauge(
+        "dges_db_pool_connections",
+        "Database connection pool state.",
+        pool_stats,
+        ("state",),
+        per_worker=True,
+    )
+)
+metrics.register(
+    Gauge(
+        "dges_scraper_last_run",
+        "Statistics of the last scraper run.",
+        scraper_stats,
+        ("stat",),
+    )
+)
+
+
+# Statistics of every worker under the preforking launcher, this process only without
+WORKER_STATS = None
+
+
+def worker_state() -> dict:
+    """Statistics of this process, published for the other workers."""
+    return {
+        "metrics": metrics.state(),
+        "profile": profiler.state(),
+        "memory": memory.summary(),
+    }
+
+
+def exited_state(states) -> dict:
+    """Cumulative statistics of workers that exited (no gauges or memory)."""
+    return {
+        "metrics": metrics.merge(
+            [state["metrics"] for state in states], cumulative_only=True
+        ),
+        "profile": profiler.merge([state["profile"] for state in states]),
+    }
+
+
+def worker_states() -> list:
+    """Statistics of every worker (and of the exited ones), or of this process."""
+    if WORKER_STATS is None:
+        return [worker_state()]
+    return WORKER_STATS.states()
+
+
+def warm_up():
+    """Preload the state shared by every worker (and reload it on changes)."""
+    global SNAPSHOT, SUGGESTIONS, FUZZY, FACETS  # pylint: disable=global-statement
+    global GRADE_CALCULATOR  # pylint: disable=global-statement
+    global BUILD_ID, LAST_MODIFIED  # pylint: disable=global-statement
+
+    BUILD_ID = database_build_id()
+    LAST_MODIFIED = database_last_modified()
+
+    if SNAPSHOT is not None:
+        SNAPSHOT.close()
+    SNAPSHOT = load_snapshot(DATA_DIR, BUILD_ID)
+    SUGGESTIONS = build_suggestion_index(snapshot=SNAPSHOT)
+    FUZZY = build_fuzzy_indexes(snapshot=SNAPSHOT)
+    FACETS = build_facet_index()
+    GRADE_CALCULATOR = calculator.build_calculator()
+
+    # The database may have been replaced, drop connections to the old file
+    query.engine.dispose()
+    for config in WARM_UP_SEARCHES:
+        fields = query.resolve_fields(query.normalize_parameters(config))
+        for course_data in query.full_search(config):
+            query.course_data_to_dict(course_data, fields)
+
+    # SQLite connections must never be shared with the forked workers
+    query.engine.dispose()
+
+
+def after_fork():
+    """Reset the inherited connection pool in a freshly forked worker."""
+    query.engine.dispose(close=False)
+    # Started before serving, so the graceful exit doesn't wait for it
+    profiler.start_writer()
+    if WORKER_STATS is not None:
+        WORKER_STATS.start()
+
+
+def before_exit():
+    """Write the queued slow queries and publish the last statistics of a worker."""
+    profiler.flush()
+    if WORKER_STATS is not None:
+        WORKER_STATS.publish()
+
+
+def worker_exited(pid: int):
+    """Keep the counters of an exited worker in the totals."""
+    if WORKER_STATS is not None:
+        WORKER_STATS.retire(pid)
+
+
+def make_etag(*parts) -> str:
+    """Build an ETag from the database build ID and the given parts."""
+    key = json.dumps([BUILD_ID, *parts], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def cached_response(etag: str, build_response):
+    """Answer with a 304 if the client already has the ETag, else build the response."""
+    route = request.url_rule.rule
+    if request.if_none_match.contains_weak(etag):
+        CACHE_REQUESTS.inc(route, "hit")
+        response = app.response_class(status=304)
+    else:
+        response = make_response(build_response())
+        if response.status_code != 200:
+            return response
+        CACHE_REQUESTS.inc(route, "miss")
+
+    # The ETag names the data, not the bytes, so it holds for every encoding,
+    # and the 304 varies on the encoding like the 200 (see compress_response)
+    response.set_etag(etag, weak=True)
+    response.vary.add("Accept-Encoding")
+    response.last_modified = LAST_MODIFIED
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    return response
+
 
 @app.route("/", methods=["GET"])
 def index():
     """Main page."""
-    return render_template("index.html", datetime=datetime.now())
+    now = datetime.now()
+    return cached_response(
+        make_etag("index", now.year),
+        lambda: render_template("index.html", datetime=now),
+    )
 
 @app.route("/c/<course_id>", methods=["GET"])
 def course(course_id):
@@ -29,29 +313,295 @@ def course(course_id):
     except ValueError:
         return jsonify({"error": "Invalid course ID"}), 400
 
-    course_data = full_search({"unique_id": course_id})
-    if not course_data:
+    if SNAPSHOT is not None:
+        COURSE_LOOKUPS.inc("snapshot")
+        exists = course_id in SNAPSHOT
+    else:
+        COURSE_LOOKUPS.inc("database")
+        exists = bool(query.full_search({"unique_id": course_id}))
+
+    if not exists:
         return render_template("not_found.html"), 404
 
-    return render_template("course.html", course_id=course_id)
+    return cached_response(
+        make_etag("course", course_id),
+        lambda: render_template("course.html", course_id=course_id),
+    )
+
+def admin_required(view):
+    """Only allow requests with the admin token (404 when none is configured)."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = app.config["ADMIN_TOKEN"]
+        if not token:
+            abort(404)
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            abort(403)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+@app.before_request
+def start_timer():
+    """Remember when the request started."""
+    g.request_start = time.perf_counter()
+    memory.before_request()
+
+
+# Registered before compress_response so it runs after it (and times compression)
+@app.after_request
+def record_request_metrics(response):
+    """Record the latency and status of the request."""
+    route = request.url_rule.rule if request.url_rule else "(unmatched)"
+    start = g.get("request_start")
+    if start is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - start, route, request.method)
+    REQUESTS.inc(route, request.method, str(response.status_code))
+    memory.after_request(route)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compress responses with brotli or gzip when the client accepts it."""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    content = response.get_data()
+    if len(content) < COMPRESS_MIN_SIZE:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(content, quality=5))
+        response.content_encoding = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(content, compresslevel=6))
+        response.content_encoding = "gzip"
+
+    return response
+
 
 @app.errorhandler(404)
 def not_found(_):
     """404 error handler."""
     return render_template("not_found.html"), 404
 
-@app.route("/api/search", methods=["POST"])
-@limiter.limit("30 per minute")
+def search_config():
+    """Get the search config of the current request."""
+    return request.args if request.method == "GET" else request.form
+
+
+def search_cost() -> int:
+    """Rate limit cost of the current search, revalidations are always cheap."""
+    params = query.normalize_parameters(search_config())
+    if request.if_none_match.contains_weak(make_etag("search", params)):
+        return 1
+    return query.estimate_search_cost(params)
+
+
+@app.route("/api/search", methods=["GET", "POST"])
+@limiter.limit("60 per minute", cost=search_cost)
 def search():
-    """Seach endpoint for course data."""
+    """Seach endpoint for course data (GET is cacheable, POST kept for old clients)."""
+    global FUZZY  # pylint: disable=global-statement
+
+    config = search_config()
+    params = query.normalize_parameters(config)
+    if FUZZY is None:
+        FUZZY = build_fuzzy_indexes(snapshot=SNAPSHOT)
+
+    def build_response():
+        fields = query.resolve_fields(params)
+        with profiler.profile(params) as profile:
+            course_data = query.full_search(config)
+            course_data = with_fuzzy_matches(FUZZY, config, course_data)
+            with profile.stage("serialize"):
+                response = jsonify(
+                    [query.course_data_to_dict(course, fields) for course in course_data]
+                )
+            profile.courses = len(course_data)
+            profile.response_size = response.content_length
+        return response
+
     try:
-        course_data = full_search(request.form)
-        course_dicts = [course_data_to_dict(course) for course in course_data]
-        return jsonify(course_dicts)
+        return cached_response(make_etag("search", params), build_response)
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/suggest", methods=["GET"])
+@limiter.limit("10 per second")
+def suggest():
+    """Search box suggestions (courses and institutions) for a partial name or code."""
+    global SUGGESTIONS, FUZZY  # pylint: disable=global-statement
+
+    text = request.args.get("q", "")
+    try:
+        limit = min(int(request.args.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+
+    if SUGGESTIONS is None:
+        SUGGESTIONS = build_suggestion_index(snapshot=SNAPSHOT)
+    if FUZZY is None:
+        FUZZY = build_fuzzy_indexes(snapshot=SNAPSHOT)
+    return cached_response(
+        make_etag("suggest", text, limit),
+        lambda: jsonify(fuzzy_suggest(SUGGESTIONS, FUZZY, text, limit)),
+    )
+
+
+@app.route("/api/facets", methods=["GET"])
+@limiter.limit("5 per second")
+def facets():
+    """Matching courses per degree, CNAEF area, type, competition, region and exam."""
+    global FACETS  # pylint: disable=global-statement
+
+    params = query.normalize_parameters(request.args)
+    if FACETS is None:
+        FACETS = build_facet_index()
+
+    try:
+        return cached_response(
+            make_etag("facets", params), lambda: jsonify(facet_counts(FACETS, params))
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/trends", methods=["GET"])
+def trends():
+    """Trend aggregates of a course (unique_id), an institution or of every institution."""
+    unique_id = request.args.get("unique_id")
+    institution_id = request.args.get("institution_id")
+    try:
+        unique_id = int(unique_id) if unique_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid course ID"}), 400
+
+    def build_response():
+        result = query.get_trends(unique_id=unique_id, institution_id=institution_id)
+        if result is None:
+            return jsonify({"error": "No trends for this course or institution"}), 404
+        return jsonify(result)
+
+    return cached_response(
+        make_etag("trends", unique_id, institution_id), build_response
+    )
+
+
+@app.route("/api/calculator", methods=["GET"])
+@limiter.limit("5 per second")
+def grade_calculator():
+    """Application grade and last placed grade of every course for a student's grades."""
+    global GRADE_CALCULATOR  # pylint: disable=global-statement
+
+    try:
+        arguments = calculator.read_request(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if GRADE_CALCULATOR is None:
+        GRADE_CALCULATOR = calculator.build_calculator()
+
+    try:
+        return cached_response(
+            make_etag("calculator", request.args.to_dict()),
+            lambda: jsonify(GRADE_CALCULATOR.calculate(**arguments)),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/admin/profile", methods=["GET"])
+@limiter.exempt
+@admin_required
+def admin_profile():
+    """Search latency histograms per query shape (of every worker)."""
+    states = worker_states()
+    return jsonify(
+        {
+            "workers": [state["memory"]["pid"] for state in states if "memory" in state],
+            "shapes": profiler.report(
+                profiler.merge([state["profile"] for state in states])
+            ),
+        }
+    )
+
+
+@app.route("/admin/memory", methods=["GET"])
+@limiter.exempt
+@admin_required
+def admin_memory():
+    """Memory footprint of the answering worker, with the RSS of every worker."""
+    workers = [state["memory"] for state in worker_states() if "memory" in state]
+    return jsonify(
+        {
+            **memory.report(),
+            "workers": workers,
+            "total_rss": sum(worker["rss"] for worker in workers),
+        }
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+@limiter.exempt
+@admin_required
+def prometheus_metrics():
+    """Prometheus metrics (combined across the workers)."""
+    state = metrics.merge([state["metrics"] for state in worker_states()])
+    return app.response_class(
+        metrics.render(state), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser(
+        "serve", help="run the preforking production server"
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="worker processes"
+    )
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from prefork import PreforkServer  # pylint: disable=import-outside-toplevel
+
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+        WORKER_STATS = WorkerStats(
+            app.config["WORKER_STATS_PATH"], worker_state, exited_state
+        )
+        WORKER_STATS.clear()
+        PreforkServer(
+            app,
+            warm_up,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            watch=[DATABASE_PATH, os.path.join(DATA_DIR, "manifest.json")],
+            after_fork=after_fork,
+            before_exit=before_exit,
+            worker_exited=worker_exited,
+        ).run()
+    else:
+        app.run(debug=True)
@@ -0,0 +1,239 @@
+"""Compact binary catalogue snapshot, memory mapped so worker processes share it.
+
+It holds what the server needs before any search: the course IDs (course page
+existence checks) and the codes and names the suggestion and fuzzy indexes are
+built from, so a worker starts without querying SQLite for them.
+
+Layout (little endian, every block 8 byte aligned):
+
+    header       magic, format version, row count, column count, string count,
+                 build ID of the database it was exported from
+    directory    one (name, typecode, offset) entry per column
+    columns      fixed width blocks of row count items each
+    strings      string count + 1 uint32 offsets followed by the UTF-8 blob
+
+String columns store indexes into the string table (strings are interned).
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+MAGIC = b"DGESCAT\x00"
+FORMAT_VERSION = 3
+SNAPSHOT_NAME = "catalogue.bin"
+
+HEADER = struct.Struct("<8sIIII16s")
+COLUMN_ENTRY = struct.Struct("<32sc7xQ")
+
+# Column name -> array typecode ("I" for string references)
+STRING_COLUMNS = ["course_id", "name", "institution_id", "institution_name"]
+COLUMNS = {"id": "I", **{name: "I" for name in STRING_COLUMNS}}
+
+
+def _align(size: int) -> int:
+    """Round a size up to the next multiple of 8."""
+    return (size + 7) & ~7
+
+
+def course_to_row(course: dict) -> dict:
+    """Flatten a course dict (from course_data_to_dict) into snapshot columns."""
+    return {
+        "id": course["id"],
+        "course_id": course["course"]["id"],
+        "name": course["course"]["name"],
+        "institution_id": course["course"]["institution"]["id"],
+        "institution_name": course["course"]["institution"]["name"],
+    }
+
+
+def write_snapshot(path: str, courses: List[dict], build_id: str = ""):
+    """Write the courses (dicts from course_data_to_dict) to a snapshot file."""
+    rows = sorted((course_to_row(course) for course in courses), key=lambda r: r["id"])
+
+    # Intern every string, index 0 is reserved for missing values
+    strings: List[str] = [""]
+    string_refs: Dict[str, int] = {}
+
+    def intern(value) -> int:
+        if value is None:
+            return 0
+        value = str(value)
+        if value not in string_refs:
+            string_refs[value] = len(strings)
+            strings.append(value)
+        return string_refs[value]
+
+    blocks = []
+    for name, typecode in COLUMNS.items():
+        if name in STRING_COLUMNS:
+            values = [intern(row[name]) for row in rows]
+        else:
+            values = [row[name] for row in rows]
+        blocks.append((name, typecode, array(typecode, values).tobytes()))
+
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = array("I", [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+
+    offset = _align(HEADER.size + COLUMN_ENTRY.size * len(blocks))
+    directory = []
+    for name, typecode, data in blocks:
+        directory.append(
+            COLUMN_ENTRY.pack(name.encode("ascii"), typecode.encode("ascii"), offset)
+        )
+        offset = _align(offset + len(data))
+    strings_offset = offset
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                len(rows),
+                len(blocks),
+                len(strings),
+                build_id.encode("ascii"),
+            )
+        )
+        f.write(b"".join(directory))
+        for _, _, data in blocks:
+            f.write(b"\x00" * (_align(f.tell()) - f.tell()))
+            f.write(data)
+        f.write(b"\x00" * (strings_offset - f.tell()))
+        f.write(offsets.tobytes())
+        f.write(b"".join(encoded))
+
+    # Atomic replace so running workers never map a half written file
+    os.replace(tmp_path, path)
+
+
+class CatalogueSnapshot:
+    """Read only view over a memory mapped catalogue snapshot."""
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise RuntimeError("Catalogue snapshots are only supported on little endian")
+
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, self.count, column_count, string_count, build_id = (
+            HEADER.unpack_from(self._view)
+        )
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a supported catalogue snapshot: {path}")
+        self.build_id = build_id.rstrip(b"\x00").decode("ascii")
+
+        self.columns: Dict[str, memoryview] = {}
+        position = HEADER.size
+        end = HEADER.size
+        for _ in range(column_count):
+            raw_name, typecode, offset = COLUMN_ENTRY.unpack_from(self._view, position)
+            position += COLUMN_ENTRY.size
+            typecode = typecode.decode("ascii")
+            size = array(typecode).itemsize * self.count
+            self.columns[raw_name.rstrip(b"\x00").decode("ascii")] = self._view[
+                offset : offset + size
+            ].cast(typecode)
+            end = max(end, offset + size)
+
+        strings_offset = _align(end)
+        offsets_size = 4 * (string_count + 1)
+        self._string_offsets = self._view[
+            strings_offset : strings_offset + offsets_size
+        ].cast("I")
+        self._string_blob = strings_offset + offsets_size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        """Release the memory map."""
+        for column in self.columns.values():
+            column.release()
+        self._string_offsets.release()
+        self._view.release()
+        self._mmap.close()
+
+    def string(self, ref: int) -> Optional[str]:
+        """Get a string from the string table (None for missing values)."""
+        if not ref:
+            return None
+        start = self._blob_start(ref)
+        end = self._blob_start(ref + 1)
+        return str(self._mmap[start:end], "utf-8")
+
+    def _blob_start(self, ref: int) -> int:
+        return self._string_blob + self._string_offsets[ref]
+
+    def index_of(self, unique_id: int) -> Optional[int]:
+        """Get the row index of a course by its unique ID (rows are sorted by ID)."""
+        ids = self.columns["id"]
+        position = bisect_left(ids, unique_id)
+        if position < self.count and ids[position] == unique_id:
+            return position
+        return None
+
+    def __contains__(self, unique_id: int) -> bool:
+        return self.index_of(unique_id) is not None
+
+    def row(self, index: int) -> dict:
+        """Get a row as a dict with decoded strings (None for missing ones)."""
+        return {
+            name: self.string(column[index]) if name in STRING_COLUMNS else column[index]
+            for name, column in self.columns.items()
+        }
+
+    def courses(self) -> List[tuple]:
+        """(unique ID, course ID, name, institution ID, institution name) of every course."""
+        names = [self.columns[name] for name in STRING_COLUMNS]
+        return [
+            (unique_id, *(self.string(column[index]) for column in names))
+            for index, unique_id in enumerate(self.columns["id"])
+        ]
+
+
+def load_snapshot(
+    data_dir: str, build_id: Optional[str] = None
+) -> Optional[CatalogueSnapshot]:
+    """Open the snapshot of the current exported version, if there is one.
+
+    With a build_id, a snapshot exported from another build of the database
+    is not used either (the server falls back to the database).
+    """
+    try:
+        with open(os.path.join(data_dir, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if "snapshot" not in manifest:
+        return None
+
+    try:
+        snapshot = CatalogueSnapshot(os.path.join(data_dir, manifest["snapshot"]))
+    except (OSError, ValueError):
+        return None
+
+    # The manifest and the snapshot both record the build they came from
+    exported_from = {manifest.get("build_id"), snapshot.build_id}
+    if build_id is not None and exported_from != {build_id}:
+        logging.warning(
+            "Ignoring the catalogue snapshot of database build %s (serving %s)",
+            snapshot.build_id or "unknown",
+            build_id,
+        )
+        snapshot.close()
+        return None
+    return snapshot
@@ -6,13 +6,8 @@ document.addEventListener('DOMContentLoaded', () => {
         resultsContainer.innerHTML = '<div class="loading">Searching courses...</div>';
         
         try {
-            const response = await fetch('/api/search', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/x-www-form-urlencoded',
-                },
-                body: searchParams.toString()
-            });
+            // GET so the browser and any proxy can cache the results
+            const response = await fetch('/api/search?' + searchParams.toString());
             
             const data = await response.json();
             
@@ -8,6 +8,14 @@ document.addEventListener('DOMContentLoaded', () => {
     const advancedSearchForm = document.getElementById('advanced-search-form');
     const sortBySelect = document.getElementById('sort_by');
     const gradeSortOptions = document.getElementById('grade_sort_options');
+    const STATIC_DATA_URL = '/static/data/';
+    let staticIndex = null;
+    const suggestionsList = document.getElementById('suggestions');
+    const FACET_DELAY = 250;
+    let facetTimer = null;
+    const SUGGEST_DELAY = 150;
+    let suggestTimer = null;
+    let suggestController = null;
     
     advancedSearchToggle.addEventListener('click', function() {
         basicSearchBar.classList.toggle('hidden');
@@ -17,6 +25,7 @@ document.addEventListener('DOMContentLoaded', () => {
             advancedSearchToggle.textContent = 'Advanced Mode';
         } else {
             advancedSearchToggle.textContent = 'Simple Mode';
+            updateFacetCounts();
         }
     });
 
@@ -50,30 +59,215 @@ document.addEventListener('DOMContentLoaded', () => {
         await search(searchParams);
     });
 
+    // Show how many courses each option leaves with the rest of the filters
+    advancedSearchForm.addEventListener('input', () => {
+        clearTimeout(facetTimer);
+        facetTimer = setTimeout(updateFacetCounts, FACET_DELAY);
+    });
+
+    async function updateFacetCounts() {
+        const searchParams = new URLSearchParams();
+        for (const [key, value] of new FormData(advancedSearchForm).entries()) {
+            if (value) {
+                searchParams.append(key, value);
+            }
+        }
+
+        try {
+            const response = await fetch('/api/facets?' + searchParams.toString());
+            if (!response.ok) return;
+            const data = await response.json();
+
+            for (const [facet, counts] of Object.entries(data.facets)) {
+                const select = document.getElementById(facet);
+                if (!select) continue;
+
+                const countByValue = new Map(counts.map(entry => [entry.value, entry.count]));
+                for (const option of select.options) {
+                    if (!option.value) continue;
+                    option.dataset.label ??= option.textContent;
+                    option.textContent = `${option.dataset.label} (${countByValue.get(option.value) || 0})`;
+                }
+            }
+        } catch (error) {
+            // Counts are only a hint, the search itself still works
+        }
+    }
+
     searchForm.addEventListener('submit', async (e) => {
         e.preventDefault();
 
+        clearTimeout(suggestTimer);
+        hideSuggestions();
+
         const searchQuery = searchInput.value.trim();
         if (!searchQuery) return;
 
+        // Try the exported static bundle first, it needs no backend work at all
+        resultsContainer.innerHTML = '<div class="loading">Searching courses...</div>';
+        const courses = await staticSearch(searchQuery, 10);
+        if (courses) {
+            displayResults(courses);
+            return;
+        }
+
         const searchParams = new URLSearchParams();
         searchParams.append('course_name', searchQuery);
         
         await search(searchParams);
     });
 
+    // Suggest courses and institutions while typing, once the user pauses
+    searchInput.addEventListener('input', () => {
+        clearTimeout(suggestTimer);
+        suggestTimer = setTimeout(() => suggest(searchInput.value.trim()), SUGGEST_DELAY);
+    });
+
+    searchInput.addEventListener('keydown', (e) => {
+        const items = [...suggestionsList.querySelectorAll('li')];
+        if (suggestionsList.classList.contains('hidden') || items.length === 0) return;
+
+        const current = items.findIndex(item => item.classList.contains('active'));
+        if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+            e.preventDefault();
+            const next = e.key === 'ArrowDown'
+                ? (current + 1) % items.length
+                : (current - 1 + items.length) % items.length;
+            items.forEach((item, i) => item.classList.toggle('active', i === next));
+        } else if (e.key === 'Enter' && current !== -1) {
+            e.preventDefault();
+            items[current].click();
+        } else if (e.key === 'Escape') {
+            hideSuggestions();
+        }
+    });
+
+    searchInput.addEventListener('blur', hideSuggestions);
+    // Keep the focus in the input so the blur does not hide the list before the click
+    suggestionsList.addEventListener('mousedown', (e) => e.preventDefault());
+
+    suggestionsList.addEventListener('click', async (e) => {
+        const item = e.target.closest('li');
+        if (!item) return;
+        hideSuggestions();
+
+        if (item.dataset.type === 'course') {
+            window.location.href = `/c/${item.dataset.id}`;
+            return;
+        }
+
+        searchInput.value = item.dataset.name;
+        const searchParams = new URLSearchParams();
+        searchParams.append('institution_id', item.dataset.id);
+        searchParams.append('institution_id_operator', 'exact');
+        await search(searchParams);
+    });
+
+    async function suggest(query) {
+        if (suggestController) suggestController.abort();
+        if (!query) {
+            hideSuggestions();
+            return;
+        }
+
+        suggestController = new AbortController();
+        try {
+            const response = await fetch('/api/suggest?' + new URLSearchParams({ q: query }), {
+                signal: suggestController.signal,
+            });
+            if (!response.ok) return;
+            showSuggestions(await response.json());
+        } catch (error) {
+            // Aborted by a newer query or offline, the search button still works
+        }
+    }
+
+    function showSuggestions(suggestions) {
+        suggestionsList.replaceChildren(...suggestions.map(suggestion => {
+            const item = document.createElement('li');
+            item.dataset.type = suggestion.type;
+            item.dataset.id = suggestion.id;
+            item.dataset.name = suggestion.name;
+
+            const name = document.createElement('span');
+            name.textContent = suggestion.name;
+            const detail = document.createElement('span');
+            detail.className = 'suggestion-detail';
+            detail.textContent = suggestion.type === 'course'
+                ? `${suggestion.institution} (${suggestion.course_id})`
+                : 'Institution';
+
+            item.append(name, detail);
+            return item;
+        }));
+        suggestionsList.classList.toggle('hidden', suggestions.length === 0);
+    }
+
+    function hideSuggestions() {
+        suggestionsList.classList.add('hidden');
+    }
+
+    function foldText(text) {
+        return (text || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase();
+    }
+
+    // Load the static search index (generated by export.py), null if there is none
+    function loadStaticIndex() {
+        if (!staticIndex) {
+            staticIndex = (async () => {
+                const manifestResponse = await fetch(STATIC_DATA_URL + 'manifest.json', { cache: 'no-cache' });
+                if (!manifestResponse.ok) return null;
+                const manifest = await manifestResponse.json();
+
+                const indexResponse = await fetch(STATIC_DATA_URL + manifest.index);
+                if (!indexResponse.ok) return null;
+                const index = await indexResponse.json();
+
+                const fields = index.fields;
+                const rows = index.rows.map(row => {
+                    const entry = {};
+                    fields.forEach((field, i) => entry[field] = row[i]);
+                    entry.folded_name = foldText(entry.name);
+                    return entry;
+                });
+                // Same ordering as the default sort of the search API
+                rows.sort((a, b) => a.course_id < b.course_id ? -1 : a.course_id > b.course_id ? 1 : 0);
+
+                return { manifest, rows };
+            })().catch(() => null);
+        }
+        return staticIndex;
+    }
+
+    // Search course names client side and fetch the matching per course files
+    async function staticSearch(query, limit) {
+        const index = await loadStaticIndex();
+        if (!index) return null;
+
+        const needle = foldText(query);
+        const matches = index.rows.filter(row => row.folded_name.includes(needle)).slice(0, limit);
+
+        try {
+            return await Promise.all(matches.map(async row => {
+                const response = await fetch(STATIC_DATA_URL + index.manifest.courses + row.id + '.json');
+                if (!response.ok) throw new Error('Missing course file');
+                return response.json();
+            }));
+        } catch (error) {
+            return null;
+        }
+    }
+
     async function search(searchParams) {
         // Show loading state
         resultsContainer.innerHTML = '<div class="loading">Searching courses...</div>';
         
         try {
-            const response = await fetch('/api/search', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/x-www-form-urlencoded',
-                },
-                body: searchParams.toString()
-            });
+            // The list only needs the summary, the heavy sections are loaded on expand
+            searchParams.set('view', 'summary');
+
+            // GET so the browser and any proxy can cache the results
+            const response = await fetch('/api/search?' + searchParams.toString());
             
             const data = await response.json();
             
@@ -112,7 +306,6 @@ document.addEventListener('DOMContentLoaded', () => {
             // Extract data from course object
             const courseInfo = course.course || {};
             const institution = courseInfo.institution || {};
-            const characteristics = course.characteristics || {};
             counter += 1;
             
             resultsHTML += `
@@ -123,12 +316,29 @@ document.addEventListener('DOMContentLoaded', () => {
                             <div class="course-title">
                                 <h3>${courseInfo.id || ''} ${courseInfo.name || 'Untitled Course'}</h3>
                                 <span class="institution">${institution.name || ''}</span>
+                                ${course.last_grade != null ? `<span class="last-grade">Last grade: ${course.last_grade}</span>` : ''}
                             </div>
                         </div>
                         <div class="expand-icon"></div>
                     </div>
                     
                     <div class="course-details">
+                        ${course.historical_data ? renderCourseDetails(course) : `<div class="lazy-details" data-id="${course.id}"></div>`}
+                    </div>
+                </div>
+            `;
+        });
+        
+        resultsHTML += '</div>';
+        resultsContainer.innerHTML = resultsHTML;
+    }
+
+    // Helper function to render the details of an expanded card
+    function renderCourseDetails(course) {
+        const courseInfo = course.course || {};
+        const characteristics = course.characteristics || {};
+
+        return `
                         <!-- Basic Info Section -->
                         <div class="details-section">
                             <h4 class="basic-info">Basic Information</h4>
@@ -154,15 +364,32 @@ document.addEventListener('DOMContentLoaded', () => {
                         
                         <!-- Course URL -->
                         ${courseInfo.url ? `<div class="course-link"><a href="${courseInfo.url}" target="_blank">Visit Official Course Page</a></div>` : ''}
-                    </div>
-                </div>
-            `;
-        });
-        
-        resultsHTML += '</div>';
-        resultsContainer.innerHTML = resultsHTML;
+        `;
     }
     
+    // Load the sections left out of the summary results when a card is expanded
+    resultsContainer.addEventListener('click', async (e) => {
+        const header = e.target.closest('.course-header');
+        if (!header) return;
+
+        const placeholder = header.parentElement.querySelector('.lazy-details:not(.fetching)');
+        if (!placeholder) return;
+        placeholder.classList.add('fetching');
+
+        try {
+            const params = new URLSearchParams({ unique_id: placeholder.dataset.id, view: 'full' });
+            const response = await fetch('/api/search?' + params.toString());
+            const data = await response.json();
+            if (!response.ok || !data.length) {
+                throw new Error(data.error || 'Failed to load course details');
+            }
+            placeholder.outerHTML = renderCourseDetails(data[0]);
+        } catch (error) {
+            // Try again on the next expand
+            placeholder.classList.remove('fetching');
+        }
+    });
+    
     // Helper function to render entrance exams
     function renderEntranceExams(examsData) {
         if (!examsData || !examsData.bundles || examsData.bundles.length === 0) {
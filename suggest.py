@@ -0,0 +1,127 @@
+"""In memory prefix index for the search box suggestions.
+
+Course names, institution names and course/institution codes are folded
+(lowercase, no accents) and kept in sorted arrays, so a lookup is a binary
+search followed by reading the next few keys. Every word of a name is indexed
+too, "infor" finds "Engenharia Informática".
+"""
+
+import sqlite3
+import unicodedata
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+
+from datafiles import DATABASE_PATH
+from snapshot import CatalogueSnapshot
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+
+def fold(text: str) -> str:
+    """Lowercase a text and strip its accents."""
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+class SuggestionIndex:
+    """Sorted arrays of folded keys pointing at suggestion entries."""
+
+    def __init__(self, entries: List[dict], keys: List[Tuple[List[str], List[str]]]):
+        self.entries = entries
+        self.by_name = {}
+        for entry in entries:
+            self.by_name.setdefault(entry["name"], []).append(entry)
+
+        # Whole names and codes first, then the words inside the names
+        prefixes, words = [], []
+        for position, (entry_prefixes, entry_words) in enumerate(keys):
+            prefixes.extend((key, position) for key in entry_prefixes)
+            words.extend((key, position) for key in entry_words)
+        self._arrays = []
+        for pairs in (prefixes, words):
+            pairs.sort()
+            self._arrays.append(([key for key, _ in pairs], [p for _, p in pairs]))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, text: str, limit: int = DEFAULT_LIMIT) -> List[dict]:
+        """Entries with a key starting with the text, whole name matches first."""
+        needle = " ".join(fold(text).split())
+        if not needle or limit < 1:
+            return []
+
+        found = []
+        seen = set()
+        for keys, positions in self._arrays:
+            i = bisect_left(keys, needle)
+            while i < len(keys) and keys[i].startswith(needle):
+                if positions[i] not in seen:
+                    seen.add(positions[i])
+                    found.append(self.entries[positions[i]])
+                    if len(found) == limit:
+                        return found
+                i += 1
+        return found
+
+
+def read_courses(path: str = DATABASE_PATH) -> List[tuple]:
+    """(unique ID, course ID, name, institution ID, institution name) of every course."""
+    # Like the serving engine: read only, and the file is replaced rather than modified
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+    try:
+        return conn.execute(
+            "SELECT coursedata.id, course.course_id, course.name,"
+            " institution.id, institution.name"
+            " FROM coursedata"
+            " JOIN course ON coursedata.course_id = course.id"
+            " JOIN institution ON course.institution_id = institution.id"
+            " ORDER BY course.name, institution.name"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def name_keys(name: str, *codes: str) -> Tuple[List[str], List[str]]:
+    """Folded keys of a name: the whole name and codes, and from every later word on."""
+    words = fold(name).split()
+    return (
+        [" ".join(words), *(fold(code) for code in codes)],
+        [" ".join(words[i:]) for i in range(1, len(words))],
+    )
+
+
+def build_suggestion_index(
+    path: str = DATABASE_PATH, snapshot: Optional[CatalogueSnapshot] = None
+) -> SuggestionIndex:
+    """Build the index from the courses and institutions in the database (or snapshot)."""
+    if snapshot is not None:
+        courses = sorted(snapshot.courses(), key=lambda row: (row[2], row[4]))
+    else:
+        courses = read_courses(path)
+
+    entries, keys = [], []
+    institutions = {}
+    for unique_id, course_id, name, institution_id, institution_name in courses:
+        entries.append(
+            {
+                "type": "course",
+                "id": unique_id,
+                "course_id": course_id,
+                "name": name,
+                "institution": institution_name,
+            }
+        )
+        keys.append(name_keys(name, course_id))
+        institutions[institution_id] = institution_name
+
+    for institution_id, institution_name in sorted(
+        institutions.items(), key=lambda item: item[1]
+    ):
+        entries.append(
+            {"type": "institution", "id": institution_id, "name": institution_name}
+        )
+        keys.append(name_keys(institution_name, institution_id))
+
+    return SuggestionIndex(entries, keys)
@@ -0,0 +1,65 @@
+"""Shared fixtures."""
+
+import os
+import sqlite3
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Read when the app is created, keep the tests' rate limits out of ratelimit.db
+os.environ.setdefault("FLASK_RATELIMIT_STORAGE_URI", "memory://")
+
+
+@pytest.fixture
+def client():
+    """Test client of the website, with empty rate limits kept in memory."""
+    import server  # pylint: disable=import-outside-toplevel
+
+    server.limiter.reset()
+    return server.app.test_client()
+
+
+@pytest.fixture
+def legacy_database(tmp_path) -> str:
+    """A database in the schema from before the migrations."""
+    path = str(tmp_path / "database.db")
+    with open(os.path.join(FIXTURES, "legacy_database.sql"), encoding="utf-8") as f:
+        script = f.read()
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(script)
+    finally:
+        conn.close()
+    return path
+
+
+@pytest.fixture
+def migrated_database(legacy_database) -> str:
+    """The legacy database upgraded to the latest version."""
+    # pylint: disable=import-outside-toplevel
+    from migrations import upgrade
+
+    upgrade(legacy_database)
+    return legacy_database
+
+
+@pytest.fixture
+def migrated_courses(migrated_database) -> list:
+    """Every course of the migrated database through the API serialization."""
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy import create_engine
+    from sqlmodel import Session
+
+    import query
+    from models import CourseData
+
+    engine = create_engine(f"sqlite:///{migrated_database}")
+    try:
+        with Session(engine) as session:
+            courses = session.exec(
+                query.query_template().order_by(CourseData.id)
+            ).unique().all()
+            return [query.course_data_to_dict(course) for course in courses]
+    finally:
+        engine.dispose()
@@ -0,0 +1,214 @@
+-- database.db as the scraper wrote it before the migrations (no user_version):
+-- two courses, an exam and a region shared by both, a year without phases and
+-- a course without any history
+
+CREATE TABLE institution (
+    id VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE candidatestats (
+    id INTEGER NOT NULL,
+    is_placed BOOLEAN NOT NULL,
+    total INTEGER,
+    fem INTEGER,
+    masc INTEGER,
+    first_option INTEGER,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE averages (
+    id INTEGER NOT NULL,
+    application_grade FLOAT,
+    entrance_exams FLOAT,
+    hs_average FLOAT,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE previousapplications (
+    id INTEGER NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE characteristics (
+    id INTEGER NOT NULL,
+    degree VARCHAR NOT NULL,
+    "CNAEF" VARCHAR NOT NULL,
+    duration VARCHAR NOT NULL,
+    "ECTS" INTEGER NOT NULL,
+    type VARCHAR NOT NULL,
+    competition VARCHAR NOT NULL,
+    current_vacancies INTEGER,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE entranceexams (
+    id INTEGER NOT NULL,
+    is_combination BOOLEAN NOT NULL,
+    is_bundle BOOLEAN NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE regionalpreference (
+    id INTEGER NOT NULL,
+    percentage FLOAT NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE otheraccesspreferences (
+    id INTEGER NOT NULL,
+    percentage INTEGER NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE calculationformula (
+    id INTEGER NOT NULL,
+    hs_average INTEGER NOT NULL,
+    entrance_exams INTEGER NOT NULL,
+    prerequisites INTEGER,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE minimumclassification (
+    id INTEGER NOT NULL,
+    application_grade INTEGER NOT NULL,
+    entrance_exams INTEGER NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE prerequisites (
+    id INTEGER NOT NULL,
+    type VARCHAR NOT NULL,
+    "group" VARCHAR NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE course (
+    id INTEGER NOT NULL,
+    course_id VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    url VARCHAR NOT NULL,
+    institution_id VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(institution_id) REFERENCES institution (id)
+);
+
+CREATE TABLE phasedata (
+    id INTEGER NOT NULL,
+    candidates_id INTEGER,
+    placed_id INTEGER,
+    averages_id INTEGER,
+    vacancies INTEGER,
+    grade_last FLOAT,
+    info_url VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(candidates_id) REFERENCES candidatestats (id),
+    FOREIGN KEY(placed_id) REFERENCES candidatestats (id),
+    FOREIGN KEY(averages_id) REFERENCES averages (id)
+);
+
+CREATE TABLE exambundle (
+    id INTEGER NOT NULL,
+    entrance_exams_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(entrance_exams_id) REFERENCES entranceexams (id)
+);
+
+CREATE TABLE region (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    regional_preference_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(regional_preference_id) REFERENCES regionalpreference (id)
+);
+
+CREATE TABLE shallowcourse (
+    id INTEGER NOT NULL,
+    course_id VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    other_access_preferences_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(other_access_preferences_id) REFERENCES otheraccesspreferences (id)
+);
+
+CREATE TABLE yeardata (
+    id INTEGER NOT NULL,
+    previous_applications_id INTEGER,
+    year INTEGER NOT NULL,
+    phase1_id INTEGER,
+    phase2_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(previous_applications_id) REFERENCES previousapplications (id),
+    FOREIGN KEY(phase1_id) REFERENCES phasedata (id),
+    FOREIGN KEY(phase2_id) REFERENCES phasedata (id)
+);
+
+CREATE TABLE exam (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    code VARCHAR NOT NULL,
+    exam_bundle_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(exam_bundle_id) REFERENCES exambundle (id)
+);
+
+CREATE TABLE coursedata (
+    id INTEGER NOT NULL,
+    course_id VARCHAR,
+    characteristics_id INTEGER,
+    previous_applications_id INTEGER,
+    entrance_exams_id INTEGER,
+    min_classification_id INTEGER,
+    calculation_formula_id INTEGER,
+    regional_preference_id INTEGER,
+    other_access_preferences_id INTEGER,
+    prerequisites_id INTEGER,
+    extra_stats_url VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(course_id) REFERENCES course (id),
+    FOREIGN KEY(characteristics_id) REFERENCES characteristics (id),
+    FOREIGN KEY(previous_applications_id) REFERENCES previousapplications (id),
+    FOREIGN KEY(entrance_exams_id) REFERENCES entranceexams (id),
+    FOREIGN KEY(min_classification_id) REFERENCES minimumclassification (id),
+    FOREIGN KEY(calculation_formula_id) REFERENCES calculationformula (id),
+    FOREIGN KEY(regional_preference_id) REFERENCES regionalpreference (id),
+    FOREIGN KEY(other_access_preferences_id) REFERENCES otheraccesspreferences (id),
+    FOREIGN KEY(prerequisites_id) REFERENCES prerequisites (id)
+);
+INSERT INTO institution VALUES ('0150', 'Universidade de Lisboa');
+INSERT INTO course VALUES
+    (1, 'L221', 'Gestão', 'https://www.dges.gov.pt/guias/detcursopi.asp?codc=L221&code=0150', '0150'),
+    (2, '9002', 'Direito', 'https://www.dges.gov.pt/guias/detcursopi.asp?codc=9002&code=0150', '0150');
+INSERT INTO characteristics VALUES
+    (1, 'Licenciatura - 1º ciclo', '345 Gestão e administração', '6 Semestres', 180, 'Público', 'Concurso Nacional', 120),
+    (2, 'Licenciatura - 1º ciclo', '380 Direito', '8 Semestres', 240, 'Público', 'Concurso Nacional', 300);
+
+INSERT INTO entranceexams VALUES (1, 0, 0), (2, 0, 0);
+INSERT INTO exambundle VALUES (1, 1), (2, 2);
+INSERT INTO exam VALUES
+    (1, 'Matemática A', '19', 1),
+    (2, 'Economia', '04', 1),
+    (3, 'Matemática A', '19', 2);
+
+INSERT INTO regionalpreference VALUES (1, 50.0), (2, 30.0);
+INSERT INTO region VALUES
+    (1, 'Lisboa', 1),
+    (2, 'Setúbal', 1),
+    (3, 'Lisboa', 2);
+
+INSERT INTO previousapplications VALUES (1), (2);
+INSERT INTO candidatestats VALUES
+    (1, 0, 800, 450, 350, 200),
+    (2, 1, 120, 70, 50, 90);
+INSERT INTO averages VALUES (1, 160.2, 155.0, 165.8);
+INSERT INTO phasedata VALUES
+    (1, 1, 2, 1, 120, 150.5, 'https://www.dges.gov.pt/guias/stats.asp?code=0150'),
+    (2, NULL, NULL, NULL, 3, NULL, NULL);
+INSERT INTO yeardata VALUES
+    (1, 1, 2023, 1, 2),
+    (2, 1, 2022, NULL, NULL);
+
+INSERT INTO coursedata VALUES
+    (1, 1, 1, 1, 1, NULL, NULL, 1, NULL, NULL, NULL),
+    (2, 2, 2, 2, 2, NULL, NULL, 2, NULL, NULL, NULL);
@@ -0,0 +1,40 @@
+"""Tests for the grade calculator requests."""
+
+import pytest
+
+from calculator import DEFAULT_LIMIT, MAX_LIMIT, build_calculator, read_request
+
+GRADES = {"hs_average": "180", "exams": "19:180"}
+
+
+@pytest.mark.parametrize(
+    ("limit", "expected"),
+    [(None, DEFAULT_LIMIT), ("3", 3), ("0", 1), ("-5", 1), ("999999", MAX_LIMIT)],
+)
+def test_limit_is_bounded(limit, expected):
+    args = dict(GRADES) if limit is None else {**GRADES, "limit": limit}
+    assert read_request(args)["limit"] == expected
+
+
+@pytest.mark.parametrize(
+    ("args", "message"),
+    [
+        ({**GRADES, "limit": "abc"}, "Invalid limit"),
+        ({"exams": "19:180"}, "Invalid grades"),
+        ({**GRADES, "exams": "19"}, "Invalid grades"),
+        ({**GRADES, "year": "last"}, "Invalid grades"),
+    ],
+)
+def test_invalid_requests_raise_value_error(args, message):
+    with pytest.raises(ValueError, match=message):
+        read_request(args)
+
+
+def test_calculate_returns_at_most_limit_courses():
+    grade_calculator = build_calculator()
+    exams = ",".join(f"{code}:190" for code in grade_calculator.exam_codes)
+    arguments = read_request({"hs_average": "190", "exams": exams, "limit": "3"})
+
+    result = grade_calculator.calculate(**arguments)
+    assert result["eligible"] > 3
+    assert len(result["courses"]) == 3
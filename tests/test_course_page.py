@@ -0,0 +1,54 @@
+"""Tests for the sections of a course page."""
+
+import os
+
+from bs4 import BeautifulSoup
+
+import scraper
+from models import Course, Institution
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def parse(name: str):
+    """Parse a course page of the fixtures."""
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), "html.parser")
+    course = Course(
+        course_id="9500",
+        name="Enfermagem",
+        url="https://www.dges.gov.pt/guias/detcursopi.asp?codc=9500&code=3041",
+        institution_id="3041",
+        institution=Institution(id="3041", name=""),
+    )
+    return scraper.parse_course_page(soup, course)
+
+
+def test_empty_line_ends_the_lists():
+    html = "<h2>X</h2><br/>a<br/><br/><br/>b<br/>\n<br/>c<br/>\n<h2>Y</h2>"
+    page = scraper.CoursePage(BeautifulSoup(html, "html.parser"))
+    assert page.sections["X"] == ["a", "", "b", "", "c"]
+
+
+def test_text_after_the_lists(monkeypatch):
+    monkeypatch.setattr(scraper, "EXAMS", {})
+    monkeypatch.setattr(scraper, "REGIONS", {})
+    data = parse("course_trailing_text.html")
+
+    assert data.prerequisites.type == "Seleção"
+    assert data.prerequisites.group == "A"
+
+    preferences = data.other_access_preferences
+    assert preferences.percentage == 30
+    assert [(c.course_id, c.name) for c in preferences.courses] == [
+        ("602", "Cursos Técnico-Profissionais (Todos os Cursos)"),
+        ("735", "Técnico Auxiliar de Saúde"),
+    ]
+
+    assert data.characteristics.current_vacancies == 60
+    bundles = data.entrance_exams.exams
+    assert [[exam.code for exam in bundle.exams] for bundle in bundles] == [
+        ["02"],
+        ["02", "07"],
+    ]
+    assert data.calculation_formula.hs_average == 65
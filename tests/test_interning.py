@@ -0,0 +1,69 @@
+"""Tests for exams and regions stored once and shared by the courses."""
+
+import sqlite3
+
+from sqlalchemy import create_engine
+from sqlmodel import Session, SQLModel, select
+
+import scraper
+from models import EntranceExams, Exam, ExamBundle, Region, RegionalPreference
+
+
+def count(path: str, table: str) -> int:
+    """Rows of a table."""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_migration_deduplicates_exams_and_regions(migrated_database, migrated_courses):
+    assert count(migrated_database, "exam") == 2
+    assert count(migrated_database, "exambundleexamlink") == 3
+    assert count(migrated_database, "region") == 2
+    assert count(migrated_database, "regionalpreferenceregionlink") == 3
+
+    first, second = migrated_courses
+    assert first["entrance_exams"]["bundles"] == [
+        {
+            "exams": [
+                {"code": "19", "name": "Matemática A"},
+                {"code": "04", "name": "Economia"},
+            ]
+        }
+    ]
+    assert second["entrance_exams"]["bundles"] == [
+        {"exams": [{"code": "19", "name": "Matemática A"}]}
+    ]
+    assert first["regional_preference"]["regions"] == ["Lisboa", "Setúbal"]
+    assert second["regional_preference"]["regions"] == ["Lisboa"]
+
+
+def test_scraper_interns_exams_and_regions(tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper, "EXAMS", {})
+    monkeypatch.setattr(scraper, "REGIONS", {})
+
+    assert scraper.intern_exam("19", "Matemática A") is scraper.intern_exam(
+        "19", "Matemática A"
+    )
+    assert scraper.intern_region("Lisboa") is scraper.intern_region("Lisboa")
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for codes in (["19", "04"], ["19"]):
+            bundle = ExamBundle(
+                exams=[scraper.intern_exam(code, f"Exam {code}") for code in codes]
+            )
+            session.add(EntranceExams(exams=[bundle]))
+            session.add(
+                RegionalPreference(
+                    percentage=50.0, regions=[scraper.intern_region("Lisboa")]
+                )
+            )
+        session.commit()
+
+        assert len(session.exec(select(Exam)).all()) == 2
+        assert len(session.exec(select(Region)).all()) == 1
+    engine.dispose()
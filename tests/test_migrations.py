@@ -0,0 +1,42 @@
+"""Tests for the database migrations."""
+
+import os
+import sqlite3
+
+from migrations import LATEST_VERSION, current_version, upgrade
+
+
+def version(path: str) -> int:
+    """user_version of a database."""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_unversioned_database_upgrades_to_latest(legacy_database):
+    conn = sqlite3.connect(legacy_database)
+    assert current_version(conn) == 0
+    conn.close()
+
+    assert upgrade(legacy_database) == LATEST_VERSION
+    assert version(legacy_database) == LATEST_VERSION
+    assert not os.path.exists(legacy_database + ".tmp")
+
+
+def test_upgrade_is_idempotent(legacy_database):
+    upgrade(legacy_database)
+    inode = os.stat(legacy_database).st_ino
+
+    assert upgrade(legacy_database) == 0
+    assert version(legacy_database) == LATEST_VERSION
+    # Nothing to do, the served file was left alone
+    assert os.stat(legacy_database).st_ino == inode
+
+
+def test_upgrade_replaces_the_file(legacy_database):
+    # Servers keep reading the old inode (opened immutable) until they reload
+    inode = os.stat(legacy_database).st_ino
+    upgrade(legacy_database)
+    assert os.stat(legacy_database).st_ino != inode
@@ -0,0 +1,34 @@
+"""Tests for the flattened yearly statistics (phasestats)."""
+
+
+def test_history_round_trips_through_the_api(migrated_courses):
+    history = migrated_courses[0]["historical_data"]
+
+    assert history == [
+        {
+            "year": 2023,
+            "phase1": {
+                "vacancies": 120,
+                "grade_last": 150.5,
+                "candidates": {
+                    "total": 800,
+                    "fem": 450,
+                    "masc": 350,
+                    "first_option": 200,
+                },
+                "placed": {"total": 120, "fem": 70, "masc": 50, "first_option": 90},
+                "averages": {
+                    "application_grade": 160.2,
+                    "entrance_exams": 155.0,
+                    "hs_average": 165.8,
+                },
+            },
+            "phase2": {"vacancies": 3, "grade_last": None},
+        },
+        # Years without statistics are still listed, as before the migration
+        {"year": 2022, "phase1": None, "phase2": None},
+    ]
+
+
+def test_course_without_history_has_an_empty_list(migrated_courses):
+    assert migrated_courses[1]["historical_data"] == []
@@ -0,0 +1,58 @@
+"""Tests for the slow query log of the search profiler."""
+
+import json
+import logging
+import threading
+
+from sqlalchemy import event
+
+import query
+from profiling import SearchProfiler
+
+
+class Records(logging.Handler):
+    """Keep the emitted records."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_slow_queries_are_explained_in_the_background():
+    profiler = SearchProfiler(slow_query_seconds=0, slow_query_log="")
+    profiler.slow_log = logging.Logger("slow_queries_test")
+    records = Records()
+    profiler.slow_log.addHandler(records)
+
+    explained = []
+
+    def count_explains(_conn, _cursor, statement, *_):
+        if statement.startswith("EXPLAIN QUERY PLAN"):
+            explained.append(threading.current_thread().name)
+
+    event.listen(query.engine, "before_cursor_execute", count_explains)
+    try:
+        config = {"course_name": "medicina"}
+        params = query.normalize_parameters(config)
+        for _ in range(2):
+            with profiler.profile(params):
+                query.full_search(config)
+        profiler.flush()
+    finally:
+        event.remove(query.engine, "before_cursor_execute", count_explains)
+        query.engine.dispose()
+
+    assert len(records.records) == 2
+    assert {record.threadName for record in records.records} == {"slow-query-log"}
+
+    entries = [json.loads(record.getMessage()) for record in records.records]
+    assert entries[0]["statements"]
+    assert all(statement["plan"] for statement in entries[0]["statements"])
+    assert entries[0]["statements"] == entries[1]["statements"]
+
+    # Once per statement, not per request, and never on the request thread
+    assert len(explained) == len(entries[0]["statements"])
+    assert set(explained) == {"slow-query-log"}
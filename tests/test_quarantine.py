@@ -0,0 +1,129 @@
+"""Tests for quarantining the course pages that fail to parse."""
+
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+from bs4 import BeautifulSoup
+
+import scraper
+from models import Course, Institution
+from utils import ParseError
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture
+def page() -> str:
+    """A course page with notes after its lists."""
+    with open(
+        os.path.join(FIXTURES, "course_trailing_text.html"), encoding="utf-8"
+    ) as f:
+        return f.read()
+
+
+@pytest.fixture
+def exports(monkeypatch) -> list:
+    """Static bundle exports of the published databases."""
+    exported = []
+    monkeypatch.setattr(
+        scraper,
+        "export_bundle",
+        lambda: exported.append(scraper.DATABASE_PATH) or {"version": "test"},
+    )
+    return exported
+
+
+@pytest.fixture
+def scraper_files(tmp_path, monkeypatch, migrated_database, exports):
+    """Quarantine and database of the scraper in a temporary directory."""
+    monkeypatch.chdir(tmp_path)  # scraper.log
+    monkeypatch.setattr(scraper, "QUARANTINE_DIR", str(tmp_path / "quarantine"))
+    monkeypatch.setattr(scraper, "DATABASE_PATH", migrated_database)
+    monkeypatch.setattr(scraper, "BUILD_PATH", migrated_database + ".tmp")
+    monkeypatch.setattr(scraper, "EXAMS", {})
+    monkeypatch.setattr(scraper, "REGIONS", {})
+    return migrated_database
+
+
+def make_course(course_id: str) -> Course:
+    """Course of the listing, for the parser to attach the data to."""
+    return Course(
+        course_id=course_id,
+        name=f"Course {course_id}",
+        url=f"https://www.dges.gov.pt/guias/detcursopi.asp?codc={course_id}&code=3041",
+        institution_id="3041",
+        institution=Institution(id="3041", name="Politécnico"),
+    )
+
+
+def quarantine(course: Course, html: str):
+    """Parse a page that fails and quarantine it, as the crawl does."""
+    with pytest.raises(ParseError) as error:
+        scraper.parse_course_page(BeautifulSoup(html, "html.parser"), course)
+    scraper.quarantine_page(course, html, error.value)
+
+
+def reparse(monkeypatch):
+    """Run `scraper.py --reparse`."""
+    monkeypatch.setattr(sys, "argv", ["scraper.py", "--reparse"])
+    scraper.main()
+
+
+def stored_courses(path: str) -> list:
+    """(institution, course) of every stored course."""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT institution_id, course_id FROM course ORDER BY course_id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_quarantine_and_reparse(scraper_files, exports, page, monkeypatch):
+    # A parser bug on a valid page, and a page that is really malformed
+    original = scraper.SECTION_PARSERS["Pré-Requisitos"]
+
+    def broken_parser(lines):
+        raise ValueError(f"bug on {lines[0]}")
+
+    monkeypatch.setitem(
+        scraper.SECTION_PARSERS, "Pré-Requisitos", (original[0], broken_parser)
+    )
+    quarantine(make_course("9500"), page)
+    monkeypatch.setitem(scraper.SECTION_PARSERS, "Pré-Requisitos", original)
+    malformed = page.replace("735 Técnico Auxiliar de Saúde", "735")
+    quarantine(make_course("9501"), malformed)
+
+    quarantined = sorted(os.listdir(scraper.QUARANTINE_DIR))
+    assert quarantined == [
+        "3041_9500.html",
+        "3041_9500.json",
+        "3041_9501.html",
+        "3041_9501.json",
+    ]
+    with open(
+        os.path.join(scraper.QUARANTINE_DIR, "3041_9500.json"), encoding="utf-8"
+    ) as f:
+        assert "bug on Tipo de Pré-Requisitos: Seleção" in json.load(f)["error"]
+
+    # The fixed parser adds the first page, the malformed one stays
+    reparse(monkeypatch)
+    assert ("3041", "9500") in stored_courses(scraper_files)
+    assert ("3041", "9501") not in stored_courses(scraper_files)
+    assert sorted(os.listdir(scraper.QUARANTINE_DIR)) == [
+        "3041_9501.html",
+        "3041_9501.json",
+    ]
+    assert not os.path.exists(scraper.BUILD_PATH)
+    assert exports == [scraper_files]
+
+    # Nothing parses this time, the database is left alone
+    inode = os.stat(scraper_files).st_ino
+    reparse(monkeypatch)
+    assert os.stat(scraper_files).st_ino == inode
+    assert len(os.listdir(scraper.QUARANTINE_DIR)) == 2
+    assert len(exports) == 1
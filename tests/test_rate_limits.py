@@ -0,0 +1,48 @@
+"""Tests for the search rate limit weighted by the estimated cost."""
+
+import server
+from query import DEFAULT_PARAMETERS, estimate_search_cost
+
+CHEAP = "/api/search?unique_id={i}&view=summary&results_per_page=10"
+EXPENSIVE = (
+    "/api/search?course_name={i}&results_per_page=100"
+    "&sort_by=grade_desc&min_grade_last=100"
+)
+
+
+def allowed_requests(client, url: str, attempts: int = 70) -> int:
+    """Requests answered before the first 429."""
+    for i in range(attempts):
+        if client.get(url.format(i=i)).status_code == 429:
+            return i
+    return attempts
+
+
+def test_expensive_search_costs_more():
+    cheap = {**DEFAULT_PARAMETERS, "view": "summary", "results_per_page": "10"}
+    expensive = {
+        **DEFAULT_PARAMETERS,
+        "results_per_page": "100",
+        "sort_by": "grade_desc",
+        "min_grade_last": "100",
+    }
+    assert estimate_search_cost(cheap) == 1
+    assert estimate_search_cost(expensive) > 5
+
+
+def test_expensive_searches_use_up_the_limit_faster(client):
+    expensive = allowed_requests(client, EXPENSIVE)
+    server.limiter.reset()
+    cheap = allowed_requests(client, CHEAP)
+
+    assert cheap == 60
+    assert expensive < cheap / 5
+
+
+def test_revalidation_costs_one(client):
+    url = EXPENSIVE.format(i="a")
+    etag = client.get(url).headers["ETag"]
+    answered = [
+        client.get(url, headers={"If-None-Match": etag}).status_code for _ in range(20)
+    ]
+    assert answered == [304] * 20
@@ -0,0 +1,38 @@
+"""Tests for the search API responses."""
+
+
+def test_summary_has_what_the_result_list_shows(client):
+    response = client.get("/api/search?course_name=medicina&view=summary")
+    assert response.status_code == 200
+
+    courses = response.get_json()
+    assert courses
+    for course in courses:
+        assert set(course) == {"id", "course", "extra_stats_url", "last_grade"}
+    assert any(course["last_grade"] for course in courses)
+
+
+def test_full_view_has_the_details(client):
+    response = client.get("/api/search?course_name=medicina&view=full")
+    details = {"characteristics", "entrance_exams", "historical_data", "last_grade"}
+    assert details <= set(response.get_json()[0])
+
+
+def test_revalidation_keeps_the_etag_and_vary(client):
+    url = "/api/search?course_name=medicina&view=full"
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    identity = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+
+    etag = compressed.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert identity.headers["ETag"] == etag
+    assert "Accept-Encoding" in identity.headers["Vary"]
+
+    for encoding in ("gzip", "identity"):
+        response = client.get(
+            url, headers={"Accept-Encoding": encoding, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert "Accept-Encoding" in response.headers["Vary"]
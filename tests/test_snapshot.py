@@ -0,0 +1,57 @@
+"""Tests for matching the catalogue snapshot to the database build."""
+
+import json
+
+import pytest
+
+from snapshot import SNAPSHOT_NAME, load_snapshot, write_snapshot
+
+COURSES = [
+    {
+        "id": 2,
+        "course": {
+            "id": "9086",
+            "name": "Agronomia",
+            "institution": {"id": "3041", "name": "Politécnico"},
+        },
+    },
+    {
+        "id": 1,
+        "course": {
+            "id": "9500",
+            "name": "Enfermagem",
+            "institution": {"id": "3041", "name": "Politécnico"},
+        },
+    },
+]
+
+
+def export(data_dir, snapshot_build: str, manifest_build: str):
+    """Write a snapshot and the manifest pointing to it."""
+    write_snapshot(str(data_dir / SNAPSHOT_NAME), COURSES, snapshot_build)
+    manifest = {"build_id": manifest_build, "snapshot": SNAPSHOT_NAME}
+    (data_dir / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def test_snapshot_of_the_build(tmp_path):
+    export(tmp_path, "0123456789abcdef", "0123456789abcdef")
+    snapshot = load_snapshot(str(tmp_path), "0123456789abcdef")
+    try:
+        assert snapshot.build_id == "0123456789abcdef"
+        assert 1 in snapshot and 3 not in snapshot
+        assert snapshot.row(0)["name"] == "Enfermagem"
+    finally:
+        snapshot.close()
+
+
+@pytest.mark.parametrize(
+    "snapshot_build, manifest_build",
+    [
+        ("fedcba9876543210", "fedcba9876543210"),  # exported before the last scrape
+        ("0123456789abcdef", "fedcba9876543210"),
+        ("fedcba9876543210", "0123456789abcdef"),
+    ],
+)
+def test_snapshot_of_another_build(tmp_path, snapshot_build, manifest_build):
+    export(tmp_path, snapshot_build, manifest_build)
+    assert load_snapshot(str(tmp_path), "0123456789abcdef") is None
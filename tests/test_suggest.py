@@ -0,0 +1,26 @@
+"""Tests for the search box suggestion index."""
+
+from suggest import SuggestionIndex, name_keys
+
+
+def make_index():
+    """Index of a course with a letter in its code and its institution."""
+    entries = [
+        {"type": "course", "id": 1, "course_id": "L221", "name": "Gestão"},
+        {"type": "institution", "id": "0150", "name": "Universidade de Lisboa"},
+    ]
+    keys = [name_keys("Gestão", "L221"), name_keys("Universidade de Lisboa", "0150")]
+    return SuggestionIndex(entries, keys)
+
+
+def test_lookup_code_with_letters():
+    index = make_index()
+    for text in ("L221", "l221", "L2"):
+        assert [entry["id"] for entry in index.lookup(text)] == [1]
+
+
+def test_lookup_numeric_code_and_name():
+    index = make_index()
+    assert [entry["id"] for entry in index.lookup("0150")] == ["0150"]
+    assert [entry["id"] for entry in index.lookup("lisb")] == ["0150"]
+    assert [entry["id"] for entry in index.lookup("gestao")] == [1]
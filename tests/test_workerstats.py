@@ -0,0 +1,55 @@
+"""Tests for combining the statistics of the preforked workers."""
+
+import os
+
+from metrics import Counter, Gauge, LabeledHistogram, Registry
+from workerstats import EXITED, WorkerStats
+
+
+def make_registry():
+    """Registry with a counter, a histogram and a per worker gauge."""
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests.", ("route",)))
+    latency = registry.register(LabeledHistogram("latency_seconds", "Latency."))
+    registry.register(
+        Gauge("pool", "Pool.", lambda: {("size",): 5}, ("state",), per_worker=True)
+    )
+    return registry, requests, latency
+
+
+def test_merge_adds_up_workers():
+    registry, requests, latency = make_registry()
+    requests.inc("/")
+    latency.observe(0.002)
+    state = registry.state()
+
+    text = registry.render(registry.merge([state, state]))
+    assert 'requests_total{route="/"} 2' in text
+    assert "latency_seconds_count 2" in text
+    assert 'pool{state="size"} 10' in text
+
+
+def test_retire_keeps_cumulative_totals(tmp_path):
+    registry, requests, _ = make_registry()
+    requests.inc("/", amount=3)
+    stats = WorkerStats(
+        str(tmp_path / "stats.db"),
+        lambda: {"metrics": registry.state()},
+        lambda states: {
+            "metrics": registry.merge(
+                [state["metrics"] for state in states], cumulative_only=True
+            )
+        },
+    )
+    stats.publish()
+    stats.retire(os.getpid())
+
+    rows = stats._connection().execute("SELECT pid FROM workers").fetchall()
+    assert rows == [(EXITED,)]
+
+    # The exited total plus this process publishing again
+    text = registry.render(
+        registry.merge([state["metrics"] for state in stats.states()])
+    )
+    assert 'requests_total{route="/"} 6' in text
+    assert 'pool{state="size"} 5' in text
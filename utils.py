@@ -1,7 +1,6 @@
 """Utility functions for web scraping and data processing."""
 
 import logging
-import sys
 import time
 
 import requests
@@ -9,34 +8,70 @@ from bs4 import BeautifulSoup
 from bs4.element import NavigableString, PageElement, Tag
 
 
+class ParseError(Exception):
+    """A page is not in the format the scraper expects."""
+
+
+# Counters of every fetch made by get_page (used for the scraper run report)
+FETCH_STATS = {
+    "pages": 0,
+    "bytes": 0,
+    "retries": 0,
+    "failures": 0,
+    "fetch_seconds": 0.0,
+    "parse_seconds": 0.0,
+}
+
+
 def get_soup(url, timeout=3, attempts=5):
     """Get the BeautifulSoup object of a webpage."""
+    html = get_page(url, timeout, attempts)
+    if html is None:
+        return None
+    return make_soup(html)
+
+
+def make_soup(html: str) -> BeautifulSoup:
+    """Build the BeautifulSoup object of a page's HTML."""
+    start = time.perf_counter()
+    soup = BeautifulSoup(html, "html.parser")
+    FETCH_STATS["parse_seconds"] += time.perf_counter() - start
+    return soup
+
+
+def get_page(url, timeout=3, attempts=5) -> str | None:
+    """Get the HTML of a webpage, as it was sent."""
     for attempt in range(attempts):
         logging.debug("Attempt %d to fetch URL: %s", attempt + 1, url)
         if attempt > 0:
+            FETCH_STATS["retries"] += 1
             time.sleep(1)
             logging.warning("Retrying...")
         try:
+            start = time.perf_counter()
             response = requests.get(url, timeout=timeout)
+            FETCH_STATS["fetch_seconds"] += time.perf_counter() - start
             response.raise_for_status()
             logging.info("Successfully fetched URL: %s", url)
-            return BeautifulSoup(response.text, "html.parser")
+
+            FETCH_STATS["pages"] += 1
+            FETCH_STATS["bytes"] += len(response.content)
+            return response.text
         except requests.RequestException as e:
             logging.error("Request failed for URL %s: %s", url, e)
             if attempt == 2:
                 logging.error("Failed to fetch URL after 3 attempts: %s", url)
+                FETCH_STATS["failures"] += 1
                 return None
 
 
 def get_next(
     bs4_obj: NavigableString | Tag | PageElement | None,
 ) -> NavigableString | Tag | PageElement:
-    """Get the next element in the BeautifulSoup object."""
+    """Get the next element in the BeautifulSoup object (ParseError if there is none)."""
     if not bs4_obj:
-        logging.warning("No next element found. (%s)", bs4_obj)
-        sys.exit(1)
+        raise ParseError(f"No element to get the next one of ({bs4_obj!r})")
     next_obj = bs4_obj.next
     if not next_obj:
-        logging.warning("No next element found. (%s)", bs4_obj)
-        sys.exit(1)
+        raise ParseError(f"No next element found ({bs4_obj!r})")
     return next_obj
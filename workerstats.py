@@ -0,0 +1,110 @@
+"""Statistics of the preforked workers, combined through a shared SQLite database.
+
+Every worker publishes the state of its metrics, search profiles and memory
+every FLUSH_INTERVAL seconds (and right before exiting), and the worker that
+answers `/metrics` or an admin endpoint reads the states of all of them. When
+a worker exits, the master folds its cumulative statistics (counters and
+histograms) into the row of the exited workers, so the combined counters never
+go backwards when workers are replaced.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List
+
+FLUSH_INTERVAL = 5  # seconds between the publications of a worker
+EXITED = 0  # pid of the row with the totals of the workers that exited
+
+
+class WorkerStats:
+    """Per worker states of the statistics, in a SQLite database on the host."""
+
+    def __init__(
+        self,
+        path: str,
+        collect: Callable[[], dict],
+        fold: Callable[[List[dict]], dict],
+        interval: float = FLUSH_INTERVAL,
+    ):
+        self.path = path
+        self.collect = collect  # state of the current process
+        self.fold = fold  # cumulative part of a list of states
+        self.interval = interval
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                "pid INTEGER PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL"
+                ")"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection of the current thread (and process)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Rebuilt from scratch on every start, not worth an fsync
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def clear(self):
+        """Forget the workers of a previous run (in the master, before forking)."""
+        self._connection().execute("DELETE FROM workers")
+
+    def publish(self):
+        """Store the current state of this process."""
+        self._connection().execute(
+            "INSERT OR REPLACE INTO workers (pid, state, updated) VALUES (?, ?, ?)",
+            (os.getpid(), json.dumps(self.collect()), time.time()),
+        )
+
+    def start(self):
+        """Publish the state of this worker periodically from a daemon thread."""
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.publish()
+                except sqlite3.Error as e:
+                    logging.warning("Could not publish the worker statistics: %s", e)
+
+        threading.Thread(target=run, name="worker-stats", daemon=True).start()
+
+    def states(self) -> List[dict]:
+        """States of every running worker (this one up to date) and the exited total."""
+        self.publish()
+        rows = self._connection().execute("SELECT state FROM workers ORDER BY pid")
+        return [json.loads(state) for (state,) in rows]
+
+    def retire(self, pid: int):
+        """Fold the statistics of an exited worker into the exited total (in the master)."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT pid, state FROM workers WHERE pid IN (?, ?)", (pid, EXITED)
+            ).fetchall()
+            if any(row_pid == pid for row_pid, _ in rows):
+                conn.execute(
+                    "INSERT OR REPLACE INTO workers (pid, state, updated) "
+                    "VALUES (?, ?, ?)",
+                    (
+                        EXITED,
+                        json.dumps(self.fold([json.loads(state) for _, state in rows])),
+                        time.time(),
+                    ),
+                )
+                conn.execute("DELETE FROM workers WHERE pid = ?", (pid,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise